@@ -0,0 +1,422 @@
+import argparse
+import contextlib
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from check import JavaTestRunner
+from java_exec import TIME_LIMITS_FILE, VERDICT_INTERNAL_ERROR
+from compile_daemon import start_daemon, stop_daemon
+from exec_engine import DEFAULT_MAX_JVMS, configure_engine
+from fingerprint import jar_fingerprint, sources_fingerprint
+from journal import RunJournal
+from pe_check import PETestRunner
+from profiler import PROFILER
+from progress import ProgressBar
+from resource_usage import cpu_seconds, format_distribution, peak_rss_mb
+from result_sink import ResultSink
+from test_suite import load_tc_suite, load_tests_file
+
+# Khoảng thời gian tối thiểu giữa hai lần ghi lại bảng điểm trong lúc chấm (giây)
+GRADEBOOK_INTERVAL = 1.0
+
+
+def discover_submissions(cohort_dir: Path, mode: str) -> list[Path]:
+    """Tìm các thư mục bài làm (mỗi sinh viên một thư mục con) trong cohort_dir."""
+    submissions: list[Path] = []
+    for sub in sorted(p for p in cohort_dir.iterdir() if p.is_dir()):
+        if mode == "pe":
+            if any((sub / str(i)).is_dir() for i in range(1, 5)):
+                submissions.append(sub)
+        elif (sub / "given").is_dir() or (sub / "src").is_dir():
+            submissions.append(sub)
+    return submissions
+
+
+def submission_fingerprint(submission: Path, mode: str, tests: Path | None, normalize: bool = False) -> str:
+    """Fingerprint những gì quyết định kết quả chấm: mã nguồn / các file .jar, và bộ test riêng nếu không dùng chung.
+
+    normalize: bỏ comment và khoảng trắng thừa trong file .java trước khi hash (chế độ given).
+    """
+    if mode == "pe":
+        finder = PETestRunner(submission, test_file=tests)
+        parts = []
+        for q_num in range(1, 5):
+            jar_file = finder.find_jar_file(submission / str(q_num))
+            parts.append(f"Q{q_num}={jar_fingerprint(jar_file) if jar_file else '-'}")
+        own_tests = [] if tests else [submission / "tests.txt", submission / TIME_LIMITS_FILE]
+    else:
+        java_dir = submission / "given" if (submission / "given").is_dir() else submission
+        src_dir = java_dir / "src"
+        parts = [sources_fingerprint(src_dir, list(src_dir.glob("*.java")), normalize)]
+        test_dir = submission / "TestCases"
+        own_tests = [] if tests else [*test_dir.glob("tc*.txt"), test_dir / TIME_LIMITS_FILE]
+    parts.append(sources_fingerprint(submission, [p for p in own_tests if p.is_file()]))
+    return "|".join(parts)
+
+
+def grade_submission(
+    submission: Path,
+    mode: str,
+    tests: Path | None,
+    log_dir: Path,
+    warm_jvm: bool,
+    incremental: bool = True,
+    journal_dir: Path | None = None,
+    completed: dict[str, dict] | None = None,
+    profile: bool = False,
+    questions: list[int] | None = None,
+    results_jsonl: Path | None = None,
+    results_csv: Path | None = None,
+    shared_with: list[str] | None = None,
+) -> dict:
+    """Chấm một bài trong worker riêng; console output của runner được ghi vào log_dir/<tên>.log.
+
+    journal_dir: ghi kết quả từng test vào journal ngay khi xong; completed: các test đã ghi (khi --resume).
+    profile: đo thời gian từng phase, span được trả về trong row["spans"] để tiến trình chính gộp lại.
+    questions: chỉ chấm các câu này (định dạng PE, dùng cho job của distributed.py); None = mọi câu.
+    results_jsonl / results_csv: ghi kết quả từng test vào file chung (đã tạo bằng ResultSink.prepare()).
+    shared_with: tên các bài giống hệt bài này - kết quả từng test cũng được ghi dưới tên của chúng.
+    """
+    if profile:
+        PROFILER.enable()
+    log_file = log_dir / f"{submission.name}.log"
+    row = {"student": submission.name, "status": "OK", "earned": 0.0, "total": 0.0, "scores": {}}
+    journal = RunJournal(journal_dir).for_submission(submission.name, completed) if journal_dir else None
+    usages: list[dict | None] = []
+    verdicts: list[str] = []
+    sink = (
+        ResultSink(results_jsonl, results_csv, submission.name, shared_with=shared_with)
+        if results_jsonl or results_csv
+        else None
+    )
+
+    with open(log_file, "a" if completed else "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        try:
+            if mode == "pe":
+                runner = PETestRunner(
+                    submission,
+                    warm_jvm=warm_jvm,
+                    test_file=tests,
+                    incremental=incremental,
+                    journal=journal,
+                    sink=sink,
+                )
+                for result in runner.run_all_tests(questions):
+                    row["scores"][f"Q{result['question']}"] = result["earned_mark"]
+                    row["earned"] += result["earned_mark"]
+                    row["total"] += result["total_mark"]
+                    usages += [tc.get("usage") for tc in result["results"]]
+                    verdicts += [tc["verdict"] for tc in result["results"]]
+            else:
+                java_dir = submission / "given" if (submission / "given").is_dir() else submission
+                runner = JavaTestRunner(
+                    java_dir,
+                    tests or submission / "TestCases",
+                    warm_jvm=warm_jvm,
+                    incremental=incremental,
+                    journal=journal,
+                    sink=sink,
+                )
+                summary = runner.run_all_tests()
+                if summary is None:
+                    row["status"] = "NOT_GRADED"
+                else:
+                    for tc_name, _passed, _max_mark, earned, verdict in summary["results"]:
+                        row["scores"][tc_name] = earned
+                        verdicts.append(verdict)
+                    row["earned"] = summary["earned_mark"]
+                    row["total"] = summary["total_mark"]
+                    usages = list(summary["usage"].values())
+        except Exception as exc:  # noqa: BLE001
+            print(f"❌ Lỗi khi chấm: {exc}")
+            row["status"] = f"ERROR: {exc}"
+        else:
+            # Test không chạy được vì lỗi của máy chấm: bài không được ghi vào journal, --resume chấm lại
+            if VERDICT_INTERNAL_ERROR in verdicts:
+                row["status"] = VERDICT_INTERNAL_ERROR
+        finally:
+            if sink is not None:
+                sink.close()
+
+    # Tài nguyên của cả bài: tổng CPU time và peak RSS lớn nhất trong các test đã chạy
+    cpu_values = [cpu for cpu in map(cpu_seconds, usages) if cpu is not None]
+    rss_values = [rss for rss in map(peak_rss_mb, usages) if rss is not None]
+    if cpu_values:
+        row["cpu_seconds"] = round(sum(cpu_values), 3)
+    if rss_values:
+        row["peak_rss_mb"] = max(rss_values)
+
+    if journal is not None:
+        journal.sync()
+    if profile:
+        row["spans"] = PROFILER.drain()
+    return row
+
+
+def share_result(row: dict, members: list[Path], log_dir: Path) -> list[dict]:
+    """Nhân kết quả của bài đại diện members[0] cho cả nhóm bài giống hệt nhau (kèm log và cột shared_with)."""
+    if len(members) == 1:
+        return [row]
+    names = [sub.name for sub in members]
+    representative_log = log_dir / f"{names[0]}.log"
+    rows: list[dict] = []
+    for name in names:
+        shared_row = {**row, "student": name, "scores": dict(row["scores"])}
+        shared_row["shared_with"] = [other for other in names if other != name]
+        if name != names[0]:
+            note = f"♻️  Bài giống hệt {names[0]} - dùng lại kết quả chấm của bài đó\n\n"
+            try:
+                log_text = representative_log.read_text(encoding="utf-8")
+            except OSError:
+                log_text = ""
+            (log_dir / f"{name}.log").write_text(note + log_text, encoding="utf-8")
+        rows.append(shared_row)
+    return rows
+
+
+def write_gradebook(rows: list[dict], output: Path) -> None:
+    """Ghi bảng điểm tổng hợp (CSV) cho cả lớp; cột shared_with liệt kê các bài giống hệt (nếu có)."""
+    score_columns: list[str] = []
+    for row in rows:
+        for column in row["scores"]:
+            if column not in score_columns:
+                score_columns.append(column)
+    shared = any(row.get("shared_with") for row in rows)
+    usage_columns = [column for column in ("cpu_seconds", "peak_rss_mb") if any(column in row for row in rows)]
+
+    with open(output, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["student", "status", *score_columns, "earned", "total", "percent", *usage_columns]
+            + (["shared_with"] if shared else [])
+        )
+        for row in sorted(rows, key=lambda r: r["student"]):
+            percent = (row["earned"] / row["total"] * 100) if row["total"] > 0 else 0.0
+            writer.writerow(
+                [
+                    row["student"],
+                    row["status"],
+                    *(row["scores"].get(column, "") for column in score_columns),
+                    f"{row['earned']:.2f}",
+                    f"{row['total']:.2f}",
+                    f"{percent:.1f}",
+                    *(row.get(column, "") for column in usage_columns),
+                ]
+                + (["; ".join(row.get("shared_with", []))] if shared else [])
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chấm cả lớp: mỗi thư mục con của COHORT_DIR là một bài làm")
+    parser.add_argument("cohort_dir", type=Path, help="Thư mục chứa bài làm của các sinh viên")
+    parser.add_argument("--mode", choices=["given", "pe"], default="given", help="given: check.py, pe: pe_check.py")
+    parser.add_argument(
+        "--tests",
+        type=Path,
+        help="Test dùng chung: thư mục TestCases/ (given) hoặc file tests.txt (pe). Mặc định lấy trong từng bài",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Số worker chấm song song")
+    parser.add_argument(
+        "--max-jvms",
+        type=int,
+        default=DEFAULT_MAX_JVMS,
+        help="Tổng số JVM chạy đồng thời tối đa của cả lượt chấm, chia đều cho các worker (mặc định = số CPU)",
+    )
+    parser.add_argument("--output", type=Path, default=Path("gradebook.csv"), help="File bảng điểm CSV")
+    parser.add_argument("--warm-jvm", action="store_true", help="Dùng JVM harness cho mỗi bài (xem check.py)")
+    parser.add_argument(
+        "--compile-daemon",
+        action="store_true",
+        help="Biên dịch qua một compile daemon dùng chung (javac luôn nóng) trong suốt lượt chấm",
+    )
+    parser.add_argument(
+        "--regrade-all",
+        action="store_true",
+        help="Chạy lại mọi bài / mọi test, không dùng kết quả đã chấm trong results database",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Tiếp tục lượt chấm bị gián đoạn: bỏ qua các bài / test đã ghi trong journal (<output>.journal/)",
+    )
+    parser.add_argument(
+        "--no-dedupe",
+        action="store_true",
+        help="Chấm riêng từng bài kể cả khi mã nguồn / file .jar giống hệt bài khác",
+    )
+    parser.add_argument(
+        "--dedupe-normalize",
+        action="store_true",
+        help="Coi hai bài là giống nhau cả khi chỉ khác comment / khoảng trắng trong file .java",
+    )
+    parser.add_argument(
+        "--results",
+        type=Path,
+        default=None,
+        metavar="FILE.jsonl",
+        help="Ghi kết quả từng test của mọi bài (verdict, điểm, thời gian, output đã cắt ngắn) ra file JSONL "
+        "ngay khi chấm xong",
+    )
+    parser.add_argument(
+        "--results-csv",
+        type=Path,
+        default=None,
+        metavar="FILE.csv",
+        help="Ghi bảng điểm từng test của mọi bài ra file CSV, mỗi test một dòng ngay khi chấm xong",
+    )
+    console = parser.add_mutually_exclusive_group()
+    console.add_argument(
+        "--quiet",
+        dest="console",
+        action="store_const",
+        const="quiet",
+        default="full",
+        help="Không in dòng kết quả của từng bài, chỉ in tổng kết",
+    )
+    console.add_argument(
+        "--progress",
+        dest="console",
+        action="store_const",
+        const="progress",
+        help="Thanh tiến độ thay cho dòng kết quả của từng bài",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="profile",
+        default=None,
+        metavar="PREFIX",
+        help="Đo thời gian từng phase của mọi bài: in bảng tổng kết, ghi span ra PREFIX.json và metrics "
+        "Prometheus ra PREFIX.prom (mặc định PREFIX = profile)",
+    )
+    args = parser.parse_args()
+
+    cohort_dir = args.cohort_dir.resolve()
+    if not cohort_dir.is_dir():
+        print(f"⚠️  Không tìm thấy thư mục: {cohort_dir}")
+        return
+
+    submissions = discover_submissions(cohort_dir, args.mode)
+    if not submissions:
+        print(f"⚠️  Không tìm thấy bài làm nào trong {cohort_dir}")
+        return
+
+    tests = args.tests.resolve() if args.tests else None
+    if tests and tests.exists():
+        # Parse + chuẩn hóa bộ test dùng chung một lần; các worker đọc lại bản đã biên dịch trong cache
+        load_tests_file(tests) if args.mode == "pe" else load_tc_suite(tests)
+    log_dir = args.output.resolve().parent / "logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+    # Mỗi worker có engine riêng: chia --max-jvms cho các worker (không quá một worker mỗi JVM)
+    max_jvms = max(1, args.max_jvms)
+    workers = max(1, min(args.workers, max_jvms))
+
+    # Journal ghi kết quả từng test / từng bài ngay khi xong để có thể --resume sau khi bị gián đoạn
+    journal = RunJournal(args.output.resolve().with_suffix(".journal"))
+    completed_tests: dict[str, dict[str, dict]] = {}
+    done_rows: dict[str, dict] = {}
+    if args.resume:
+        completed_tests, done_rows = journal.load()
+        print(f"↻ Tiếp tục từ journal: {len(done_rows)} bài đã chấm xong")
+    else:
+        journal.clear()
+    # Kết quả từng test: --resume ghi tiếp vào file cũ (test đã chấm trước khi gián đoạn đã có trong đó)
+    results_jsonl = args.results.resolve() if args.results else None
+    results_csv = args.results_csv.resolve() if args.results_csv else None
+    ResultSink.prepare(results_jsonl, results_csv, append=args.resume)
+    rows: list[dict] = [done_rows[sub.name] for sub in submissions if sub.name in done_rows]
+    pending = [sub for sub in submissions if sub.name not in done_rows]
+
+    # Bài giống hệt nhau (cùng fingerprint) chỉ biên dịch và chạy một lần, kết quả dùng chung cho cả nhóm
+    groups: dict[str, list[Path]] = {}
+    for sub in pending:
+        try:
+            key = sub.name if args.no_dedupe else submission_fingerprint(sub, args.mode, tests, args.dedupe_normalize)
+        except OSError:
+            key = sub.name
+        groups.setdefault(key, []).append(sub)
+    shared_groups = [members for members in groups.values() if len(members) > 1]
+    if shared_groups:
+        print(f"♻️  {sum(len(m) for m in shared_groups)} bài trùng nhau trong {len(shared_groups)} nhóm:")
+        for members in shared_groups:
+            print(f"   - {', '.join(sub.name for sub in members)}")
+
+    daemon = None
+    if args.compile_daemon and args.mode == "given":
+        try:
+            daemon = start_daemon()
+            print(f"✓ Compile daemon đang chạy ở cổng {daemon[1].port}")
+        except (OSError, RuntimeError) as exc:
+            print(f"⚠️  Không khởi động được compile daemon, dùng javac: {exc}")
+
+    print(f"🎯 Chấm {len(groups)} bài với {workers} worker (log: {log_dir})")
+    progress = ProgressBar(len(pending), label="bài") if args.console == "progress" else None
+    # Bảng điểm được ghi lại trong lúc chấm (tối đa mỗi GRADEBOOK_INTERVAL giây) để xem được điểm từng phần
+    last_write = time.monotonic()
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=configure_engine, initargs=(max_jvms // workers,)
+        ) as pool:
+            futures = {
+                pool.submit(
+                    grade_submission,
+                    members[0],
+                    args.mode,
+                    tests,
+                    log_dir,
+                    args.warm_jvm,
+                    not args.regrade_all,
+                    journal.journal_dir,
+                    completed_tests.get(members[0].name),
+                    bool(args.profile),
+                    results_jsonl=results_jsonl,
+                    results_csv=results_csv,
+                    shared_with=[sub.name for sub in members[1:]],
+                ): members
+                for members in groups.values()
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                PROFILER.extend(result.pop("spans", []))
+                for row in share_result(result, futures[future], log_dir):
+                    rows.append(row)
+                    if row["status"] != VERDICT_INTERNAL_ERROR:
+                        journal.append({"type": "submission", "student": row["student"], "row": row})
+                    if progress is not None:
+                        progress.advance(row["status"] == "OK" and row["earned"] == row["total"])
+                    elif args.console == "full":
+                        print(
+                            f"[{len(rows)}/{len(submissions)}] {row['student']}: "
+                            f"{row['earned']:.1f}/{row['total']:.1f} {row['status']}"
+                        )
+                journal.sync()
+                if time.monotonic() - last_write >= GRADEBOOK_INTERVAL:
+                    write_gradebook(rows, args.output)
+                    last_write = time.monotonic()
+        if progress is not None:
+            progress.close()
+    except KeyboardInterrupt:
+        print(f"\n⏸️  Đã dừng - {len(rows)}/{len(submissions)} bài đã ghi vào journal")
+        print("   Chạy lại cùng lệnh với --resume để tiếp tục")
+        return
+    finally:
+        if daemon:
+            stop_daemon(*daemon)
+
+    write_gradebook(rows, args.output)
+    print(f"📊 Đã ghi bảng điểm: {args.output}")
+    usage_lines = [
+        format_distribution("CPU mỗi bài", [row.get("cpu_seconds") for row in rows], "s"),
+        format_distribution("Peak RSS mỗi bài", [row.get("peak_rss_mb") for row in rows], " MB"),
+    ]
+    for line in filter(None, usage_lines):
+        print(f"📈 {line}")
+    if args.profile:
+        PROFILER.report(Path(args.profile))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from check import JavaTestRunner
+from compile_cache import tool_version
+from exec_engine import DEFAULT_MAX_JVMS, configure_engine
+from java_exec import TIME_LIMITS_FILE
+from pe_check import PETestRunner
+from resource_usage import quantile
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Phiên bản định dạng file kết quả - tăng khi đổi ý nghĩa / tên trường để so sánh giữa các phiên bản không bị sai
+SCHEMA_VERSION = 1
+LAYOUTS = ("given", "pe")
+
+# Loại bài làm tổng hợp: đúng, sai dòng cuối, chạy chậm, treo (luôn bị TIMEOUT)
+KINDS = ("ok", "wrong", "slow", "hang")
+
+# Kích thước output xoay vòng theo test case: (số dòng, độ dài phần đệm mỗi dòng); số dòng 0 = --max-lines
+OUTPUT_SIZES = [(1, 10), (20, 40), (200, 80), (0, 120)]
+
+JAVA_TEMPLATE = """import java.util.Scanner;
+
+public class Main {{
+    // Bài làm tổng hợp #{index} ({kind}) - sinh bởi bench.py
+    static final int SLEEP_MS = {sleep_ms};
+    static final boolean HANG = {hang};
+    static final boolean WRONG = {wrong};
+
+    public static void main(String[] args) throws Exception {{
+        Scanner sc = new Scanner(System.in);
+        int lines = sc.nextInt();
+        int width = sc.nextInt();
+        long seed = sc.nextLong();
+        if (HANG) {{
+            while (true) {{
+                Thread.sleep(1000);
+            }}
+        }}
+        if (SLEEP_MS > 0) {{
+            Thread.sleep(SLEEP_MS);
+        }}
+        StringBuilder pad = new StringBuilder();
+        for (int i = 0; i < width; i++) {{
+            pad.append((char) ('a' + (seed + i) % 26));
+        }}
+        StringBuilder out = new StringBuilder("OUTPUT:\\n");
+        for (int i = 0; i < lines; i++) {{
+            long value = seed * 31 + i + (WRONG && i == lines - 1 ? 1 : 0);
+            out.append(value).append(' ').append(pad).append('\\n');
+        }}
+        System.out.print(out);
+    }}
+}}
+"""
+
+
+def java_source(index: int, kind: str, slow_ms: int) -> str:
+    return JAVA_TEMPLATE.format(
+        index=index,
+        kind=kind,
+        sleep_ms=slow_ms if kind == "slow" else 0,
+        hang=str(kind == "hang").lower(),
+        wrong=str(kind == "wrong").lower(),
+    )
+
+
+def expected_output(lines: int, width: int, seed: int) -> str:
+    """Output đúng của chương trình mẫu (giống nhánh WRONG = false trong JAVA_TEMPLATE)."""
+    pad = "".join(chr(ord("a") + (seed + i) % 26) for i in range(width))
+    return "\n".join(f"{seed * 31 + i} {pad}" for i in range(lines))
+
+
+def make_tests(count: int, max_lines: int, rng: random.Random) -> list[tuple[str, str]]:
+    """Sinh `count` test case (input, expected) với kích thước output xoay vòng theo OUTPUT_SIZES."""
+    tests = []
+    for i in range(count):
+        lines, width = OUTPUT_SIZES[i % len(OUTPUT_SIZES)]
+        lines = lines or max_lines
+        seed = rng.randrange(1, 1_000_000)
+        tests.append((f"{lines} {width} {seed}", expected_output(lines, width, seed)))
+    return tests
+
+
+def test_block(input_data: str, expected: str) -> str:
+    return f"INPUT:\n{input_data}\nOUTPUT:\n{expected}\nREMOVE_SPACES:\nNO\nCASE_SENSITIVE:\nYES\nMARK:\n1.0\n"
+
+
+def assign_kinds(count: int, ratios: dict[str, float], rng: random.Random) -> list[str]:
+    """Chia `count` bài theo tỷ lệ từng loại (phần còn lại là "ok"), xáo trộn theo seed."""
+    kinds: list[str] = []
+    for kind, ratio in ratios.items():
+        kinds += [kind] * round(count * ratio)
+    kinds = kinds[:count] + ["ok"] * max(0, count - len(kinds))
+    rng.shuffle(kinds)
+    return kinds
+
+
+def build_jar(source: str, jar_file: Path, work_dir: Path) -> None:
+    """Biên dịch Main.java và đóng gói thành .jar chạy được (Main-Class: Main)."""
+    build_dir = Path(tempfile.mkdtemp(dir=work_dir))
+    try:
+        (build_dir / "Main.java").write_text(source, encoding="utf-8")
+        result = subprocess.run(
+            ["javac", "-d", str(build_dir), str(build_dir / "Main.java")], capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"javac lỗi khi tạo bài mẫu: {result.stderr.strip()}")
+        jar_file.parent.mkdir(parents=True, exist_ok=True)
+        with zipfile.ZipFile(jar_file, "w", zipfile.ZIP_DEFLATED) as jar:
+            jar.writestr("META-INF/MANIFEST.MF", "Manifest-Version: 1.0\nMain-Class: Main\n")
+            for path in sorted(build_dir.glob("*.class")):
+                jar.write(path, path.name)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+
+def generate_given(root: Path, kinds: list[str], tests: list[tuple[str, str]], slow_ms: int, time_limit: float) -> None:
+    """Cohort định dạng given/src + TestCases/: root/TestCases/ dùng chung, root/cohort/<bài>/given/src/Main.java."""
+    test_dir = root / "TestCases"
+    test_dir.mkdir(parents=True)
+    for i, (input_data, expected) in enumerate(tests, 1):
+        (test_dir / f"tc{i}.txt").write_text(test_block(input_data, expected), encoding="utf-8")
+    limits = {f"tc{i}": time_limit for i in range(1, len(tests) + 1)}
+    (test_dir / TIME_LIMITS_FILE).write_text(json.dumps({"limits": limits}, indent=2), encoding="utf-8")
+
+    for index, kind in enumerate(kinds):
+        src_dir = root / "cohort" / f"s{index:04d}" / "given" / "src"
+        src_dir.mkdir(parents=True)
+        # Mỗi bài một mã nguồn khác nhau (comment chứa số thứ tự) để không bài nào dùng lại bản biên dịch của bài khác
+        (src_dir / "Main.java").write_text(java_source(index, kind, slow_ms), encoding="utf-8")
+
+
+def generate_pe(root: Path, kinds: list[str], tests: list[tuple[str, str]], slow_ms: int, time_limit: float) -> None:
+    """Cohort định dạng PE: root/tests.txt dùng chung, root/cohort/<bài>/{1..4}/run/Q<n>.jar (+ src/)."""
+    root.mkdir(parents=True)
+    blocks = []
+    limits: dict[str, float] = {}
+    for q_num in range(1, 5):
+        blocks.append(f"=== Q{q_num} ===\n")
+        for tc_num, (input_data, expected) in enumerate(tests, 1):
+            blocks.append(f"--- TC{tc_num} ---\n{test_block(input_data, expected)}")
+            limits[f"Q{q_num}/TC{tc_num}"] = time_limit
+    (root / "tests.txt").write_text("\n".join(blocks), encoding="utf-8")
+    (root / TIME_LIMITS_FILE).write_text(json.dumps({"limits": limits}, indent=2), encoding="utf-8")
+
+    # Mỗi loại bài chỉ biên dịch một lần; các bài cùng loại dùng chung nội dung .jar
+    jars: dict[str, Path] = {}
+    for kind in sorted(set(kinds)):
+        jars[kind] = root / "jars" / f"{kind}.jar"
+        build_jar(java_source(0, kind, slow_ms), jars[kind], root)
+    for index, kind in enumerate(kinds):
+        for q_num in range(1, 5):
+            question_dir = root / "cohort" / f"s{index:04d}" / str(q_num)
+            (question_dir / "src").mkdir(parents=True)
+            (question_dir / "src" / "Main.java").write_text(java_source(index, kind, slow_ms), encoding="utf-8")
+            (question_dir / "run").mkdir()
+            shutil.copyfile(jars[kind], question_dir / "run" / f"Q{q_num}.jar")
+
+
+def peak_rss_mb(who: int) -> float | None:
+    """Peak RSS (MB) của tiến trình hiện tại hoặc của tiến trình con lớn nhất; None nếu không đo được."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux tính KB, macOS tính byte
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_layout(layout: str, root: Path, warm_jvm: bool, jobs: int, max_jvms: int) -> dict:
+    """Chấm cả cohort của một định dạng trong tiến trình riêng (để đo peak memory độc lập); trả về số liệu."""
+    configure_engine(max_jvms)
+    latencies: list[float] = []
+    verdicts: dict[str, int] = {}
+    lock = threading.Lock()
+
+    def timed(run_test_case):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = run_test_case(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+            verdict = result[4] if isinstance(result, tuple) else result["verdict"]
+            with lock:
+                latencies.append(elapsed)
+                verdicts[verdict] = verdicts.get(verdict, 0) + 1
+            return result
+
+        return wrapper
+
+    submissions = sorted((root / "cohort").iterdir())
+    start = time.perf_counter()
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        for submission in submissions:
+            # Chấm từ đầu: không dùng compile cache / kết quả đã lưu, không ghi output để rescore
+            if layout == "pe":
+                runner = PETestRunner(
+                    submission,
+                    warm_jvm=warm_jvm,
+                    test_file=root / "tests.txt",
+                    jobs=jobs,
+                    record_outputs=False,
+                    incremental=False,
+                )
+            else:
+                runner = JavaTestRunner(
+                    submission / "given",
+                    root / "TestCases",
+                    warm_jvm=warm_jvm,
+                    jobs=jobs,
+                    compile_cache=False,
+                    record_outputs=False,
+                    incremental=False,
+                )
+            runner.run_test_case = timed(runner.run_test_case)
+            runner.run_all_tests()
+    wall = time.perf_counter() - start
+    ordered = sorted(latencies) or [0.0]
+
+    return {
+        "submissions": len(submissions),
+        "test_executions": len(latencies),
+        "wall_seconds": round(wall, 3),
+        "throughput_tests_per_second": round(len(latencies) / wall, 3) if wall > 0 else 0.0,
+        "latency_ms": {
+            "p50": round(quantile(ordered, 0.5) * 1000, 1),
+            "p95": round(quantile(ordered, 0.95) * 1000, 1),
+            "p99": round(quantile(ordered, 0.99) * 1000, 1),
+            "max": round(ordered[-1] * 1000, 1),
+        },
+        "verdicts": dict(sorted(verdicts.items())),
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        "peak_child_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+    }
+
+
+def git_revision() -> str:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent
+        )
+    except OSError:
+        return "unknown"
+    return result.stdout.strip() or "unknown"
+
+
+def compare(baseline: dict, current: dict) -> None:
+    """In bảng so sánh số liệu chính giữa hai file kết quả."""
+    if baseline.get("schema") != current["schema"]:
+        print(f"⚠️  Khác phiên bản định dạng ({baseline.get('schema')} vs {current['schema']}) - không so sánh")
+        return
+    if baseline.get("config") != current["config"]:
+        print("⚠️  Cấu hình benchmark khác nhau - kết quả so sánh chỉ mang tính tham khảo")
+    metrics = [
+        ("throughput", lambda r: r["throughput_tests_per_second"], True),
+        ("p50 (ms)", lambda r: r["latency_ms"]["p50"], False),
+        ("p95 (ms)", lambda r: r["latency_ms"]["p95"], False),
+        ("p99 (ms)", lambda r: r["latency_ms"]["p99"], False),
+        ("peak RSS (MB)", lambda r: r["peak_rss_mb"], False),
+    ]
+    print(f"\n📈 So sánh với {baseline.get('revision', '?')} → {current['revision']}")
+    print(f"{'Layout':<7} {'Chỉ số':<15} {'Trước':>10} {'Sau':>10} {'Thay đổi':>9}")
+    for layout, result in current["layouts"].items():
+        old = baseline.get("layouts", {}).get(layout)
+        if old is None:
+            continue
+        for name, get, higher_is_better in metrics:
+            before, after = get(old), get(result)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            better = change > 0 if higher_is_better else change < 0
+            mark = "✓" if better and abs(change) >= 5 else ("✗" if abs(change) >= 5 else " ")
+            print(f"{layout:<7} {name:<15} {before:>10} {after:>10} {change:>+8.1f}% {mark}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark pipeline chấm bài trên cohort tổng hợp (given/src + TestCases/ và PE 1..4/run/*.jar)"
+    )
+    parser.add_argument("--submissions", type=int, default=20, help="Số bài làm mỗi định dạng (mặc định 20)")
+    parser.add_argument("--tests", type=int, default=8, help="Số test case (mỗi câu với PE) (mặc định 8)")
+    parser.add_argument("--layouts", nargs="+", choices=LAYOUTS, default=list(LAYOUTS), help="Định dạng cần đo")
+    parser.add_argument("--max-lines", type=int, default=2000, help="Số dòng output của test lớn nhất")
+    parser.add_argument("--wrong-ratio", type=float, default=0.2, help="Tỷ lệ bài sai dòng cuối")
+    parser.add_argument("--slow-ratio", type=float, default=0.1, help="Tỷ lệ bài chạy chậm")
+    parser.add_argument("--hang-ratio", type=float, default=0.05, help="Tỷ lệ bài treo (bị TIMEOUT)")
+    parser.add_argument("--slow-ms", type=int, default=500, help="Thời gian ngủ mỗi test của bài chậm (ms)")
+    parser.add_argument("--time-limit", type=float, default=2.0, help="Giới hạn thời gian mỗi test (giây)")
+    parser.add_argument("--seed", type=int, default=192, help="Seed sinh dữ liệu (cùng seed = cùng cohort)")
+    parser.add_argument("--warm-jvm", action="store_true", help="Chấm bằng JVM harness (xem check.py)")
+    parser.add_argument("--jobs", type=int, default=1, help="Số test case chạy đồng thời trong mỗi bài")
+    parser.add_argument("--max-jvms", type=int, default=DEFAULT_MAX_JVMS, help="Số JVM chạy đồng thời tối đa")
+    parser.add_argument("--output", type=Path, default=Path("bench.json"), help="File kết quả JSON")
+    parser.add_argument("--compare", type=Path, help="File kết quả của phiên bản trước để so sánh")
+    parser.add_argument("--work-dir", type=Path, help="Thư mục sinh cohort (mặc định thư mục tạm, xóa sau khi đo)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    ratios = {"wrong": args.wrong_ratio, "slow": args.slow_ratio, "hang": args.hang_ratio}
+    kinds = assign_kinds(args.submissions, ratios, rng)
+    tests = make_tests(args.tests, args.max_lines, rng)
+
+    work_dir = args.work_dir.resolve() if args.work_dir else Path(tempfile.mkdtemp(prefix="autograde-bench-"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    print(f"🧪 Sinh cohort tổng hợp trong {work_dir}: {args.submissions} bài, {args.tests} test")
+    print(f"   Loại bài: {', '.join(f'{kind}={kinds.count(kind)}' for kind in KINDS)}")
+
+    results: dict[str, dict] = {}
+    try:
+        for layout in args.layouts:
+            root = work_dir / layout
+            shutil.rmtree(root, ignore_errors=True)
+            generate = generate_pe if layout == "pe" else generate_given
+            generate(root, kinds, tests, args.slow_ms, args.time_limit)
+
+            print(f"⏱️  Đang chấm định dạng {layout}...")
+            # Mỗi định dạng chạy trong tiến trình riêng để peak memory không cộng dồn
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                results[layout] = pool.submit(
+                    run_layout, layout, root, args.warm_jvm, args.jobs, args.max_jvms
+                ).result()
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    data = {
+        "schema": SCHEMA_VERSION,
+        "revision": git_revision(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "java": tool_version("java").splitlines()[0],
+        },
+        "config": {
+            "submissions": args.submissions,
+            "tests": args.tests,
+            "max_lines": args.max_lines,
+            "ratios": ratios,
+            "slow_ms": args.slow_ms,
+            "time_limit": args.time_limit,
+            "seed": args.seed,
+            "warm_jvm": args.warm_jvm,
+            "jobs": args.jobs,
+            "max_jvms": args.max_jvms,
+        },
+        "layouts": results,
+    }
+    args.output.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+    print(f"\n{'Layout':<7} {'Tests':>6} {'Test/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS MB':>7}")
+    for layout, result in results.items():
+        latency = result["latency_ms"]
+        print(
+            f"{layout:<7} {result['test_executions']:>6} {result['throughput_tests_per_second']:>8} "
+            f"{latency['p50']:>8} {latency['p95']:>8} {latency['p99']:>8} {result['peak_rss_mb']!s:>7}"
+        )
+    print(f"\n✓ Đã ghi kết quả: {args.output}")
+
+    if args.compare:
+        try:
+            baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            print(f"⚠️  Không đọc được {args.compare}: {exc}")
+            return
+        compare(baseline, data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+from check import JavaTestRunner
+from java_exec import TIME_LIMITS_FILE
+from pe_check import PETestRunner
+from test_suite import load_tc_suite
+
+
+def measure(run, runs: int) -> tuple[list[float], tuple[str, str, int]]:
+    """Chạy run() `runs` lần, trả về thời gian từng lần (giây) và kết quả lần cuối."""
+    times: list[float] = []
+    result = ("", "", -1)
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = run()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def calibrate_given(reference: Path, test_dir: Path, runs: int, warm_jvm: bool) -> dict[str, list[float]] | None:
+    """Đo thời gian lời giải mẫu (định dạng given/src) trên từng tc*.txt."""
+    runner = JavaTestRunner(reference, test_dir, warm_jvm=warm_jvm, early_exit=False)
+    if not runner.compile_java():
+        return None
+    runner.main_class = runner.find_main_class()
+
+    timings: dict[str, list[float]] = {}
+    try:
+        for tc_name, tc in load_tc_suite(test_dir).items():
+            times, (stdout, stderr, returncode) = measure(lambda: runner.run_java_with_input(tc["input"]), runs)
+            passed = returncode == 0 and runner.compare_outputs(
+                stdout, tc["expected_output"], tc["remove_spaces"], tc["case_sensitive"]
+            )
+            if not passed:
+                print(f"⚠️  Lời giải mẫu không PASS {tc_name} - thời gian đo được có thể không đúng")
+            timings[tc_name] = times
+    finally:
+        runner.close_harnesses()
+    return timings
+
+
+def calibrate_pe(reference: Path, test_file: Path, runs: int, warm_jvm: bool) -> dict[str, list[float]] | None:
+    """Đo thời gian lời giải mẫu (định dạng PE 1..4/run/*.jar) trên từng test trong tests.txt."""
+    runner = PETestRunner(reference, warm_jvm=warm_jvm, test_file=test_file, early_exit=False)
+    all_tests = runner.parse_tests()
+    if not all_tests:
+        print(f"⚠️  Không tìm thấy test case nào trong {test_file}")
+        return None
+
+    timings: dict[str, list[float]] = {}
+    try:
+        for q_num, test_cases in sorted(all_tests.items()):
+            jar_file = runner.find_jar_file(reference / str(q_num))
+            if not jar_file:
+                print(f"⚠️  Không tìm thấy file .jar cho Question {q_num} - bỏ qua")
+                continue
+            for tc in test_cases:
+                key = f"Q{q_num}/TC{tc['tc_num']}"
+                times, (stdout, stderr, returncode) = measure(
+                    lambda: runner.run_jar_with_input(jar_file, tc["input"]), runs
+                )
+                passed = returncode == 0 and runner.compare_outputs(
+                    stdout, tc["expected_output"], tc["remove_spaces"], tc["case_sensitive"]
+                )
+                if not passed:
+                    print(f"⚠️  Lời giải mẫu không PASS {key} - thời gian đo được có thể không đúng")
+                timings[key] = times
+    finally:
+        runner.close_harnesses()
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Hiệu chỉnh giới hạn thời gian từng test bằng cách chạy lời giải mẫu nhiều lần"
+    )
+    parser.add_argument("reference", type=Path, help="Lời giải mẫu: thư mục given/ hoặc thư mục PE chứa 1..4/")
+    parser.add_argument("--mode", choices=["given", "pe"], default="given")
+    parser.add_argument(
+        "--tests", type=Path, help="Thư mục TestCases/ (given) hoặc file tests.txt (pe); mặc định lấy cạnh reference"
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Số lần chạy mỗi test (mặc định 5)")
+    parser.add_argument("--factor", type=float, default=3.0, help="Giới hạn = factor x thời gian chậm nhất đo được")
+    parser.add_argument("--floor", type=float, default=2.0, help="Giới hạn tối thiểu (giây)")
+    parser.add_argument("--warm-jvm", action="store_true", help="Đo trong chế độ warm JVM (nên khớp khi chấm)")
+    args = parser.parse_args()
+
+    reference = args.reference.resolve()
+    if args.mode == "pe":
+        test_file = (args.tests or reference / "tests.txt").resolve()
+        timings = calibrate_pe(reference, test_file, args.runs, args.warm_jvm)
+        output_dir = test_file.parent
+    else:
+        test_dir = (args.tests or reference.parent / "TestCases").resolve()
+        timings = calibrate_given(reference, test_dir, args.runs, args.warm_jvm)
+        output_dir = test_dir
+    if not timings:
+        return
+
+    limits: dict[str, float] = {}
+    print(f"\n{'Test':<12} {'min (s)':>8} {'max (s)':>8} {'limit (s)':>10}")
+    for key, times in timings.items():
+        limits[key] = round(max(args.floor, args.factor * max(times)), 3)
+        print(f"{key:<12} {min(times):>8.3f} {max(times):>8.3f} {limits[key]:>10.3f}")
+
+    output = output_dir / TIME_LIMITS_FILE
+    data = {
+        "factor": args.factor,
+        "floor": args.floor,
+        "runs": args.runs,
+        "warm_jvm": args.warm_jvm,
+        "limits": limits,
+    }
+    output.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    print(f"\n✓ Đã ghi giới hạn thời gian: {output}")
+
+
+if __name__ == "__main__":
+    main()
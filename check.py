@@ -1,13 +1,138 @@
 import os
+import argparse
 import subprocess
-import re
+import threading
+import time
 from pathlib import Path
 
+from compile_cache import CompileCache
+from compile_daemon import CompileDaemonClient, start_daemon, stop_daemon
+from exec_engine import DEFAULT_MAX_JVMS, configure_engine, get_engine
+from file_watch import FileWatcher
+from java_exec import (DEFAULT_MAX_OUTPUT_BYTES, DEFAULT_TIMEOUT, VERDICT_EARLY_MISMATCH, VERDICT_INTERNAL_ERROR,
+                       VERDICT_TIMEOUT, OutputWatcher, RunAborted, RunMessage, apply_limits, extract_output,
+                       find_divergence, format_divergence, heap_flags, load_time_limits, os_memory_limit,
+                       run_verdict, test_timeout)
+from jvm_harness import HarnessPool, WarmJVM
+from jvm_profile import PROFILES, JVMProfile
+from ordered_pool import run_ordered, suppressed_stdout
+from profiler import PROFILER, context, span
+from progress import ProgressBar
+from resource_usage import format_limits, format_usage, usage_summary
+from output_store import OutputStore, comparison_key, hash_files
+from result_sink import ResultSink
+from results_db import ResultsDB, test_case_hash
+from test_suite import load_tc_suite, normalize_output, parse_tc_file
+
+JAVAC_FLAGS = ["-encoding", "UTF-8"]
+
+# Hằng số class file: ACC_PUBLIC | ACC_STATIC và descriptor của main(String[])
+ACC_PUBLIC_STATIC = 0x0009
+MAIN_DESCRIPTOR = "([Ljava/lang/String;)V"
+
+# Kích thước (byte) của các hằng trong constant pool, theo tag
+_CP_SIZES = {3: 4, 4: 4, 5: 8, 6: 8, 7: 2, 8: 2, 9: 4, 10: 4, 11: 4, 12: 4,
+             15: 3, 16: 2, 17: 4, 18: 4, 19: 2, 20: 2}
+
+def read_main_class_name(class_file):
+    """Đọc file .class, trả về tên class (dạng a.b.C) nếu có public static void main(String[]), ngược lại None"""
+    try:
+        data = Path(class_file).read_bytes()
+        if data[:4] != b"\xca\xfe\xba\xbe":
+            return None
+        
+        def u2(pos):
+            return int.from_bytes(data[pos:pos + 2], "big")
+        
+        # Constant pool: chỉ cần giữ lại các chuỗi Utf8 và tham chiếu Class
+        count = u2(8)
+        utf8 = {}
+        classes = {}
+        pos = 10
+        index = 1
+        while index < count:
+            tag = data[pos]
+            if tag == 1:
+                length = u2(pos + 1)
+                utf8[index] = data[pos + 3:pos + 3 + length].decode("utf-8", errors="replace")
+                pos += 3 + length
+            else:
+                if tag == 7:
+                    classes[index] = u2(pos + 1)
+                pos += 1 + _CP_SIZES[tag]
+            # long/double chiếm 2 slot
+            index += 2 if tag in (5, 6) else 1
+        
+        this_class = utf8[classes[u2(pos + 2)]]
+        pos += 6
+        pos += 2 + 2 * u2(pos)  # interfaces
+        
+        # Bỏ qua fields, duyệt methods
+        for is_method in (False, True):
+            member_count = u2(pos)
+            pos += 2
+            for _ in range(member_count):
+                flags, name, descriptor, attr_count = u2(pos), u2(pos + 2), u2(pos + 4), u2(pos + 6)
+                pos += 8
+                for _ in range(attr_count):
+                    pos += 6 + int.from_bytes(data[pos + 2:pos + 6], "big")
+                if (is_method and utf8.get(name) == "main" and utf8.get(descriptor) == MAIN_DESCRIPTOR
+                        and flags & ACC_PUBLIC_STATIC == ACC_PUBLIC_STATIC):
+                    return this_class.replace("/", ".")
+    except (OSError, IndexError, KeyError):
+        return None
+    return None
+
 class JavaTestRunner:
-    def __init__(self, java_dir, test_dir):
+    def __init__(self, java_dir, test_dir, warm_jvm=False, jobs=1, compile_cache=True,
+                 max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES, early_exit=True, record_outputs=True,
+                 incremental=True, journal=None, jvm_profile=None, harness_pool=None, sink=None, console="full"):
         self.java_dir = Path(java_dir)
         self.test_dir = Path(test_dir)
         self.src_dir = self.java_dir / "src"
+        # Thư mục chứa .class để chạy: src/ khi biên dịch tại chỗ, thư mục build trong cache nếu dùng cache
+        self.classes_dir = self.src_dir
+        # Main class được xác định một lần sau khi biên dịch
+        self.main_class = None
+        self._files_reported = False
+        self.compile_cache = CompileCache() if compile_cache else None
+        # Giới hạn stdout mỗi test, và dừng sớm khi output chắc chắn sai
+        self.max_output_bytes = max_output_bytes
+        self.early_exit = early_exit
+        # Giới hạn thời gian từng test (TestCases/time_limits.json, sinh bởi calibrate.py)
+        self.time_limits = load_time_limits(self.test_dir)
+        # warm_jvm: chạy mọi test case trong một JVM harness thay vì mỗi test một JVM
+        self.warm_jvm = warm_jvm
+        # jobs: số test case chạy đồng thời (output vẫn in theo thứ tự)
+        self.jobs = jobs
+        self._harness_local = threading.local()
+        self._harnesses = []
+        # Tắt warm JVM (khi không dựng được harness) một lần cho mọi thread
+        self._warm_lock = threading.Lock()
+        # harness_pool: HarnessPool của grade_daemon.py - JVM harness được trả về pool thay vì tắt sau lượt chấm
+        self.harness_pool = harness_pool
+        # record_outputs: lưu output thô từng test (key = hash mã nguồn + hash input) để chấm lại bằng rescore.py
+        self.output_store = OutputStore() if record_outputs else None
+        self.submission_hash = None
+        # Kết quả đã chấm theo (hash mã nguồn, hash test); incremental=False: chạy lại mọi test (vẫn ghi kết quả)
+        self.results_db = ResultsDB()
+        self.incremental = incremental
+        # journal: SubmissionJournal của batch_check.py - ghi từng test khi xong, bỏ qua test đã ghi khi --resume
+        self.journal = journal
+        # Profile khởi động JVM (TestCases/jvm_profile.json hoặc --jvm-profile); java_args: tham số đã chuẩn bị
+        # cho main class (flag + AppCDS archive), None = chạy như mặc định
+        self.jvm_profile = JVMProfile.load(self.test_dir, jvm_profile)
+        self.java_args = None
+        # Tài nguyên từng test đã dùng (thời gian, CPU, peak RSS) theo tên test
+        self.usage = {}
+        # Watch mode: build thành công gần nhất (để biên dịch tăng dần) và các test chạy trước (lần trước trượt)
+        self._last_build = None
+        self.run_first = set()
+        # sink: ResultSink ghi kết quả từng test ra JSONL / CSV ngay khi xong (kèm stdout / stderr đã cắt ngắn)
+        self.sink = sink
+        self._outputs = {}
+        # console: full / quiet / progress (xem progress.CONSOLE_MODES)
+        self.console = console
         
     def compile_java(self):
         """Biên dịch các file Java"""
@@ -17,9 +142,14 @@ class JavaTestRunner:
         if not java_files:
             print("Không tìm thấy file .java nào!")
             return False
+        
+        self.submission_hash = hash_files(self.src_dir, java_files)
+        
+        if self.compile_cache is not None:
+            return self._compile_cached(java_files)
             
         # Compile tất cả java files với UTF-8 encoding
-        compile_cmd = ["javac", "-encoding", "UTF-8"] + [str(f) for f in java_files]
+        compile_cmd = ["javac"] + JAVAC_FLAGS + [str(f) for f in java_files]
         
         try:
             result = subprocess.run(
@@ -39,31 +169,46 @@ class JavaTestRunner:
             print(f"Lỗi khi biên dịch: {e}")
             return False
     
+    def _compile_cached(self, java_files):
+        """Biên dịch qua compile cache - bỏ qua javac nếu mã nguồn không đổi"""
+        try:
+            success, log, build_dir, hit = self.compile_cache.compile(self.src_dir, java_files, JAVAC_FLAGS,
+                                                                      base=self._last_build)
+        except Exception as e:
+            print(f"Lỗi khi biên dịch: {e}")
+            return False
+        
+        if not success:
+            print(f"Lỗi biên dịch:\n{log}")
+            return False
+        
+        self.classes_dir = build_dir
+        self._last_build = build_dir
+        recompiled = self.compile_cache.recompiled
+        if hit:
+            print("✓ Biên dịch thành công! (dùng lại từ cache)")
+        elif recompiled:
+            print(f"✓ Biên dịch thành công! (biên dịch lại {len(recompiled)}/{len(java_files)} file: "
+                  f"{', '.join(recompiled)})")
+        else:
+            print("✓ Biên dịch thành công!")
+        return True
+    
     def find_main_class(self):
-        """Tìm class có phương thức main() - thử main, Main, và tìm tự động"""
-        # Thử các tên phổ biến trước
-        common_names = ["main", "Main"]
-        for name in common_names:
-            class_file = self.src_dir / f"{name}.class"
-            if class_file.exists():
-                print(f"✓ Tìm thấy class: {name}")
-                return name
-        
-        # Nếu không có, tìm trong các file .java
-        java_files = list(self.src_dir.glob("*.java"))
+        """Tìm class có phương thức main() bằng cách đọc bytecode các file .class (kể cả trong package)"""
+        candidates = []
+        for class_file in self.classes_dir.rglob("*.class"):
+            class_name = read_main_class_name(class_file)
+            if class_name:
+                candidates.append(class_name)
         
-        for java_file in java_files:
-            try:
-                with open(java_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    # Tìm public static void main
-                    if re.search(r'public\s+static\s+void\s+main\s*\(', content):
-                        # Lấy tên class từ tên file
-                        class_name = java_file.stem
-                        print(f"✓ Tìm thấy main() trong file: {class_name}.java")
-                        return class_name
-            except:
-                continue
+        if candidates:
+            # Ưu tiên main, Main, sau đó class ở package gốc, rồi theo tên
+            candidates.sort(key=lambda name: (name not in ("main", "Main"), name != "main", name.count("."), name))
+            print(f"✓ Tìm thấy class có main(): {candidates[0]}")
+            if len(candidates) > 1:
+                print(f"  (các class khác có main(): {', '.join(candidates[1:])})")
+            return candidates[0]
         
         # Không tìm thấy - báo cáo chi tiết
         print("\n⚠️ KHÔNG TÌM THẤY MAIN CLASS!")
@@ -72,7 +217,11 @@ class JavaTestRunner:
         return "main"  # Fallback to default
     
     def report_available_files(self):
-        """Báo cáo tất cả file .java và .class có sẵn"""
+        """Báo cáo tất cả file .java và .class có sẵn (chỉ một lần mỗi lượt chấm)"""
+        if self._files_reported:
+            return
+        self._files_reported = True
+        
         print("\n" + "="*60)
         print("📋 DANH SÁCH FILE TRONG THỦ MỤC:")
         print("="*60)
@@ -88,11 +237,11 @@ class JavaTestRunner:
             print("\n📄 File .java: Không tìm thấy")
         
         # Tìm tất cả file .class
-        class_files = list(self.src_dir.rglob("*.class"))
+        class_files = list(self.classes_dir.rglob("*.class"))
         if class_files:
             print(f"\n🔹 File .class ({len(class_files)} file):")
             for f in sorted(class_files):
-                rel_path = f.relative_to(self.src_dir)
+                rel_path = f.relative_to(self.classes_dir)
                 # Lấy tên class (không có đường dẫn và extension)
                 class_name = str(rel_path).replace('\\', '.').replace('/', '.')[:-6]
                 print(f"   - {rel_path} → class: {class_name}")
@@ -105,121 +254,306 @@ class JavaTestRunner:
         print("   3. Tên class phải khớp với tên file .java")
         print("="*60 + "\n")
     
-    def _try_run_java(self, class_name, input_data):
-        """Thử chạy Java với tên class cụ thể"""
+    def _get_harness(self, class_name):
+        """Lấy (hoặc tạo) JVM harness cho class_name - mỗi thread một harness riêng"""
+        harnesses = getattr(self._harness_local, "by_class", None)
+        if harnesses is None:
+            harnesses = self._harness_local.by_class = {}
+        if class_name not in harnesses:
+            if self.harness_pool is not None:
+                harnesses[class_name] = self.harness_pool.acquire([self.classes_dir], class_name, self.src_dir,
+                                                                  self.max_output_bytes,
+                                                                  self.jvm_profile.launch_flags(),
+                                                                  version=self.submission_hash)
+            else:
+                harnesses[class_name] = WarmJVM([self.classes_dir], class_name, self.src_dir,
+                                                self.max_output_bytes, self.jvm_profile.launch_flags())
+            self._harnesses.append(harnesses[class_name])
+        return harnesses[class_name]
+    
+    def close_harnesses(self):
+        """Tắt tất cả JVM harness đang chạy (hoặc trả về harness_pool để lượt chấm sau dùng lại)"""
+        for harness in self._harnesses:
+            if self.harness_pool is not None:
+                self.harness_pool.release(harness)
+            else:
+                harness.close()
+        self._harnesses.clear()
+        self._harness_local = threading.local()
+    
+    def _disable_warm_jvm(self, error):
+        """Chuyển cả lượt chấm về chế độ mỗi test một JVM; chỉ báo ở thread tắt đầu tiên"""
+        with self._warm_lock:
+            if not self.warm_jvm:
+                return
+            self.warm_jvm = False
+        print(f"⚠️ Không dùng được warm JVM, chuyển về chế độ thường: {error}")
+    
+    def _try_run_java(self, class_name, input_data, watcher=None, timeout=DEFAULT_TIMEOUT, usage=None,
+                      memory_limit=None):
+        """Thử chạy Java với tên class cụ thể (watcher: theo dõi output để dừng sớm khi sai; usage: dict nhận
+        thời gian / CPU / peak RSS của tiến trình; memory_limit: MEMORY_LIMIT của test, MB)"""
+        # Mốc thời gian cho profiler (khởi động JVM / chạy chương trình); None khi không profile
+        timings = {} if PROFILER.enabled else None
+        start = time.perf_counter()
         try:
-            result = subprocess.run(
-                ["java", class_name],
-                input=input_data,
-                capture_output=True,
-                text=True,
-                cwd=str(self.src_dir),
-                timeout=10
-            )
-            
-            # Chỉ lấy phần sau chữ "OUTPUT:"
-            stdout = result.stdout
-            if "OUTPUT:" in stdout:
-                # Lấy phần sau "OUTPUT:" và loại bỏ phần BUILD SUCCESSFUL
-                output_part = stdout.split("OUTPUT:")[1]
-                # Loại bỏ phần BUILD SUCCESSFUL nếu có
-                if "BUILD SUCCESSFUL" in output_part:
-                    output_part = output_part.split("BUILD SUCCESSFUL")[0]
-                stdout = output_part.strip()
-            
-            return stdout, result.stderr, result.returncode
+            # Warm JVM dùng chung một heap - test có MEMORY_LIMIT chạy trong JVM riêng
+            if self.warm_jvm and not memory_limit:
+                try:
+                    # Warm JVM vẫn tính vào giới hạn số JVM chạy đồng thời của engine
+                    with get_engine().slot():
+                        stdout, stderr, returncode = self._get_harness(class_name).run(input_data, timeout=timeout,
+                                                                                       timings=timings)
+                except RuntimeError as e:
+                    # Không dựng được harness (vd. javac lỗi) - quay về chế độ mỗi test một JVM
+                    self._disable_warm_jvm(e)
+                    return self._try_run_java(class_name, input_data, watcher, timeout, usage, memory_limit)
+            else:
+                java_args = ["-cp", str(self.classes_dir), class_name]
+                if self.java_args and class_name == self.main_class:
+                    java_args = self.java_args
+                stdout, stderr, returncode = get_engine().run(
+                    ["java", *heap_flags(memory_limit), *java_args],
+                    input_data,
+                    cwd=str(self.src_dir),
+                    timeout=timeout,
+                    max_output_bytes=self.max_output_bytes,
+                    watcher=watcher,
+                    timings=timings,
+                    usage=usage,
+                    memory_limit_mb=os_memory_limit(memory_limit)
+                )
         except subprocess.TimeoutExpired:
-            return "", "TIMEOUT", -1
+            stdout, stderr, returncode = "", RunMessage("TIMEOUT", VERDICT_TIMEOUT), -1
+        except RunAborted as e:
+            stdout, stderr, returncode = "", RunMessage(str(e), e.verdict), -1
         except Exception as e:
-            return "", str(e), -1
+            stdout, stderr, returncode = "", RunMessage(str(e), VERDICT_INTERNAL_ERROR), -1
+        
+        elapsed = time.perf_counter() - start
+        if timings:
+            PROFILER.add_run(timings)
+        if usage is not None:
+            # Warm JVM dùng chung một tiến trình: chỉ có thời gian chạy, không có CPU / RSS riêng từng test
+            usage.setdefault("wall", round(elapsed, 4))
+        self._record_output(input_data, stdout, stderr, returncode, elapsed, timeout, watcher, memory_limit)
+        
+        # Chỉ lấy phần sau chữ "OUTPUT:" (loại bỏ phần BUILD SUCCESSFUL nếu có)
+        return extract_output(stdout, single_section=True), stderr, returncode
+    
+    def _record_output(self, input_data, stdout, stderr, returncode, elapsed, timeout, watcher, memory_limit=None):
+        """Lưu output thô vào output store để chấm lại (rescore.py) mà không cần chạy Java"""
+        if self.output_store is None or self.submission_hash is None:
+            return
+        if run_verdict(stderr, returncode) == VERDICT_INTERNAL_ERROR:
+            return  # lỗi của máy chấm, không phải output của bài làm
+        mismatch_key = None
+        if watcher is not None and run_verdict(stderr, returncode) == VERDICT_EARLY_MISMATCH:
+            mismatch_key = comparison_key(watcher.expected, watcher.remove_spaces, watcher.case_sensitive)
+        self.output_store.save(self.submission_hash, input_data, stdout, stderr, returncode, elapsed, timeout,
+                               mismatch_key, memory_limit)
+    
+    def prepare_jvm(self, train_input, memory_limit=None):
+        """Chuẩn bị lệnh java theo profile khởi động (fast: tạo AppCDS archive cho bài này một lần); các lần chạy
+        thử có cùng giới hạn output / MEMORY_LIMIT như test train_input"""
+        if self.warm_jvm or self.main_class is None or self.submission_hash is None:
+            return
+        target = ["-cp", str(self.classes_dir), self.main_class]
+        with span("prepare_jvm"):
+            self.java_args = self.jvm_profile.prepare(target, self.submission_hash, train_input, self.src_dir,
+                                                      self.max_output_bytes, memory_limit)
     
-    def run_java_with_input(self, input_data):
-        """Chạy main.java với input và trả về output"""
+    def run_java_with_input(self, input_data, watcher=None, timeout=DEFAULT_TIMEOUT, usage=None, memory_limit=None):
+        """Chạy main class (đã xác định sau khi biên dịch) với input và trả về output"""
         try:
-            # Tự động tìm class có main method
-            main_class = self.find_main_class()
-            
-            # Thử chạy với tên tìm được
-            result = self._try_run_java(main_class, input_data)
-            if result[2] == 0:  # returncode == 0 nghĩa là thành công
-                return result
-            
-            # Nếu fail, thử các tên phổ biến khác
-            for fallback_name in ["main", "Main"]:
-                if fallback_name != main_class:
-                    result = self._try_run_java(fallback_name, input_data)
-                    if result[2] == 0:
-                        return result
-            
-            # Trả về kết quả cuối cùng (có thể là lỗi)
-            return result
+            if self.main_class is None:
+                self.main_class = self.find_main_class()
+            return self._try_run_java(self.main_class, input_data, watcher, timeout, usage, memory_limit)
         except Exception as e:
-            return "", str(e), -1
+            return "", RunMessage(str(e), VERDICT_INTERNAL_ERROR), -1
     
     def parse_test_case(self, tc_file):
-        """Parse file test case để lấy INPUT, OUTPUT và các config"""
-        with open(tc_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Parse INPUT
-        input_match = re.search(r'INPUT:\s*\n(.*?)\nOUTPUT:', content, re.DOTALL)
-        input_data = input_match.group(1).strip() if input_match else ""
-        
-        # Parse OUTPUT
-        output_match = re.search(r'OUTPUT:\s*\n(.*?)\n(?:REMOVE_SPACES|CASE_SENSITIVE|MARK|$)', content, re.DOTALL)
-        expected_output = output_match.group(1).strip() if output_match else ""
-        
-        # Parse configs
-        remove_spaces = re.search(r'REMOVE_SPACES:\s*\n(YES|NO)', content)
-        remove_spaces = remove_spaces.group(1) == "YES" if remove_spaces else False
-        
-        case_sensitive = re.search(r'CASE_SENSITIVE:\s*\n(YES|NO)', content)
-        case_sensitive = case_sensitive.group(1) == "YES" if case_sensitive else True
-        
-        mark = re.search(r'MARK:\s*\n([\d.]+)', content)
-        mark = float(mark.group(1)) if mark else 0.0
-        
-        return {
-            'input': input_data,
-            'expected_output': expected_output,
-            'remove_spaces': remove_spaces,
-            'case_sensitive': case_sensitive,
-            'mark': mark
-        }
+        """Parse file test case để lấy INPUT, OUTPUT, các config và expected đã chuẩn hóa"""
+        return parse_tc_file(tc_file)
     
     def normalize_output(self, text, remove_spaces=False, case_sensitive=True):
         """Chuẩn hóa output theo config"""
-        result = text.strip()
+        return normalize_output(text, remove_spaces, case_sensitive)
+    
+    def compare_outputs(self, actual, expected, remove_spaces=False, case_sensitive=True, normalized_expected=None):
+        """So sánh output thực tế với expected (normalized_expected: expected đã chuẩn hóa sẵn, nếu có).
+        Output được chuẩn hóa và so sánh theo từng đoạn, không tạo bản sao của cả output"""
+        if normalized_expected is None:
+            normalized_expected = self.normalize_output(expected, remove_spaces, case_sensitive)
+        
+        return find_divergence(actual, normalized_expected, remove_spaces, case_sensitive) is None
+    
+    def _test_hash(self, tc_name, tc_data):
+        return test_case_hash(tc_data, test_timeout(tc_data, self.time_limits, tc_name), self.max_output_bytes)
+    
+    def _stored_result(self, tc_name, tc_data):
+        """Kết quả đã chấm của test với mã nguồn hiện tại; None nếu phải chạy lại"""
+        if not self.incremental or self.submission_hash is None:
+            return None
+        return self.results_db.get(self.submission_hash, self._test_hash(tc_name, tc_data))
+    
+    def _save_result(self, tc_data, result, usage=None):
+        """Ghi kết quả test (kèm tài nguyên đã dùng) vào results database rồi trả lại result
+        (trừ INTERNAL_ERROR: lỗi của máy chấm, lần sau phải chạy lại)"""
+        tc_name, passed, max_mark, earned, verdict = result
+        self.usage[tc_name] = usage
+        if self.submission_hash is not None and verdict != VERDICT_INTERNAL_ERROR:
+            self.results_db.put(self.submission_hash, self._test_hash(tc_name, tc_data), tc_name,
+                                passed, earned, max_mark, verdict, usage)
+        return result
+    
+    def run_test_case(self, tc_name, tc_data):
+        """Chạy một test case đã parse, in chi tiết và trả về (tc_name, passed, max_mark, earned, verdict)"""
+        print(f"--- {tc_name.upper()} ---")
         
-        if remove_spaces:
-            result = re.sub(r'\s+', '', result)
+        print(f"Input: {tc_data['input'][:50]}..." if len(tc_data['input']) > 50 else f"Input: {tc_data['input']}")
+        print(f"Expected: {tc_data['expected_output'][:50]}..." if len(tc_data['expected_output']) > 50 else f"Expected: {tc_data['expected_output']}")
         
-        if not case_sensitive:
-            result = result.lower()
+        stored = self._stored_result(tc_name, tc_data)
+        if stored is not None:
+            earned = stored['earned'] if stored['passed'] else 0
+            print(f"↺ Mã nguồn và test không đổi - dùng kết quả đã chấm: {stored['verdict']}")
+            print(f"Điểm: {earned}/{tc_data['mark']}\n")
+            self.usage[tc_name] = stored['usage']
+            return (tc_name, stored['passed'], tc_data['mark'], earned, stored['verdict'])
         
+        # Chạy Java program
+        watcher = None
+        if self.early_exit:
+            watcher = OutputWatcher(
+                tc_data['expected_normalized'],
+                tc_data['remove_spaces'],
+                tc_data['case_sensitive'],
+                single_section=True
+            )
+        timeout = test_timeout(tc_data, self.time_limits, tc_name)
+        if tc_data['time_limit_ms'] or tc_data['memory_limit_mb']:
+            print(f"Giới hạn: {format_limits(tc_data)}")
+        usage = {}
+        stdout, stderr, returncode = self.run_java_with_input(tc_data['input'], watcher, timeout, usage,
+                                                              tc_data['memory_limit_mb'])
+        stderr, returncode = apply_limits(tc_data, stderr, returncode)
+        if self.sink is not None:
+            self._outputs[tc_name] = (stdout, stderr)
+        print(f"Tài nguyên: {format_usage(usage)}")
+        
+        if returncode != 0:
+            print(f"✗ LỖI: {stderr}")
+            
+            # Nếu lỗi "Could not find or load main class", báo cáo chi tiết
+            if "Could not find or load main class" in stderr:
+                print("\n⚠️ Không thể tìm thấy hoặc load main class!")
+                self.report_available_files()
+            
+            print(f"Điểm: 0/{tc_data['mark']}\n")
+            return self._save_result(tc_data, (tc_name, False, tc_data['mark'], 0,
+                                               run_verdict(stderr, returncode) or "ERROR"), usage)
+        
+        print(f"Actual: {stdout[:50]}..." if len(stdout) > 50 else f"Actual: {stdout}")
+        
+        # So sánh kết quả
+        with span("compare"):
+            divergence = find_divergence(
+                stdout,
+                tc_data['expected_normalized'],
+                tc_data['remove_spaces'],
+                tc_data['case_sensitive']
+            )
+        passed = divergence is None
+        
+        if passed:
+            print(f"✓ PASS")
+            print(f"Điểm: {tc_data['mark']}/{tc_data['mark']}\n")
+            return self._save_result(tc_data, (tc_name, True, tc_data['mark'], tc_data['mark'], "PASS"), usage)
+        else:
+            print(f"✗ FAIL")
+            print(f"Vị trí: {format_divergence(divergence)}")
+            print(f"Điểm: 0/{tc_data['mark']}\n")
+            return self._save_result(tc_data, (tc_name, False, tc_data['mark'], 0, "FAIL"), usage)
+    
+    def _run_profiled(self, tc_name, tc_data):
+        """Chạy test case với tên bài / test gắn vào các span của profiler (test chạy trên thread riêng)"""
+        with context(submission=str(self.java_dir), test=tc_name):
+            if self.console == "full":
+                result = self._run_or_resume(tc_name, tc_data)
+            else:
+                with suppressed_stdout():
+                    result = self._run_or_resume(tc_name, tc_data)
+        self._emit(result)
         return result
     
-    def compare_outputs(self, actual, expected, remove_spaces=False, case_sensitive=True):
-        """So sánh output thực tế với expected"""
-        actual_normalized = self.normalize_output(actual, remove_spaces, case_sensitive)
-        expected_normalized = self.normalize_output(expected, remove_spaces, case_sensitive)
+    def _emit(self, result):
+        """Ghi kết quả test vào result sink; test không chạy Java lần này (kết quả cũ / journal) có reused=True"""
+        if self.sink is None:
+            return
+        tc_name, passed, max_mark, earned, verdict = result
+        output = self._outputs.pop(tc_name, None)
+        stdout, stderr = output or (None, None)
+        self.sink.record(tc_name, verdict, passed, earned, max_mark, self.usage.get(tc_name), stdout, stderr,
+                         reused=output is None)
+    
+    def _run_or_resume(self, tc_name, tc_data):
+        """Chạy test case (hoặc lấy kết quả đã ghi trong journal khi tiếp tục lượt chấm bị gián đoạn)"""
+        if self.journal is None:
+            return self.run_test_case(tc_name, tc_data)
+        
+        done = self.journal.completed(tc_name)
+        if done is not None:
+            print(f"--- {tc_name.upper()} ---")
+            print(f"↻ Đã chấm trước khi bị gián đoạn: {done['verdict']}")
+            print(f"Điểm: {done['earned']}/{done['max_mark']}\n")
+            return (tc_name, done['passed'], done['max_mark'], done['earned'], done['verdict'])
         
-        return actual_normalized == expected_normalized
+        result = self.run_test_case(tc_name, tc_data)
+        _tc_name, passed, max_mark, earned, verdict = result
+        if verdict != VERDICT_INTERNAL_ERROR:
+            self.journal.record(tc_name, passed, earned, max_mark, verdict)
+        return result
     
     def run_all_tests(self):
         """Chạy tất cả test cases"""
-        # Biên dịch trước
-        if not self.compile_java():
-            return
+        with context(submission=str(self.java_dir)):
+            try:
+                return self._run_all_tests()
+            finally:
+                # Kể cả khi một test ném lỗi - không để lại JVM harness chạy ngầm (worker của batch_check.py)
+                self.close_harnesses()
+    
+    def _run_all_tests(self):
+        # Lấy tất cả test case (parse một lần, dùng lại bản đã biên dịch nếu file không đổi)
+        with span("parse_tests"):
+            suite = load_tc_suite(self.test_dir)
+        
+        java_files = list(self.src_dir.glob("*.java"))
+        if java_files:
+            self.submission_hash = hash_files(self.src_dir, java_files)
+        
+        if suite and all(self._stored_result(tc_name, tc_data) for tc_name, tc_data in suite.items()):
+            # Mọi test đã có kết quả với đúng mã nguồn này - không cần biên dịch / chạy Java
+            print("✓ Mã nguồn và test cases không đổi - dùng lại kết quả đã chấm")
+        else:
+            # Biên dịch trước
+            with span("compile"):
+                compiled = self.compile_java()
+            if not compiled:
+                return
+            
+            # Xác định main class một lần cho cả lượt chấm
+            with span("find_main_class"):
+                self.main_class = self.find_main_class()
+            first = next(iter(suite.values()), None)
+            self.prepare_jvm(first["input"] if first else "", first["memory_limit_mb"] if first else None)
         
         print("\n" + "="*60)
         print("BẮT ĐẦU CHẠY TEST CASES")
         print("="*60 + "\n")
         
-        # Lấy tất cả test case files
-        test_files = sorted(self.test_dir.glob("tc*.txt"))
-        
-        if not test_files:
+        if not suite:
             print("Không tìm thấy test case nào!")
             return
         
@@ -227,69 +561,134 @@ class JavaTestRunner:
         earned_mark = 0
         results = []
         
-        for tc_file in test_files:
-            tc_name = tc_file.stem
-            print(f"--- {tc_name.upper()} ---")
-            
-            # Parse test case
-            tc_data = self.parse_test_case(tc_file)
-            
-            print(f"Input: {tc_data['input'][:50]}..." if len(tc_data['input']) > 50 else f"Input: {tc_data['input']}")
-            print(f"Expected: {tc_data['expected_output'][:50]}..." if len(tc_data['expected_output']) > 50 else f"Expected: {tc_data['expected_output']}")
-            
-            # Chạy Java program
-            stdout, stderr, returncode = self.run_java_with_input(tc_data['input'])
-            
-            if returncode != 0:
-                print(f"✗ LỖI: {stderr}")
-                
-                # Nếu lỗi "Could not find or load main class", báo cáo chi tiết
-                if "Could not find or load main class" in stderr:
-                    print("\n⚠️ Không thể tìm thấy hoặc load main class!")
-                    self.report_available_files()
-                
-                print(f"Điểm: 0/{tc_data['mark']}\n")
-                results.append((tc_name, False, tc_data['mark'], 0))
-                total_mark += tc_data['mark']
-                continue
-            
-            print(f"Actual: {stdout[:50]}..." if len(stdout) > 50 else f"Actual: {stdout}")
-            
-            # So sánh kết quả
-            passed = self.compare_outputs(
-                stdout,
-                tc_data['expected_output'],
-                tc_data['remove_spaces'],
-                tc_data['case_sensitive']
-            )
-            
-            if passed:
-                print(f"✓ PASS")
-                print(f"Điểm: {tc_data['mark']}/{tc_data['mark']}\n")
-                results.append((tc_name, True, tc_data['mark'], tc_data['mark']))
-                earned_mark += tc_data['mark']
-            else:
-                print(f"✗ FAIL")
-                print(f"Điểm: 0/{tc_data['mark']}\n")
-                results.append((tc_name, False, tc_data['mark'], 0))
-            
-            total_mark += tc_data['mark']
+        # Watch mode: test trượt ở lần chạy trước được chạy trước để thấy kết quả sớm nhất
+        items = sorted(suite.items(), key=lambda item: item[0] not in self.run_first)
+        progress = ProgressBar(len(items)) if self.console == "progress" else None
+        for result in run_ordered(lambda item: self._run_profiled(*item), items, self.jobs):
+            tc_name, passed, max_mark, earned, verdict = result
+            results.append(result)
+            total_mark += max_mark
+            earned_mark += earned
+            if progress is not None:
+                progress.advance(passed)
+        if progress is not None:
+            progress.close()
+        
+        if self.output_store is not None:
+            self.output_store.evict()
         
         # Tổng kết
         print("="*60)
         print("TỔNG KẾT")
         print("="*60)
-        for tc_name, passed, max_mark, earned in results:
+        for tc_name, passed, max_mark, earned, verdict in results:
+            # --quiet / --progress: chỉ liệt kê test trượt
+            if passed and self.console != "full":
+                continue
             status = "✓ PASS" if passed else "✗ FAIL"
+            if verdict not in ("PASS", "FAIL", "ERROR"):
+                status += f" ({verdict})"
             print(f"{tc_name}: {status} - {earned}/{max_mark} điểm")
         
         print(f"\nTổng điểm: {earned_mark}/{total_mark}")
         print(f"Tỷ lệ: {earned_mark/total_mark*100:.1f}%")
+        
+        resource_lines = usage_summary([self.usage.get(tc_name) for tc_name, *_ in results])
+        if resource_lines:
+            print("\nTài nguyên mỗi test:")
+            for line in resource_lines:
+                print(f"  {line}")
         print("="*60)
+        
+        return {"earned_mark": earned_mark, "total_mark": total_mark, "results": results,
+                "usage": {tc_name: self.usage.get(tc_name) for tc_name, *_ in results}}
 
-def main():
+def build_parser():
+    """Tham số dòng lệnh của check.py (grade_daemon.py dùng lại để nhận cùng tham số từ client)"""
+    parser = argparse.ArgumentParser(description="Chấm bài Java theo test cases trong TestCases/")
+    parser.add_argument("--warm-jvm", action="store_true",
+                        help="Chạy tất cả test case trong một JVM harness (nhanh hơn, reset static giữa các test)")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Số test case chạy đồng thời (mặc định 1 = tuần tự)")
+    parser.add_argument("--max-jvms", type=int, default=DEFAULT_MAX_JVMS,
+                        help=f"Số JVM chạy đồng thời tối đa (mặc định {DEFAULT_MAX_JVMS} = số CPU)")
+    parser.add_argument("--no-compile-cache", action="store_true",
+                        help="Không dùng compile cache, biên dịch .class ngay trong src/ như trước")
+    parser.add_argument("--max-output-mb", type=float, default=DEFAULT_MAX_OUTPUT_BYTES / (1024 * 1024),
+                        help="Giới hạn stdout mỗi test case (MB); vượt quá sẽ bị dừng với kết quả OUTPUT_LIMIT")
+    parser.add_argument("--no-early-exit", action="store_true",
+                        help="Không dừng sớm chương trình khi output đã chắc chắn sai (EARLY_MISMATCH)")
+    parser.add_argument("--no-record", action="store_true",
+                        help="Không lưu output thô của từng test (dùng cho rescore.py)")
+    parser.add_argument("--regrade-all", action="store_true",
+                        help="Chạy lại mọi test, không dùng kết quả đã chấm khi mã nguồn và test không đổi")
+    parser.add_argument("--jvm-profile", choices=PROFILES, default=None,
+                        help="Profile khởi động JVM: fast = flag cho chương trình ngắn + AppCDS archive "
+                             "(mặc định theo TestCases/jvm_profile.json, không có thì default)")
+    parser.add_argument("--profile", nargs="?", const="profile", default=None, metavar="PREFIX",
+                        help="Đo thời gian từng phase: in bảng tổng kết, ghi span ra PREFIX.json và metrics "
+                             "Prometheus ra PREFIX.prom (mặc định PREFIX = profile)")
+    parser.add_argument("--results", type=Path, default=None, metavar="FILE.jsonl",
+                        help="Ghi kết quả từng test (verdict, điểm, thời gian, output đã cắt ngắn) ra file JSONL "
+                             "ngay khi chấm xong")
+    parser.add_argument("--results-csv", type=Path, default=None, metavar="FILE.csv",
+                        help="Ghi bảng điểm từng test ra file CSV, mỗi test một dòng ngay khi chấm xong")
+    console = parser.add_mutually_exclusive_group()
+    console.add_argument("--quiet", dest="console", action="store_const", const="quiet", default="full",
+                         help="Không in chi tiết từng test, chỉ in tổng kết (và các test trượt)")
+    console.add_argument("--progress", dest="console", action="store_const", const="progress",
+                         help="Như --quiet nhưng hiện thanh tiến độ")
+    parser.add_argument("--watch", action="store_true",
+                        help="Theo dõi given/src/*.java và TestCases/, chấm lại ngay khi lưu file (giữ JVM, javac "
+                             "và bộ test nóng; chỉ biên dịch lại file đã đổi, chạy test trượt lần trước trước)")
+    return parser
+
+def watch(runner):
+    """Chấm lại mỗi khi mã nguồn hoặc test case thay đổi, dùng lại runner (build trước, JVM, bộ test đã parse)"""
+    watcher = FileWatcher([(runner.src_dir, "*.java"), (runner.test_dir, "*")])
+    started = None
+    while True:
+        summary = runner.run_all_tests()
+        if summary:
+            runner.run_first = {tc_name for tc_name, passed, *_ in summary["results"] if not passed}
+        if started is not None:
+            print(f"⏱️ Chấm lại xong sau {time.perf_counter() - started:.2f}s kể từ khi lưu file")
+        print(f"\n👀 Đang theo dõi {runner.src_dir} và {runner.test_dir} (Ctrl+C để thoát)")
+        changed = watcher.wait()
+        started = time.perf_counter()
+        print("\n" + "="*60)
+        print(f"🔄 Đã thay đổi: {', '.join(sorted(path.name for path in changed))}")
+        if any(path.parent == runner.test_dir for path in changed):
+            runner.time_limits = load_time_limits(runner.test_dir)
+
+def watch_forever(runner, use_compile_daemon=True):
+    """--watch cho đến khi Ctrl+C; giữ javac nóng bằng compile daemon trong suốt phiên (nếu chưa có daemon)"""
+    daemon = None
+    if use_compile_daemon and CompileDaemonClient.discover() is None:
+        try:
+            daemon = start_daemon()
+        except (OSError, RuntimeError) as e:
+            print(f"⚠️ Không khởi động được compile daemon, dùng javac: {e}")
+    try:
+        watch(runner)
+    except KeyboardInterrupt:
+        print("\n👋 Dừng watch mode")
+    finally:
+        runner.close_harnesses()
+        runner.harness_pool.close()
+        if daemon is not None:
+            stop_daemon(*daemon)
+
+def run(args, current_dir, harness_pool=None):
+    """Chấm bài trong current_dir (given/ + TestCases/) với tham số đã parse; harness_pool: xem JavaTestRunner
+    
+    Người gọi truyền harness_pool (grade_daemon.py) tự cấu hình engine một lần; run() không tạo lại engine.
+    """
+    if args.profile:
+        PROFILER.enable()
+    own_engine = harness_pool is None
+    
     # Cấu hình đường dẫn
-    current_dir = Path.cwd()
     java_dir = current_dir / "given"
     test_dir = current_dir / "TestCases"
     
@@ -302,9 +701,45 @@ def main():
         print(f"Không tìm thấy thư mục: {test_dir}")
         return
     
+    # Watch mode: JVM harness được giữ lại giữa các lần chấm (chuyển sang build mới khi biên dịch lại)
+    if args.watch:
+        args.warm_jvm = True
+        harness_pool = harness_pool or HarnessPool()
+    
+    # Kết quả từng test ghi ra JSONL / CSV (nếu có --results / --results-csv)
+    sink = None
+    if args.results or args.results_csv:
+        results = args.results and current_dir / args.results
+        results_csv = args.results_csv and current_dir / args.results_csv
+        ResultSink.prepare(results, results_csv)
+        sink = ResultSink(results, results_csv, submission=current_dir.name)
+    
     # Chạy test
-    runner = JavaTestRunner(java_dir, test_dir)
-    runner.run_all_tests()
+    if own_engine:
+        configure_engine(args.max_jvms)
+    runner = JavaTestRunner(java_dir, test_dir, warm_jvm=args.warm_jvm, jobs=args.jobs,
+                            compile_cache=not args.no_compile_cache,
+                            max_output_bytes=int(args.max_output_mb * 1024 * 1024),
+                            early_exit=not args.no_early_exit,
+                            record_outputs=not args.no_record,
+                            incremental=not args.regrade_all,
+                            jvm_profile=args.jvm_profile,
+                            harness_pool=harness_pool,
+                            sink=sink,
+                            console=args.console)
+    try:
+        if args.watch:
+            watch_forever(runner, use_compile_daemon=not args.no_compile_cache)
+            return
+        runner.run_all_tests()
+    finally:
+        if sink is not None:
+            sink.close()
+    if args.profile:
+        PROFILER.report(current_dir / args.profile)
+
+def main():
+    run(build_parser().parse_args(), Path.cwd())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+from compile_daemon import BUILDS_DIR, CompileDaemonClient
+from jvm_harness import CACHE_DIR
+
+DEFAULT_MAX_BYTES = int(os.environ.get("AUTOGRADE_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+FAILED_MARKER = "COMPILE_FAILED"
+LOG_FILE = "javac.log"
+# Hash và các kiểu (class / interface / enum / record) khai báo trong từng file nguồn của một build thành công,
+# dùng để biên dịch tăng dần build sau
+SOURCES_FILE = "sources.json"
+# Dung lượng build (byte), ghi một lần khi tạo để evict() khỏi phải duyệt lại từng file
+SIZE_FILE = "size"
+# Build tăng dần (watch mode) được lưu dưới key riêng: chỉ watch mode đọc, check.py / batch_check.py luôn dùng
+# build đầy đủ
+INCREMENTAL_SUFFIX = "-inc"
+# evict() chỉ quét cache sau khi đã thêm khoảng max_bytes / EVICT_SLACK byte build mới
+EVICT_SLACK = 16
+
+_PACKAGE = re.compile(r"^\s*package\s+([\w.]+)\s*;", re.MULTILINE)
+_TYPE_DECLARATION = re.compile(r"\b(?:class|interface|enum|record)\s+([A-Za-z_$][\w$]*)")
+
+
+def tool_version(tool: str) -> str:
+    """Phiên bản của java / javac trong PATH, cache theo đường dẫn + mtime của file để khỏi khởi động JVM mỗi lần."""
+    executable = shutil.which(tool)
+    if not executable:
+        return "unknown"
+    real = Path(executable).resolve()
+    stat = real.stat()
+    fingerprint = f"{real}|{stat.st_mtime_ns}|{stat.st_size}"
+
+    versions_file = CACHE_DIR / f"{tool}-version.json"
+    try:
+        versions = json.loads(versions_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        versions = {}
+    if fingerprint in versions:
+        return versions[fingerprint]
+
+    result = subprocess.run([executable, "-version"], capture_output=True, text=True)
+    # JDK 8 in ra stderr, JDK 9+ in ra stdout
+    version = (result.stdout + result.stderr).strip() or "unknown"
+    versions[fingerprint] = version
+    versions_file.parent.mkdir(parents=True, exist_ok=True)
+    versions_file.write_text(json.dumps(versions, indent=2), encoding="utf-8")
+    return version
+
+
+def javac_version() -> str:
+    """Phiên bản javac trong PATH (một phần của key compile cache)."""
+    return tool_version("javac")
+
+
+class CompileCache:
+    """Cache kết quả javac theo nội dung: key = hash(mã nguồn, phiên bản javac, flags), LRU theo dung lượng."""
+
+    def __init__(self, root: Path | None = None, max_bytes: int = DEFAULT_MAX_BYTES, use_daemon: bool = True) -> None:
+        self.root = Path(root) if root else BUILDS_DIR
+        self.max_bytes = max_bytes
+        # use_daemon: biên dịch qua CompileDaemon của chính user này nếu đang chạy (xem compile_daemon.py);
+        # daemon chỉ nhận thư mục output trong BUILDS_DIR
+        self.use_daemon = use_daemon and self.root.resolve().is_relative_to(BUILDS_DIR.resolve())
+        self._daemon: CompileDaemonClient | None = None
+        self._daemon_checked = False
+        # File được biên dịch lại ở lần compile() gần nhất nếu biên dịch tăng dần, None = toàn bộ / cache hit
+        self.recompiled: list[str] | None = None
+        # Số byte build mới kể từ lần evict() gần nhất; bắt đầu từ max_bytes để lần miss đầu tiên luôn quét
+        self._pending_bytes = max_bytes
+
+    def _javac(self, source_dir: Path, java_files: list[Path], flags: list[str], out_dir: Path) -> tuple[bool, str]:
+        """Chạy javac (qua daemon nếu có) và trả về (thành công, log lỗi)."""
+        if self.use_daemon and not self._daemon_checked:
+            self._daemon = CompileDaemonClient.discover()
+            self._daemon_checked = True
+        if self._daemon is not None:
+            try:
+                return self._daemon.compile(java_files, flags, out_dir)
+            except (OSError, ValueError):
+                self._daemon = None  # daemon đã tắt - quay về javac
+
+        result = subprocess.run(
+            ["javac", *flags, "-d", str(out_dir)] + [str(f) for f in java_files],
+            capture_output=True,
+            text=True,
+            cwd=str(source_dir),
+        )
+        return result.returncode == 0, result.stderr
+
+    def key(self, source_dir: Path, java_files: list[Path], flags: list[str]) -> str:
+        """Hash nội dung các file nguồn (theo đường dẫn tương đối) cùng phiên bản javac và flags."""
+        digest = hashlib.sha256()
+        digest.update(javac_version().encode("utf-8"))
+        digest.update("\0".join(flags).encode("utf-8"))
+        for java_file in sorted(java_files, key=lambda f: f.relative_to(source_dir).as_posix()):
+            digest.update(b"\0" + java_file.relative_to(source_dir).as_posix().encode("utf-8") + b"\0")
+            digest.update(java_file.read_bytes())
+        return digest.hexdigest()
+
+    def compile(
+        self, source_dir: Path, java_files: list[Path], flags: list[str], base: Path | None = None
+    ) -> tuple[bool, str, Path, bool]:
+        """Biên dịch (hoặc lấy từ cache); trả về (thành công, log javac, thư mục .class, cache hit).
+
+        base: build thành công trước đó của cùng bài (watch mode) - chỉ biên dịch lại các file đã đổi; kết quả
+        được lưu dưới key + INCREMENTAL_SUFFIX để không lẫn với build đầy đủ.
+        """
+        self.recompiled = None
+        key = self.key(source_dir, java_files, flags)
+        build_dir = self.root / key[:2] / key
+        candidates = [build_dir, build_dir.with_name(key + INCREMENTAL_SUFFIX)] if base else [build_dir]
+        for cached in candidates:
+            if cached.exists():
+                os.utime(cached)  # cập nhật thời điểm dùng gần nhất cho LRU
+                return self._result(cached) + (True,)
+
+        tmp_dir = build_dir.with_name(f"{key}.tmp-{os.getpid()}-{time.monotonic_ns()}")
+        tmp_dir.mkdir(parents=True)
+        try:
+            sources = self._sources(source_dir, java_files)
+            result = self._compile_incremental(source_dir, sources, flags, base, tmp_dir) if base else None
+            if result is None:
+                result = self._javac(source_dir, java_files, flags, tmp_dir)
+            else:
+                build_dir = candidates[-1]
+            success, log = result
+            (tmp_dir / LOG_FILE).write_text(log, encoding="utf-8")
+            if success:
+                _write_sources(tmp_dir, sources)
+            else:
+                (tmp_dir / FAILED_MARKER).touch()
+            size = _tree_size(tmp_dir)
+            (tmp_dir / SIZE_FILE).write_text(str(size), encoding="ascii")
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        try:
+            tmp_dir.rename(build_dir)
+        except OSError:
+            # Worker khác vừa build xong cùng key - dùng bản đó
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._pending_bytes += size
+        if self._pending_bytes > self.max_bytes // EVICT_SLACK:
+            self.evict()
+        return self._result(build_dir) + (False,)
+
+    @staticmethod
+    def _sources(source_dir: Path, java_files: list[Path]) -> dict[str, dict]:
+        """Hash và tên đầy đủ (pkg/Name) các kiểu khai báo trong từng file nguồn, key = đường dẫn tương đối."""
+        sources = {}
+        for java_file in java_files:
+            data = java_file.read_bytes()
+            text = data.decode("utf-8", errors="replace")
+            package = _PACKAGE.search(text)
+            prefix = package.group(1).replace(".", "/") + "/" if package else ""
+            sources[java_file.relative_to(source_dir).as_posix()] = {
+                "hash": hashlib.sha256(data).hexdigest(),
+                "types": sorted({prefix + name for name in _TYPE_DECLARATION.findall(text)}),
+                "text": text,
+            }
+        return sources
+
+    def _compile_incremental(
+        self, source_dir: Path, sources: dict[str, dict], flags: list[str], base: Path, out_dir: Path
+    ) -> tuple[bool, str] | None:
+        """Biên dịch tăng dần vào out_dir từ build base; trả về (thành công, log javac) như _javac.
+
+        Chỉ javac các file đã đổi và các file nhắc tới tên kiểu (cũ hoặc mới) khai báo trong đó, với các
+        .class còn lại của base trong classpath. None nếu không áp dụng được (có file bị xóa, base hỏng,
+        phải biên dịch lại gần hết) - khi đó biên dịch toàn bộ.
+        """
+        try:
+            previous = json.loads((base / SOURCES_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if set(previous) - set(sources):
+            return None
+        changed = [rel for rel, info in sources.items() if previous.get(rel, {}).get("hash") != info["hash"]]
+        stale = {t for rel in changed for t in previous.get(rel, {}).get("types", [])}
+        names = {t.rsplit("/", 1)[-1] for t in stale.union(*(sources[rel]["types"] for rel in changed))}
+        recompile = list(changed)
+        if names:
+            # File khai báo một tên cũng nhắc tới tên đó, nên .class bị xóa dưới đây luôn được biên dịch lại
+            mention = re.compile(r"\b(?:" + "|".join(re.escape(name) for name in sorted(names)) + r")\b")
+            recompile += [rel for rel in sources if rel not in changed and mention.search(sources[rel]["text"])]
+        if not recompile or len(recompile) == len(sources):
+            return None
+
+        try:
+            shutil.copytree(base, out_dir, dirs_exist_ok=True, ignore=shutil.ignore_patterns(SOURCES_FILE))
+        except OSError:
+            return None  # base vừa bị evict
+        for type_path in stale:
+            package_dir, _sep, name = type_path.rpartition("/")
+            class_dir = out_dir / package_dir
+            for class_file in [class_dir / f"{name}.class", *class_dir.glob(f"{name}$*.class")]:
+                class_file.unlink(missing_ok=True)
+
+        self.recompiled = sorted(recompile)
+        return self._javac(source_dir, [source_dir / rel for rel in recompile], [*flags, "-cp", str(out_dir)], out_dir)
+
+    @staticmethod
+    def _result(build_dir: Path) -> tuple[bool, str, Path]:
+        log = build_dir / LOG_FILE
+        log_text = log.read_text(encoding="utf-8") if log.exists() else ""
+        return not (build_dir / FAILED_MARKER).exists(), log_text, build_dir
+
+    def evict(self) -> None:
+        """Xóa các build ít dùng nhất cho đến khi tổng dung lượng <= max_bytes."""
+        self._pending_bytes = 0
+        entries = []
+        total = 0
+        for build_dir in self.root.glob("*/*"):
+            if not build_dir.is_dir() or ".tmp-" in build_dir.name:
+                continue
+            try:
+                size = int((build_dir / SIZE_FILE).read_text(encoding="ascii"))
+            except (OSError, ValueError):
+                size = _tree_size(build_dir)  # build cũ chưa có SIZE_FILE
+            entries.append((build_dir.stat().st_mtime, size, build_dir))
+            total += size
+
+        for _mtime, size, build_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(build_dir, ignore_errors=True)
+            total -= size
+
+
+def _tree_size(directory: Path) -> int:
+    return sum(f.stat().st_size for f in directory.rglob("*") if f.is_file())
+
+
+def _write_sources(build_dir: Path, sources: dict[str, dict]) -> None:
+    data = {rel: {"hash": info["hash"], "types": info["types"]} for rel, info in sources.items()}
+    (build_dir / SOURCES_FILE).write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
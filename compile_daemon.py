@@ -0,0 +1,288 @@
+import argparse
+import os
+import secrets
+import socket
+import subprocess
+from pathlib import Path
+
+from jvm_harness import CACHE_DIR, ensure_java_tool
+
+DAEMON_CLASS = "CompileDaemon"
+
+# "<cổng> <secret>" của daemon đang chạy; chỉ user khởi động daemon đọc được (quyền 0600)
+PORT_FILE = CACHE_DIR / "compile-daemon.port"
+# Daemon chỉ ghi .class vào (và chỉ đọc classpath từ) thư mục build của compile cache
+BUILDS_DIR = CACHE_DIR / "builds"
+
+# Server biên dịch: một JVM giữ javax.tools.JavaCompiler "nóng", nhận yêu cầu qua TCP localhost.
+# Mọi yêu cầu bắt đầu bằng dòng secret (đọc từ PORT_FILE), sau đó:
+#   "COMPILE <số flag> <số file>\n<thư mục output>\n<flag>...\n<file>...\n"  hoặc "PING\n" / "SHUTDOWN\n"
+# Trả lời:  "OK <len>\n" hoặc "FAIL <len>\n" + log javac (UTF-8); sai secret thì đóng kết nối.
+# Flag chỉ được là -encoding / -source / -target / --release và -cp trong BUILDS_DIR; thư mục output phải nằm
+# trong BUILDS_DIR; annotation processor luôn bị tắt (-proc:none) - user khác trên cùng máy không thể dùng
+# daemon để chạy code hay ghi file dưới quyền của người chấm.
+DAEMON_SOURCE = r"""
+import java.io.*;
+import java.net.*;
+import java.nio.charset.StandardCharsets;
+import java.security.MessageDigest;
+import java.util.*;
+import java.util.concurrent.*;
+import javax.tools.*;
+
+public class CompileDaemon {
+    private static final Set<String> VALUE_OPTIONS = new HashSet<String>(
+        Arrays.asList("-encoding", "-source", "-target", "--release"));
+    private static final Set<String> CLASSPATH_OPTIONS = new HashSet<String>(
+        Arrays.asList("-cp", "-classpath", "--class-path"));
+
+    private static byte[] secret;
+    private static String buildRoot;
+
+    public static void main(String[] args) throws Exception {
+        final JavaCompiler compiler = ToolProvider.getSystemJavaCompiler();
+        if (compiler == null) {
+            System.err.println("Không có Java compiler (đang chạy bằng JRE thay vì JDK?)");
+            System.exit(2);
+        }
+        // Secret được truyền qua stdin (không hiện trong danh sách tiến trình như tham số dòng lệnh)
+        String line = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.US_ASCII)).readLine();
+        if (line == null || line.isEmpty()) {
+            System.err.println("Thiếu secret");
+            System.exit(2);
+        }
+        secret = line.getBytes(StandardCharsets.US_ASCII);
+        buildRoot = new File(args[1]).getCanonicalPath() + File.separator;
+        ServerSocket server = new ServerSocket(Integer.parseInt(args[0]), 50, InetAddress.getLoopbackAddress());
+        System.out.println("READY " + server.getLocalPort());
+        System.out.flush();
+
+        ExecutorService pool = Executors.newFixedThreadPool(Runtime.getRuntime().availableProcessors());
+        while (true) {
+            final Socket socket = server.accept();
+            pool.submit(new Runnable() {
+                public void run() {
+                    handle(compiler, socket);
+                }
+            });
+        }
+    }
+
+    private static void handle(JavaCompiler compiler, Socket socket) {
+        try (Socket s = socket;
+             BufferedReader in = new BufferedReader(new InputStreamReader(s.getInputStream(), StandardCharsets.UTF_8));
+             OutputStream out = s.getOutputStream()) {
+            String token = in.readLine();
+            if (token == null || !MessageDigest.isEqual(token.getBytes(StandardCharsets.US_ASCII), secret)) {
+                return;
+            }
+            String header = in.readLine();
+            if (header == null) {
+                return;
+            }
+            if (header.equals("PING")) {
+                reply(out, true, "");
+                return;
+            }
+            if (header.equals("SHUTDOWN")) {
+                reply(out, true, "");
+                System.exit(0);
+            }
+            String[] parts = header.split(" ");
+            if (parts.length != 3 || !parts[0].equals("COMPILE")) {
+                reply(out, false, "Yêu cầu không hợp lệ");
+                return;
+            }
+            String outDir = in.readLine();
+            List<String> requested = new ArrayList<String>();
+            for (int i = 0; i < Integer.parseInt(parts[1]); i++) {
+                requested.add(in.readLine());
+            }
+            List<File> files = new ArrayList<File>();
+            for (int i = 0; i < Integer.parseInt(parts[2]); i++) {
+                files.add(new File(in.readLine()));
+            }
+            String error = validate(outDir, requested, files);
+            if (error != null) {
+                reply(out, false, error);
+                return;
+            }
+            List<String> options = new ArrayList<String>(requested);
+            options.add("-proc:none");
+            options.add("-d");
+            options.add(outDir);
+
+            StringWriter log = new StringWriter();
+            boolean ok;
+            try (StandardJavaFileManager fm = compiler.getStandardFileManager(null, null, null)) {
+                ok = compiler.getTask(log, fm, null, options, null, fm.getJavaFileObjectsFromFiles(files)).call();
+            } catch (RuntimeException e) {
+                ok = false;
+                log.write(e.toString());
+            }
+            reply(out, ok, log.toString());
+        } catch (IOException ignored) {
+        }
+    }
+
+    private static boolean insideBuildRoot(String path) throws IOException {
+        return path != null && (new File(path).getCanonicalPath() + File.separator).startsWith(buildRoot);
+    }
+
+    // null nếu yêu cầu hợp lệ, ngược lại là lý do từ chối
+    private static String validate(String outDir, List<String> options, List<File> files) throws IOException {
+        if (!insideBuildRoot(outDir)) {
+            return "Thư mục output phải nằm trong " + buildRoot;
+        }
+        for (int i = 0; i < options.size(); i++) {
+            String option = options.get(i);
+            if (i + 1 >= options.size()) {
+                return "Flag không được phép: " + option;
+            }
+            String value = options.get(++i);
+            if (CLASSPATH_OPTIONS.contains(option)) {
+                for (String entry : value.split(File.pathSeparator)) {
+                    if (!insideBuildRoot(entry)) {
+                        return "Classpath phải nằm trong " + buildRoot;
+                    }
+                }
+            } else if (!VALUE_OPTIONS.contains(option)) {
+                return "Flag không được phép: " + option;
+            }
+        }
+        for (File file : files) {
+            if (!file.getName().endsWith(".java")) {
+                return "Không phải file .java: " + file;
+            }
+        }
+        return null;
+    }
+
+    private static void reply(OutputStream out, boolean ok, String log) throws IOException {
+        byte[] body = log.getBytes(StandardCharsets.UTF_8);
+        out.write(((ok ? "OK " : "FAIL ") + body.length + "\n").getBytes(StandardCharsets.US_ASCII));
+        out.write(body);
+        out.flush();
+    }
+}
+"""
+
+
+class CompileDaemonClient:
+    """Client gửi yêu cầu biên dịch tới CompileDaemon đang chạy trên localhost."""
+
+    def __init__(self, port: int, secret: str, timeout: float = 120) -> None:
+        self.port = port
+        self.secret = secret
+        self.timeout = timeout
+
+    @classmethod
+    def discover(cls) -> "CompileDaemonClient | None":
+        """Tìm daemon qua file port trong cache; None nếu không có daemon nào đang chạy.
+
+        File port của user khác hoặc đọc được bởi user khác bị bỏ qua.
+        """
+        try:
+            if hasattr(os, "getuid"):
+                info = PORT_FILE.stat()
+                if info.st_uid != os.getuid() or info.st_mode & 0o077:
+                    return None
+            port, secret = PORT_FILE.read_text(encoding="ascii").split()
+            client = cls(int(port), secret)
+        except (OSError, ValueError):
+            return None
+        return client if client.ping() else None
+
+    def ping(self) -> bool:
+        """Daemon đang chạy và nhận đúng secret."""
+        try:
+            return self._request("PING\n", timeout=2)[0]
+        except (OSError, ValueError):
+            return False
+
+    def _request(self, payload: str, timeout: float | None = None) -> tuple[bool, str]:
+        with socket.create_connection(("127.0.0.1", self.port), timeout=timeout or self.timeout) as sock:
+            sock.sendall(f"{self.secret}\n{payload}".encode("utf-8"))
+            reader = sock.makefile("rb")
+            status, length = reader.readline().decode("ascii").split()
+            body = reader.read(int(length)).decode("utf-8", errors="replace")
+        return status == "OK", body
+
+    def compile(self, java_files: list[Path], flags: list[str], out_dir: Path) -> tuple[bool, str]:
+        """Biên dịch java_files vào out_dir; trả về (thành công, log lỗi) giống stderr của javac."""
+        lines = [f"COMPILE {len(flags)} {len(java_files)}", str(Path(out_dir).resolve())]
+        lines += flags
+        lines += [str(Path(f).resolve()) for f in java_files]
+        return self._request("\n".join(lines) + "\n")
+
+    def shutdown(self) -> None:
+        try:
+            self._request("SHUTDOWN\n")
+        except OSError:
+            pass
+
+
+def start_daemon() -> tuple[subprocess.Popen, CompileDaemonClient]:
+    """Khởi động CompileDaemon ở cổng ngẫu nhiên với secret mới, ghi cổng + secret vào PORT_FILE (quyền 0600)."""
+    classes_dir = ensure_java_tool(DAEMON_CLASS, DAEMON_SOURCE)
+    BUILDS_DIR.mkdir(parents=True, exist_ok=True)
+    secret = secrets.token_hex(32)
+    process = subprocess.Popen(
+        ["java", "-cp", str(classes_dir), DAEMON_CLASS, "0", str(BUILDS_DIR)],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        process.stdin.write(secret + "\n")
+        process.stdin.close()
+    except OSError:
+        pass
+    ready = process.stdout.readline().split()
+    if len(ready) != 2 or ready[0] != "READY":
+        process.kill()
+        raise RuntimeError("Không khởi động được compile daemon")
+
+    PORT_FILE.parent.mkdir(parents=True, exist_ok=True)
+    PORT_FILE.unlink(missing_ok=True)
+    fd = os.open(PORT_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="ascii") as f:
+        f.write(f"{ready[1]} {secret}")
+    return process, CompileDaemonClient(int(ready[1]), secret)
+
+
+def stop_daemon(process: subprocess.Popen, client: CompileDaemonClient) -> None:
+    """Tắt daemon và xóa PORT_FILE."""
+    client.shutdown()
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    PORT_FILE.unlink(missing_ok=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compile daemon: giữ javac nóng cho các lượt chấm hàng loạt")
+    parser.add_argument("action", choices=["start", "stop"], help="start: chạy daemon (Ctrl+C để dừng), stop: tắt")
+    args = parser.parse_args()
+
+    if args.action == "stop":
+        client = CompileDaemonClient.discover()
+        if client is None:
+            print("⚠️  Không có compile daemon nào đang chạy")
+            return
+        client.shutdown()
+        PORT_FILE.unlink(missing_ok=True)
+        print("✓ Đã tắt compile daemon")
+        return
+
+    process, client = start_daemon()
+    print(f"✓ Compile daemon đang chạy ở cổng {client.port} (Ctrl+C để dừng)")
+    try:
+        process.wait()
+    except KeyboardInterrupt:
+        stop_daemon(process, client)
+
+
+if __name__ == "__main__":
+    main()
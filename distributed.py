@@ -0,0 +1,621 @@
+import argparse
+import contextlib
+import hashlib
+import hmac
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import traceback
+from collections import deque
+from pathlib import Path
+
+from batch_check import discover_submissions, grade_submission, share_result, submission_fingerprint, write_gradebook
+from java_exec import VERDICT_INTERNAL_ERROR
+from journal import RunJournal
+from resource_usage import format_distribution
+from test_suite import load_tc_suite, load_tests_file
+
+# Thời gian giữ một job (giây): worker gia hạn định kỳ, hết hạn thì job được giao cho worker khác
+DEFAULT_LEASE_SECONDS = 120
+# Số lần hết lease tối đa của một job trước khi coi là lỗi (vd. bài làm làm sập worker)
+MAX_ATTEMPTS = 3
+# Chu kỳ coordinator kiểm tra kết quả / lease, và worker hỏi job mới khi hàng đợi trống
+POLL_INTERVAL = 1.0
+# Thời gian chờ tối đa giữa các lần worker kết nối lại coordinator
+MAX_BACKOFF = 30
+# Coordinator TCP vẫn trả lời "closed" một lúc sau khi chấm xong để các worker tự thoát
+CLOSE_GRACE = 5
+DEFAULT_PORT = 7192
+
+TOKEN_ENV = "AUTOGRADE_QUEUE_TOKEN"
+
+
+def job_id(index: int, student: str, question: int | None) -> str:
+    """Định danh job dùng được làm tên file (tên thư mục bài làm có thể chứa ký tự bất kỳ)."""
+    digest = hashlib.sha256(f"{student}\0{question}".encode("utf-8")).hexdigest()[:12]
+    return f"{index:05d}-{digest}"
+
+
+def make_jobs(
+    groups: list[list[Path]], mode: str, tests: Path | None, warm_jvm: bool, incremental: bool, lease_seconds: float
+) -> list[dict]:
+    """Chia các bài (đại diện mỗi nhóm bài giống hệt) thành job: PE mỗi câu một job, given mỗi bài một job."""
+    jobs: list[dict] = []
+    for members in groups:
+        submission = members[0]
+        questions = [q for q in range(1, 5) if (submission / str(q)).is_dir()] if mode == "pe" else [None]
+        for question in questions:
+            jobs.append(
+                {
+                    "id": job_id(len(jobs), submission.name, question),
+                    "student": submission.name,
+                    "path": str(submission),
+                    "question": question,
+                    "mode": mode,
+                    "tests": str(tests) if tests else None,
+                    "warm_jvm": warm_jvm,
+                    "incremental": incremental,
+                    "lease_seconds": lease_seconds,
+                    "attempt": 0,
+                }
+            )
+    return jobs
+
+
+def _write_json(path: Path, data: dict) -> None:
+    # Ghi file tạm rồi đổi tên - bên đọc (coordinator / worker khác) không bao giờ thấy file ghi dở
+    tmp_file = path.with_name(f".{path.name}.tmp-{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}")
+    tmp_file.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    tmp_file.replace(path)
+
+
+class SpoolQueue:
+    """Hàng đợi job trên thư mục dùng chung (ổ mạng / volume của container, hoặc thư mục local khi thử).
+
+    jobs/<id>.json: job chờ chấm; leases/<id>.json: job đang được chấm (mtime = lần gia hạn gần nhất);
+    results/<id>.json: kết quả. Worker nhận job bằng os.rename() (nguyên tử) từ jobs/ sang leases/,
+    coordinator trả job có lease quá hạn về jobs/. File CLOSED báo lượt chấm đã xong.
+    """
+
+    def __init__(self, root: Path, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> None:
+        self.root = Path(root)
+        self.lease_seconds = lease_seconds
+        self.jobs_dir = self.root / "jobs"
+        self.leases_dir = self.root / "leases"
+        self.results_dir = self.root / "results"
+        self.closed_file = self.root / "CLOSED"
+        self._done: set[str] = set()
+
+    # --- phía coordinator ---
+
+    def submit(self, jobs: list[dict]) -> None:
+        """Bắt đầu lượt chấm mới: xóa job / kết quả cũ còn sót trong spool rồi ghi các job."""
+        for directory in (self.jobs_dir, self.leases_dir, self.results_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+            for stale in directory.glob("*.json"):
+                stale.unlink(missing_ok=True)
+        self.closed_file.unlink(missing_ok=True)
+        for job in jobs:
+            _write_json(self.jobs_dir / f"{job['id']}.json", job)
+
+    def expire(self) -> tuple[list[dict], list[dict]]:
+        """Thu hồi job có lease quá hạn; trả về (job đã giao lại, job bỏ cuộc sau MAX_ATTEMPTS lần)."""
+        requeued: list[dict] = []
+        failed: list[dict] = []
+        now = time.time()
+        for lease in self.leases_dir.glob("*.json"):
+            try:
+                if now - lease.stat().st_mtime <= self.lease_seconds:
+                    continue
+                job = json.loads(lease.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue  # worker vừa xong (lease đã bị xóa) hoặc file đang được đổi tên
+            if job["id"] in self._done:
+                # Đã có kết quả (từ lần giao khác) hoặc đã bỏ cuộc - lease còn sót, không giao lại
+                lease.unlink(missing_ok=True)
+                continue
+            job["attempt"] += 1
+            if job["attempt"] >= MAX_ATTEMPTS:
+                failed.append(job)
+                self._done.add(job["id"])
+            else:
+                _write_json(self.jobs_dir / lease.name, job)
+                requeued.append(job)
+            lease.unlink(missing_ok=True)
+        return requeued, failed
+
+    def drain_results(self) -> list[tuple[dict, dict]]:
+        """Lấy các kết quả mới [(job, kết quả)]; kết quả trùng (job đã bị giao lại) bị bỏ qua."""
+        results: list[tuple[dict, dict]] = []
+        for path in sorted(self.results_dir.glob("*.json")):
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            path.unlink(missing_ok=True)
+            job = data["job"]
+            if job["id"] in self._done:
+                continue
+            self._done.add(job["id"])
+            # Job có thể đang chờ chấm lại (lease từng hết hạn) - hủy bản đó
+            (self.jobs_dir / path.name).unlink(missing_ok=True)
+            results.append((job, data["result"]))
+        return results
+
+    def close(self) -> None:
+        self.closed_file.touch()
+
+    # --- phía worker ---
+
+    def lease(self, worker: str) -> dict | None:
+        """Nhận một job đang chờ; None nếu hàng đợi trống."""
+        for path in sorted(self.jobs_dir.glob("*.json")):
+            target = self.leases_dir / path.name
+            try:
+                os.utime(path)  # bắt đầu lease trước khi đổi tên để coordinator không thu hồi nhầm
+                os.rename(path, target)
+                job = json.loads(target.read_text(encoding="utf-8"))
+            except (FileNotFoundError, ValueError):
+                continue  # worker khác đã nhận trước
+            return job
+        return None
+
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        """Gia hạn lease; False nếu job đã bị thu hồi."""
+        try:
+            os.utime(self.leases_dir / f"{job_id}.json")
+        except FileNotFoundError:
+            return False
+        return True
+
+    def complete(self, job: dict, worker: str, result: dict) -> None:
+        _write_json(self.results_dir / f"{job['id']}.json", {"job": job, "worker": worker, "result": result})
+        (self.leases_dir / f"{job['id']}.json").unlink(missing_ok=True)
+
+    @property
+    def closed(self) -> bool:
+        return self.closed_file.exists()
+
+
+class LeaseTable:
+    """Hàng đợi job trong bộ nhớ của coordinator TCP (cùng giao diện phía coordinator với SpoolQueue)."""
+
+    def __init__(self, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> None:
+        self.lease_seconds = lease_seconds
+        self.closed = False
+        self._lock = threading.Lock()
+        self._pending: deque[dict] = deque()
+        self._leased: dict[str, tuple[dict, float, str]] = {}
+        self._jobs: dict[str, dict] = {}
+        self._done: set[str] = set()
+        self._results: list[tuple[dict, dict]] = []
+
+    def submit(self, jobs: list[dict]) -> None:
+        with self._lock:
+            for job in jobs:
+                self._jobs[job["id"]] = job
+                self._pending.append(job)
+
+    def expire(self) -> tuple[list[dict], list[dict]]:
+        requeued: list[dict] = []
+        failed: list[dict] = []
+        now = time.monotonic()
+        with self._lock:
+            for job_id_, (job, deadline, _worker) in list(self._leased.items()):
+                if now <= deadline:
+                    continue
+                del self._leased[job_id_]
+                job["attempt"] += 1
+                if job["attempt"] >= MAX_ATTEMPTS:
+                    self._done.add(job_id_)
+                    failed.append(job)
+                else:
+                    self._pending.appendleft(job)
+                    requeued.append(job)
+        return requeued, failed
+
+    def drain_results(self) -> list[tuple[dict, dict]]:
+        with self._lock:
+            results, self._results = self._results, []
+        return results
+
+    def close(self) -> None:
+        self.closed = True
+
+    def handle(self, request: dict) -> dict:
+        """Xử lý một yêu cầu của worker: lease / heartbeat / complete."""
+        op = request.get("op")
+        worker = str(request.get("worker", "?"))
+        with self._lock:
+            if op == "lease":
+                if not self._pending:
+                    return {"job": None, "closed": self.closed}
+                job = self._pending.popleft()
+                self._leased[job["id"]] = (job, time.monotonic() + self.lease_seconds, worker)
+                return {"job": job, "closed": False}
+            if op == "heartbeat":
+                entry = self._leased.get(request.get("job_id"))
+                if entry is None:
+                    return {"ok": False}
+                self._leased[entry[0]["id"]] = (entry[0], time.monotonic() + self.lease_seconds, entry[2])
+                return {"ok": True}
+            if op == "complete":
+                job = self._jobs.get(request.get("job_id"))
+                if job is None:
+                    return {"ok": False}
+                if job["id"] not in self._done:
+                    self._done.add(job["id"])
+                    self._leased.pop(job["id"], None)
+                    with contextlib.suppress(ValueError):
+                        self._pending.remove(job)
+                    self._results.append((job, request["result"]))
+                return {"ok": True}
+        return {"error": f"unknown op {op!r}"}
+
+
+class _QueueHandler(socketserver.StreamRequestHandler):
+    # Mỗi kết nối một yêu cầu: một dòng JSON gửi đi, một dòng JSON trả lời
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        if self.server.token and not hmac.compare_digest(str(request.get("token", "")), self.server.token):
+            reply = {"error": "sai token"}
+        else:
+            reply = self.server.table.handle(request)
+        self.wfile.write((json.dumps(reply, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+class QueueServer(socketserver.ThreadingTCPServer):
+    """Server TCP của coordinator: phục vụ LeaseTable cho các worker trên máy khác."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: tuple[str, int], table: LeaseTable, token: str | None) -> None:
+        super().__init__(address, _QueueHandler)
+        self.table = table
+        self.token = token or ""
+
+
+class QueueClient:
+    """Client của worker gửi yêu cầu tới QueueServer (mỗi yêu cầu một kết nối, tự nối lại sau lỗi mạng)."""
+
+    def __init__(self, host: str, port: int, token: str | None = None, timeout: float = 30) -> None:
+        self.host = host
+        self.port = port
+        self.token = token or ""
+        self.timeout = timeout
+        self.closed = False
+
+    def _request(self, payload: dict) -> dict:
+        with socket.create_connection((self.host, self.port), timeout=self.timeout) as sock:
+            sock.sendall((json.dumps({**payload, "token": self.token}, ensure_ascii=False) + "\n").encode("utf-8"))
+            line = sock.makefile("rb").readline()
+        try:
+            reply = json.loads(line)
+        except ValueError:
+            raise ConnectionError("coordinator đóng kết nối giữa chừng") from None
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply
+
+    def lease(self, worker: str) -> dict | None:
+        reply = self._request({"op": "lease", "worker": worker})
+        self.closed = reply.get("closed", False)
+        return reply.get("job")
+
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        return self._request({"op": "heartbeat", "job_id": job_id, "worker": worker}).get("ok", False)
+
+    def complete(self, job: dict, worker: str, result: dict) -> None:
+        self._request({"op": "complete", "job_id": job["id"], "worker": worker, "result": result})
+
+
+def grade_job(job: dict, cohort_dir: Path | None, tests: Path | None) -> dict:
+    """Chấm một job trên worker; trả về {"row": dòng bảng điểm của phần đã chấm, "log": console output}.
+
+    cohort_dir / tests: đường dẫn trên máy worker (nếu khác đường dẫn trên coordinator).
+    """
+    submission = cohort_dir / job["student"] if cohort_dir else Path(job["path"])
+    test_path = tests or (Path(job["tests"]) if job["tests"] else None)
+    questions = [job["question"]] if job["question"] else None
+    with tempfile.TemporaryDirectory(prefix="autograde-job-") as log_dir:
+        try:
+            row = grade_submission(
+                submission,
+                job["mode"],
+                test_path,
+                Path(log_dir),
+                job["warm_jvm"],
+                job["incremental"],
+                questions=questions,
+            )
+        except Exception as exc:  # noqa: BLE001
+            row = {"student": job["student"], "status": f"ERROR: {exc}", "earned": 0.0, "total": 0.0, "scores": {}}
+            return {"row": row, "log": traceback.format_exc()}
+        try:
+            log = (Path(log_dir) / f"{submission.name}.log").read_text(encoding="utf-8")
+        except OSError:
+            log = ""
+    return {"row": row, "log": log}
+
+
+def _retry(action, what: str):
+    """Gọi action cho tới khi thành công, chờ tăng dần giữa các lần (coordinator khởi động lại / mạng chập chờn)."""
+    backoff = 1.0
+    while True:
+        try:
+            return action()
+        except OSError as exc:
+            print(f"⚠️  Không {what} được ({exc}) - thử lại sau {backoff:.0f}s", flush=True)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+
+def run_worker(queue: SpoolQueue | QueueClient, cohort_dir: Path | None, tests: Path | None, keep_alive: bool) -> int:
+    """Vòng lặp của worker: nhận job, chấm (gia hạn lease trong lúc chấm), gửi kết quả. Trả về số job đã chấm."""
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    graded = 0
+    print(f"👷 Worker {worker} sẵn sàng", flush=True)
+    while True:
+        job = _retry(lambda: queue.lease(worker), "nhận job")
+        if job is None:
+            if queue.closed and not keep_alive:
+                break
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        label = job["student"] + (f" Q{job['question']}" if job["question"] else "")
+        print(f"▶️  {label} (lần {job['attempt'] + 1})", flush=True)
+        stop = threading.Event()
+
+        def beat(job: dict = job) -> None:
+            while not stop.wait(job["lease_seconds"] / 3):
+                with contextlib.suppress(OSError, RuntimeError):
+                    if not queue.heartbeat(job["id"], worker):
+                        print(f"⚠️  Lease của {label} đã bị thu hồi - kết quả có thể bị bỏ qua", flush=True)
+
+        heartbeat = threading.Thread(target=beat, daemon=True)
+        heartbeat.start()
+        try:
+            result = grade_job(job, cohort_dir, tests)
+        finally:
+            stop.set()
+            heartbeat.join()
+        _retry(lambda: queue.complete(job, worker, result), "gửi kết quả")
+        graded += 1
+        row = result["row"]
+        print(f"✓ {label}: {row['earned']:.1f}/{row['total']:.1f} {row['status']}", flush=True)
+    print(f"👋 Hết job - worker {worker} đã chấm {graded} job", flush=True)
+    return graded
+
+
+def merge_rows(student: str, rows: list[dict]) -> dict:
+    """Gộp kết quả các job (từng câu) của một bài thành một dòng bảng điểm."""
+    merged = {"student": student, "status": "OK", "earned": 0.0, "total": 0.0, "scores": {}}
+    cpu_values = [row["cpu_seconds"] for row in rows if "cpu_seconds" in row]
+    rss_values = [row["peak_rss_mb"] for row in rows if "peak_rss_mb" in row]
+    for row in rows:
+        merged["scores"].update(row["scores"])
+        merged["earned"] += row["earned"]
+        merged["total"] += row["total"]
+        if row["status"] != "OK":
+            merged["status"] = row["status"]
+    if cpu_values:
+        merged["cpu_seconds"] = round(sum(cpu_values), 3)
+    if rss_values:
+        merged["peak_rss_mb"] = max(rss_values)
+    return merged
+
+
+def coordinate(
+    queue: SpoolQueue | LeaseTable,
+    jobs: list[dict],
+    groups: dict[str, list[Path]],
+    log_dir: Path,
+    journal: RunJournal,
+    rows: list[dict],
+    total: int,
+) -> None:
+    """Giao job, thu hồi lease quá hạn và gộp kết quả cho tới khi mọi bài đã xong; dòng bảng điểm thêm vào rows."""
+    remaining = {student: sum(job["student"] == student for job in jobs) for student in groups}
+    parts: dict[str, list[tuple[int, dict]]] = {student: [] for student in groups}
+
+    def finish(job: dict, result: dict) -> None:
+        student = job["student"]
+        parts[student].append((job["question"] or 0, result))
+        remaining[student] -= 1
+        if remaining[student]:
+            return
+        ordered = sorted(parts.pop(student), key=lambda part: part[0])
+        (log_dir / f"{student}.log").write_text("".join(part["log"] for _, part in ordered), encoding="utf-8")
+        row = merge_rows(student, [part["row"] for _, part in ordered])
+        for shared_row in share_result(row, groups[student], log_dir):
+            rows.append(shared_row)
+            if shared_row["status"] != VERDICT_INTERNAL_ERROR:
+                journal.append({"type": "submission", "student": shared_row["student"], "row": shared_row})
+            print(
+                f"[{len(rows)}/{total}] {shared_row['student']}: "
+                f"{shared_row['earned']:.1f}/{shared_row['total']:.1f} {shared_row['status']}",
+                flush=True,
+            )
+        journal.sync()
+
+    queue.submit(jobs)
+    while any(remaining.values()):
+        requeued, failed = queue.expire()
+        for job in requeued:
+            print(f"↻ Lease của {job['student']} hết hạn - giao lại (lần {job['attempt'] + 1})", flush=True)
+        for job in failed:
+            print(f"❌ {job['student']}: hết lease {MAX_ATTEMPTS} lần - bỏ qua", flush=True)
+            status = f"ERROR: hết lease {MAX_ATTEMPTS} lần"
+            row = {"student": job["student"], "status": status, "earned": 0.0, "total": 0.0, "scores": {}}
+            finish(job, {"row": row, "log": f"❌ Worker không chấm xong job sau {MAX_ATTEMPTS} lần\n"})
+        results = queue.drain_results()
+        for job, result in results:
+            finish(job, result)
+        if not results:
+            time.sleep(POLL_INTERVAL)
+    queue.close()
+
+
+def _address(text: str) -> tuple[str, int]:
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port or DEFAULT_PORT)
+
+
+def _is_loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+
+def coordinator_main(args: argparse.Namespace) -> None:
+    cohort_dir = args.cohort_dir.resolve()
+    if not cohort_dir.is_dir():
+        print(f"⚠️  Không tìm thấy thư mục: {cohort_dir}")
+        return
+    submissions = discover_submissions(cohort_dir, args.mode)
+    if not submissions:
+        print(f"⚠️  Không tìm thấy bài làm nào trong {cohort_dir}")
+        return
+
+    tests = args.tests.resolve() if args.tests else None
+    if tests and tests.exists():
+        load_tests_file(tests) if args.mode == "pe" else load_tc_suite(tests)
+    log_dir = args.output.resolve().parent / "logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+
+    journal = RunJournal(args.output.resolve().with_suffix(".journal"))
+    done_rows: dict[str, dict] = {}
+    if args.resume:
+        _tests, done_rows = journal.load()
+        print(f"↻ Tiếp tục từ journal: {len(done_rows)} bài đã chấm xong")
+    else:
+        journal.clear()
+    rows: list[dict] = [done_rows[sub.name] for sub in submissions if sub.name in done_rows]
+
+    # Bài giống hệt nhau chỉ chấm một lần (như batch_check.py)
+    by_key: dict[str, list[Path]] = {}
+    for sub in submissions:
+        if sub.name in done_rows:
+            continue
+        try:
+            key = sub.name if args.no_dedupe else submission_fingerprint(sub, args.mode, tests)
+        except OSError:
+            key = sub.name
+        by_key.setdefault(key, []).append(sub)
+    groups = {members[0].name: members for members in by_key.values()}
+    jobs = make_jobs(list(groups.values()), args.mode, tests, args.warm_jvm, not args.regrade_all, args.lease)
+
+    if args.spool:
+        queue: SpoolQueue | LeaseTable = SpoolQueue(args.spool.resolve(), args.lease)
+        where = f"spool {args.spool.resolve()}"
+        server = None
+    else:
+        queue = LeaseTable(args.lease)
+        address = _address(args.listen)
+        token = args.token or os.environ.get(TOKEN_ENV)
+        if not token and not _is_loopback(address[0]):
+            print(f"⚠️  Hàng đợi TCP mở ra mạng ({args.listen}) phải có --token (hoặc {TOKEN_ENV})")
+            return
+        try:
+            server = QueueServer(address, queue, token)
+        except OSError as exc:
+            print(f"⚠️  Không mở được hàng đợi TCP ở {args.listen}: {exc}")
+            return
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        where = f"TCP {server.server_address[0]}:{server.server_address[1]}"
+    print(f"🎯 {len(jobs)} job ({len(groups)} bài) đang chờ worker qua {where} (log: {log_dir})", flush=True)
+
+    try:
+        coordinate(queue, jobs, groups, log_dir, journal, rows, len(submissions))
+    except KeyboardInterrupt:
+        print(f"\n⏸️  Đã dừng - {len(rows)}/{len(submissions)} bài đã ghi vào journal")
+        print("   Chạy lại cùng lệnh với --resume để tiếp tục")
+        return
+    finally:
+        if server is not None:
+            time.sleep(CLOSE_GRACE if queue.closed else 0)  # để worker đang chờ nhận được "closed" và thoát
+            server.shutdown()
+
+    write_gradebook(rows, args.output)
+    print(f"📊 Đã ghi bảng điểm: {args.output}")
+    usage_lines = [
+        format_distribution("CPU mỗi bài", [row.get("cpu_seconds") for row in rows], "s"),
+        format_distribution("Peak RSS mỗi bài", [row.get("peak_rss_mb") for row in rows], " MB"),
+    ]
+    for line in filter(None, usage_lines):
+        print(f"📈 {line}")
+
+
+def worker_main(args: argparse.Namespace) -> None:
+    if args.spool:
+        queue: SpoolQueue | QueueClient = SpoolQueue(args.spool.resolve())
+    else:
+        host, port = _address(args.connect)
+        queue = QueueClient(host, port, args.token or os.environ.get(TOKEN_ENV))
+    cohort_dir = args.cohort_dir.resolve() if args.cohort_dir else None
+    tests = args.tests.resolve() if args.tests else None
+    try:
+        run_worker(queue, cohort_dir, tests, args.keep_alive)
+    except RuntimeError as exc:
+        print(f"❌ Coordinator từ chối: {exc}")
+    except KeyboardInterrupt:
+        print("\n⏸️  Worker dừng - job đang chấm sẽ được giao lại khi hết lease")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chấm cả lớp trên nhiều máy: một coordinator chia job, nhiều worker")
+    sub = parser.add_subparsers(dest="role", required=True)
+
+    coord = sub.add_parser("coordinator", help="Chia bài thành job (bài / câu), thu kết quả, ghi bảng điểm")
+    coord.add_argument("cohort_dir", type=Path, help="Thư mục chứa bài làm của các sinh viên")
+    coord.add_argument("--mode", choices=["given", "pe"], default="given", help="given: check.py, pe: pe_check.py")
+    coord.add_argument("--tests", type=Path, help="Test dùng chung (xem batch_check.py)")
+    coord.add_argument("--output", type=Path, default=Path("gradebook.csv"), help="File bảng điểm CSV")
+    coord.add_argument("--warm-jvm", action="store_true", help="Worker dùng JVM harness cho mỗi bài")
+    coord.add_argument("--regrade-all", action="store_true", help="Worker không dùng kết quả trong results database")
+    coord.add_argument("--resume", action="store_true", help="Bỏ qua các bài đã ghi trong journal")
+    coord.add_argument("--no-dedupe", action="store_true", help="Chấm riêng từng bài kể cả khi giống hệt bài khác")
+    coord.add_argument(
+        "--lease",
+        type=float,
+        default=DEFAULT_LEASE_SECONDS,
+        help="Thời gian lease (giây): job của worker không gia hạn kịp được giao cho worker khác "
+        f"(mặc định {DEFAULT_LEASE_SECONDS})",
+    )
+
+    work = sub.add_parser("worker", help="Nhận job từ coordinator, chấm và gửi kết quả về")
+    work.add_argument(
+        "--cohort-dir", type=Path, help="Thư mục bài làm trên máy này (nếu khác đường dẫn của coordinator)"
+    )
+    work.add_argument("--tests", type=Path, help="Test dùng chung trên máy này (nếu khác đường dẫn của coordinator)")
+    work.add_argument("--keep-alive", action="store_true", help="Không thoát khi hết job - chờ lượt chấm tiếp theo")
+
+    for role in (coord, work):
+        queue = role.add_mutually_exclusive_group(required=True)
+        queue.add_argument("--spool", type=Path, help="Hàng đợi là thư mục dùng chung (ổ mạng / volume)")
+        if role is coord:
+            queue.add_argument("--listen", metavar="HOST:PORT", help=f"Mở hàng đợi TCP (mặc định cổng {DEFAULT_PORT})")
+        else:
+            queue.add_argument("--connect", metavar="HOST:PORT", help="Địa chỉ hàng đợi TCP của coordinator")
+        role.add_argument("--token", help=f"Mã bí mật dùng chung cho hàng đợi TCP (hoặc biến môi trường {TOKEN_ENV})")
+
+    args = parser.parse_args()
+    if args.role == "coordinator":
+        coordinator_main(args)
+    else:
+        worker_main(args)
+
+
+if __name__ == "__main__":
+    main()
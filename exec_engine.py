@@ -0,0 +1,378 @@
+import asyncio
+import codecs
+import contextlib
+import io
+import locale
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from java_exec import (
+    CHUNK_SIZE,
+    DEFAULT_MAX_OUTPUT_BYTES,
+    EarlyMismatch,
+    OutputLimitExceeded,
+    OutputWatcher,
+    format_divergence,
+)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Số JVM chạy đồng thời tối đa mặc định (toàn tiến trình, mọi runner / thread dùng chung)
+DEFAULT_MAX_JVMS = os.cpu_count() or 1
+
+if sys.platform == "win32":
+    _NEW_GROUP = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    _NEW_GROUP = {"start_new_session": True}
+
+
+def _rusage_dict(rusage) -> dict:
+    # ru_maxrss: Linux tính KB, macOS tính byte
+    peak_rss = rusage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return {"user": rusage.ru_utime, "system": rusage.ru_stime, "peak_rss_mb": round(peak_rss, 2)}
+
+
+def _wait4(pid: int) -> tuple[int, dict, float]:
+    """Chờ tiến trình con kết thúc (chặn); trả về (returncode, CPU / peak RSS của tiến trình, thời điểm thoát)."""
+    _, status, rusage = os.wait4(pid, 0)
+    return os.waitstatus_to_exitcode(status), _rusage_dict(rusage), time.perf_counter()
+
+
+def _wait_exit(pid: int) -> tuple[int, dict | None, float]:
+    """Chờ tiến trình con kết thúc (chặn); trả về (returncode, tài nguyên nếu đã thu dọn, thời điểm thoát).
+
+    Có os.waitid thì chỉ chờ, chưa thu dọn (WNOWAIT): tiến trình zombie còn giữ pid và process group cho tới
+    _Child.reap(), nên kill_tree() không thể trúng tiến trình khác vừa được cấp lại pid đó.
+    """
+    if not hasattr(os, "waitid"):
+        return _wait4(pid)
+    info = os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+    returncode = info.si_status if info.si_code == os.CLD_EXITED else -info.si_status
+    return returncode, None, time.perf_counter()
+
+
+def _limit_memory(pid: int, limit_mb: int | None) -> None:
+    """Giới hạn bộ nhớ dữ liệu (RLIMIT_DATA) của tiến trình con - chỉ có trên Linux (resource.prlimit).
+
+    Gọi ngay sau khi Popen trả về (không dùng preexec_fn: engine chạy nhiều thread, tiến trình con có thể bị
+    deadlock giữa fork và exec). Không dùng RLIMIT_AS: JVM giữ trước rất nhiều địa chỉ ảo (heap, code cache,
+    metaspace) nên không khởi động được.
+    """
+    if not limit_mb or resource is None or not hasattr(resource, "prlimit"):
+        return
+    limit = limit_mb * 1024 * 1024
+    with contextlib.suppress(OSError, ValueError):
+        resource.prlimit(pid, resource.RLIMIT_DATA, (limit, limit))
+
+
+class _Child:
+    """Tiến trình con của một lần chạy: stdout/stderr dạng asyncio.StreamReader, wait() trả về
+    (returncode, thời điểm thoát), reap() trả về tài nguyên đã dùng.
+
+    Trên POSIX tiến trình được tạo bằng Popen, chờ trong thread riêng và thu dọn bằng os.wait4() để lấy
+    CPU time / peak RSS từ kernel; trên Windows dùng subprocess của asyncio (không có số liệu tài nguyên).
+    """
+
+    def __init__(self, pid: int, stdout: asyncio.StreamReader, stderr: asyncio.StreamReader) -> None:
+        self.pid = pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self._transports: list[asyncio.BaseTransport] = []
+        self._exit: asyncio.Future | None = None
+        self._process: asyncio.subprocess.Process | None = None
+        self._popen: subprocess.Popen | None = None
+        self._feed_task: asyncio.Task | None = None
+        self._rusage: dict | None = None
+        # Đã thu dọn (wait4): pid có thể đã được cấp cho tiến trình khác, không được kill nữa
+        self.reaped = False
+
+    @classmethod
+    async def spawn(
+        cls, cmd: list[str], cwd: str, reaper: ThreadPoolExecutor, memory_limit_mb: int | None = None
+    ) -> "_Child":
+        if sys.platform == "win32":
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=cwd,
+                **_NEW_GROUP,
+            )
+            child = cls(process.pid, process.stdout, process.stderr)
+            child._process = process
+            return child
+
+        loop = asyncio.get_running_loop()
+        popen = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd, **_NEW_GROUP
+        )
+        # Popen trả về sau khi exec xong, trước khi JVM kịp cấp phát heap
+        _limit_memory(popen.pid, memory_limit_mb)
+        readers = []
+        child_transports = []
+        for pipe in (popen.stdout, popen.stderr):
+            reader = asyncio.StreamReader()
+            transport, _ = await loop.connect_read_pipe(
+                lambda reader=reader: asyncio.StreamReaderProtocol(reader), pipe
+            )
+            readers.append(reader)
+            child_transports.append(transport)
+        stdin_transport, _ = await loop.connect_write_pipe(asyncio.Protocol, popen.stdin)
+        child = cls(popen.pid, *readers)
+        child._popen = popen
+        child._transports = [stdin_transport, *child_transports]
+        child._exit = loop.run_in_executor(reaper, _wait_exit, popen.pid)
+        return child
+
+    def feed(self, data: bytes) -> None:
+        """Gửi toàn bộ input rồi đóng stdin (không chặn; bỏ qua nếu chương trình thoát trước khi đọc hết)."""
+        if self._process is not None:
+
+            async def feed_input() -> None:
+                try:
+                    self._process.stdin.write(data)
+                    await self._process.stdin.drain()
+                    self._process.stdin.close()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # chương trình thoát trước khi đọc hết input
+
+            self._feed_task = asyncio.create_task(feed_input())
+            return
+        stdin_transport = self._transports[0]
+        stdin_transport.write(data)
+        stdin_transport.close()
+
+    async def wait(self) -> tuple[int, float]:
+        if self._process is not None:
+            returncode = await self._process.wait()
+            return returncode, time.perf_counter()
+        # shield: timeout của lần chờ này không được hủy việc chờ tiến trình
+        returncode, rusage, exited = await asyncio.shield(self._exit)
+        if rusage is not None:  # không có os.waitid: _wait_exit đã thu dọn
+            self._rusage = rusage
+            self.reaped = True
+        self._popen.returncode = returncode
+        return returncode, exited
+
+    def reap(self) -> dict | None:
+        """Thu dọn tiến trình đã thoát (sau wait()); trả về CPU time / peak RSS, None trên Windows."""
+        if self._popen is not None and not self.reaped:
+            _, self._rusage, _ = _wait4(self.pid)
+            self.reaped = True
+        return self._rusage
+
+    async def kill_tree(self) -> None:
+        """Kill tiến trình cùng mọi tiến trình con của nó (process group / taskkill /T); bỏ qua nếu đã thu dọn."""
+        if sys.platform == "win32":
+            killer = await asyncio.create_subprocess_exec(
+                "taskkill",
+                "/F",
+                "/T",
+                "/PID",
+                str(self.pid),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            await killer.wait()
+            if self._feed_task is not None:
+                self._feed_task.cancel()
+            return
+        if self.reaped:
+            return
+        with contextlib.suppress(ProcessLookupError, PermissionError):
+            os.killpg(self.pid, signal.SIGKILL)
+
+    def close(self) -> None:
+        for transport in self._transports:
+            transport.close()
+
+
+class ExecutionEngine:
+    """Chạy tiến trình bằng asyncio trên một event loop riêng (thread nền).
+
+    Mọi lần chạy đi qua một semaphore chung giới hạn số JVM đồng thời; stdout/stderr được đọc
+    không chặn, timeout / dừng sớm kill cả cây tiến trình. Code đồng bộ gọi run(), code async
+    có thể lên lịch hàng nghìn lần chạy bằng run_async() mà không cần thêm thread.
+    """
+
+    def __init__(self, max_jvms: int = DEFAULT_MAX_JVMS) -> None:
+        self.max_jvms = max(1, max_jvms)
+        self.pid = os.getpid()
+        # Thread chờ tiến trình con kết thúc (os.wait4) - mỗi JVM đang chạy một thread
+        self._reaper = ThreadPoolExecutor(max_workers=self.max_jvms, thread_name_prefix="exec-reaper")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="exec-engine", daemon=True)
+        self._thread.start()
+        self._slots = self._call(self._make_semaphore())
+
+    async def _make_semaphore(self) -> asyncio.Semaphore:
+        return asyncio.Semaphore(self.max_jvms)
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    @contextlib.contextmanager
+    def slot(self):
+        """Giữ một chỗ trong giới hạn JVM đồng thời cho code đồng bộ (vd. một lần chạy trên warm JVM)."""
+        self._call(self._slots.acquire())
+        try:
+            yield
+        finally:
+            self._loop.call_soon_threadsafe(self._slots.release)
+
+    def run(
+        self,
+        cmd: list[str],
+        input_data: str,
+        cwd: str,
+        timeout: float,
+        max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+        watcher: OutputWatcher | None = None,
+        timings: dict | None = None,
+        usage: dict | None = None,
+        memory_limit_mb: int | None = None,
+    ) -> tuple[str, str, int]:
+        """Bản đồng bộ của run_async(), gọi được từ bất kỳ thread nào."""
+        return self._call(
+            self.run_async(cmd, input_data, cwd, timeout, max_output_bytes, watcher, timings, usage, memory_limit_mb)
+        )
+
+    async def run_async(
+        self,
+        cmd: list[str],
+        input_data: str,
+        cwd: str,
+        timeout: float,
+        max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+        watcher: OutputWatcher | None = None,
+        timings: dict | None = None,
+        usage: dict | None = None,
+        memory_limit_mb: int | None = None,
+    ) -> tuple[str, str, int]:
+        """Chạy cmd với input, đọc stdout theo luồng với giới hạn byte; trả về (stdout, stderr, returncode).
+
+        Phải được await trên event loop của engine. Ném subprocess.TimeoutExpired, OutputLimitExceeded
+        hoặc EarlyMismatch (cả cây tiến trình đã bị kill). timings (nếu có) được điền các mốc
+        time.perf_counter(): started, first_output (byte stdout đầu tiên), finished - dùng cho profiler.
+        usage (nếu có) được điền tài nguyên tiến trình đã dùng, kể cả khi bị kill: wall (giây), và trên
+        POSIX user / system (CPU time, giây), peak_rss_mb - theo số liệu của kernel (os.wait4).
+        memory_limit_mb (nếu có): giới hạn bộ nhớ dữ liệu của tiến trình ở mức hệ điều hành (chỉ trên Linux).
+        """
+        async with self._slots:
+            return await self._run(
+                cmd, input_data, cwd, timeout, max_output_bytes, watcher, timings, usage, memory_limit_mb
+            )
+
+    async def _run(
+        self,
+        cmd: list[str],
+        input_data: str,
+        cwd: str,
+        timeout: float,
+        max_output_bytes: int,
+        watcher: OutputWatcher | None,
+        timings: dict | None = None,
+        usage: dict | None = None,
+        memory_limit_mb: int | None = None,
+    ) -> tuple[str, str, int]:
+        encoding = locale.getpreferredencoding(False)
+        started = time.perf_counter()
+        if timings is not None:
+            timings["started"] = started
+        child = await _Child.spawn(cmd, cwd, self._reaper, memory_limit_mb)
+        child.feed(input_data.encode(encoding))
+
+        async def drain_stderr() -> bytes:
+            chunks: list[bytes] = []
+            size = 0
+            while chunk := await child.stderr.read(CHUNK_SIZE):
+                if size < max_output_bytes:
+                    chunks.append(chunk)
+                size += len(chunk)
+            return b"".join(chunks)
+
+        async def read_stdout() -> str:
+            # Giống text=True của subprocess: giải mã theo locale và chuẩn hóa xuống dòng (kể cả \r\n bị cắt đôi)
+            decoder = io.IncrementalNewlineDecoder(
+                codecs.getincrementaldecoder(encoding)(errors="replace"), translate=True
+            )
+            parts: list[str] = []
+            total = 0
+            while chunk := await child.stdout.read(CHUNK_SIZE):
+                if timings is not None and not total:
+                    timings["first_output"] = time.perf_counter()
+                total += len(chunk)
+                if total > max_output_bytes:
+                    raise OutputLimitExceeded(f"OUTPUT LIMIT - stdout vượt quá {max_output_bytes} byte")
+                text = decoder.decode(chunk)
+                parts.append(text)
+                if watcher is not None and not watcher.feed(text):
+                    raise EarlyMismatch(
+                        f"EARLY MISMATCH - output đã sai khác so với expected ({format_divergence(watcher.divergence)})"
+                    )
+            return "".join(parts) + decoder.decode(b"", final=True)
+
+        stderr_task = asyncio.create_task(drain_stderr())
+
+        async def communicate() -> tuple[str, bytes, int]:
+            stdout = await read_stdout()
+            stderr = await stderr_task
+            returncode, _ = await child.wait()
+            return stdout, stderr, returncode
+
+        try:
+            stdout, stderr, returncode = await asyncio.wait_for(communicate(), timeout)
+        except asyncio.TimeoutError:
+            raise subprocess.TimeoutExpired(cmd, timeout) from None
+        finally:
+            if timings is not None:
+                timings["finished"] = time.perf_counter()
+            # Luôn dọn cả cây tiến trình (kể cả tiến trình con mà bài làm tự tạo ra) - trước khi thu dọn
+            await child.kill_tree()
+            stderr_task.cancel()
+            _, exited = await child.wait()
+            rusage = child.reap()
+            child.close()
+            if usage is not None:
+                usage.update(wall=round(exited - started, 4), **(rusage or {}))
+
+        stderr_text = stderr.decode(encoding, errors="replace")
+        return stdout, stderr_text.replace("\r\n", "\n").replace("\r", "\n"), returncode
+
+    def close(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._reaper.shutdown(wait=False)
+
+
+_default_engine: ExecutionEngine | None = None
+_default_lock = threading.Lock()
+
+
+def get_engine() -> ExecutionEngine:
+    """Engine dùng chung của tiến trình (tạo khi cần, giới hạn DEFAULT_MAX_JVMS nếu chưa cấu hình)."""
+    global _default_engine
+    with _default_lock:
+        # Sau fork (worker của batch_check.py) thread của event loop không còn - tạo engine mới
+        if _default_engine is None or _default_engine.pid != os.getpid():
+            _default_engine = ExecutionEngine(_default_engine.max_jvms if _default_engine else DEFAULT_MAX_JVMS)
+        return _default_engine
+
+
+def configure_engine(max_jvms: int) -> ExecutionEngine:
+    """Đặt giới hạn số JVM đồng thời cho engine dùng chung (gọi trước khi chạy test)."""
+    global _default_engine
+    with _default_lock:
+        if _default_engine is not None and _default_engine.pid == os.getpid():
+            _default_engine.close()
+        _default_engine = ExecutionEngine(max_jvms)
+        return _default_engine
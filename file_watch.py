@@ -0,0 +1,48 @@
+import stat
+import time
+from pathlib import Path
+
+# Chu kỳ quét thư mục (giây), và thời gian các file phải đứng yên trước khi báo thay đổi
+# (editor thường lưu file thành nhiều lần ghi / đổi tên)
+POLL_INTERVAL = 0.2
+SETTLE_TIME = 0.05
+
+
+class FileWatcher:
+    """Theo dõi file theo (thư mục, glob) bằng cách quét mtime / kích thước định kỳ - không cần thư viện ngoài."""
+
+    def __init__(self, patterns: list[tuple[Path, str]], interval: float = POLL_INTERVAL) -> None:
+        self.patterns = [(Path(directory), glob) for directory, glob in patterns]
+        self.interval = interval
+        self._snapshot = self.snapshot()
+
+    def snapshot(self) -> dict[Path, tuple[int, int]]:
+        files = {}
+        for directory, glob in self.patterns:
+            for path in directory.glob(glob):
+                try:
+                    info = path.stat()
+                except OSError:
+                    continue  # file vừa bị xóa giữa lúc quét
+                if stat.S_ISREG(info.st_mode):
+                    files[path] = (info.st_mtime_ns, info.st_size)
+        return files
+
+    def changes(self) -> set[Path]:
+        """Các file được thêm / sửa / xóa từ lần quét trước (không chờ)."""
+        current = self.snapshot()
+        previous = self._snapshot
+        changed = {path for path in current.keys() | previous.keys() if current.get(path) != previous.get(path)}
+        self._snapshot = current
+        return changed
+
+    def wait(self) -> set[Path]:
+        """Chờ đến khi có file thay đổi và đã đứng yên, trả về tập file đã đổi."""
+        changed: set[Path] = set()
+        while True:
+            time.sleep(SETTLE_TIME if changed else self.interval)
+            batch = self.changes()
+            if batch:
+                changed |= batch
+            elif changed:
+                return changed
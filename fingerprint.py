@@ -0,0 +1,83 @@
+import hashlib
+import zipfile
+from pathlib import Path
+
+# Ký tự của định danh Java: giữa hai ký tự này khoảng trắng là bắt buộc
+_IDENT_CHARS = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$")
+# Ký tự toán tử: giữa hai ký tự này khoảng trắng có nghĩa ("- -" khác "--", "/ /" khác "//")
+_OPERATOR_CHARS = set("+-*/%<>=!&|^~?:")
+
+
+def normalize_java_source(text: str) -> str:
+    """Bỏ comment và khoảng trắng không có nghĩa trong mã Java; giữ nguyên chuỗi / ký tự / text block."""
+    out: list[str] = []
+    i = 0
+    n = len(text)
+    pending_space = False
+
+    def emit(piece: str) -> None:
+        nonlocal pending_space
+        if pending_space and out:
+            prev, nxt = out[-1][-1], piece[0]
+            if (prev in _IDENT_CHARS and nxt in _IDENT_CHARS) or (prev in _OPERATOR_CHARS and nxt in _OPERATOR_CHARS):
+                out.append(" ")
+        pending_space = False
+        out.append(piece)
+
+    while i < n:
+        ch = text[i]
+        if text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+            pending_space = True
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            pending_space = True
+        elif ch.isspace():
+            i += 1
+            pending_space = True
+        elif text.startswith('"""', i):
+            end = text.find('"""', i + 3)
+            end = n if end < 0 else end + 3
+            emit(text[i:end])
+            i = end
+        elif ch in "\"'":
+            j = i + 1
+            while j < n and text[j] != ch and text[j] != "\n":
+                j += 2 if text[j] == "\\" else 1
+            emit(text[i : j + 1])
+            i = j + 1
+        else:
+            j = i + 1
+            if ch in _IDENT_CHARS:
+                while j < n and text[j] in _IDENT_CHARS:
+                    j += 1
+            emit(text[i:j])
+            i = j
+    return "".join(out)
+
+
+def sources_fingerprint(root: Path, files: list[Path], normalize: bool = False) -> str:
+    """Fingerprint các file mã nguồn (theo đường dẫn tương đối); normalize: bỏ comment / khoảng trắng."""
+    root = Path(root)
+    digest = hashlib.sha256(b"normalized" if normalize else b"raw")
+    for path in sorted(files, key=lambda f: Path(f).relative_to(root).as_posix()):
+        digest.update(b"\0" + Path(path).relative_to(root).as_posix().encode("utf-8") + b"\0")
+        data = Path(path).read_bytes()
+        if normalize and path.suffix == ".java":
+            data = normalize_java_source(data.decode("utf-8", errors="replace")).encode("utf-8")
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def jar_fingerprint(jar_file: Path) -> str:
+    """Fingerprint nội dung file .jar (tên + CRC + kích thước từng entry), bỏ qua thời điểm đóng gói."""
+    digest = hashlib.sha256()
+    try:
+        with zipfile.ZipFile(jar_file) as jar:
+            for info in sorted(jar.infolist(), key=lambda i: i.filename):
+                digest.update(f"{info.filename}\0{info.CRC}\0{info.file_size}\n".encode("utf-8"))
+    except zipfile.BadZipFile:
+        digest.update(Path(jar_file).read_bytes())
+    return digest.hexdigest()
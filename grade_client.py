@@ -0,0 +1,105 @@
+import argparse
+import json
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+from jvm_harness import CACHE_DIR
+
+SOCKET_FILE = CACHE_DIR / "grade-daemon.sock"
+
+# Runner chạy trực tiếp khi không có grade daemon
+SCRIPTS = {"check": "check.py", "pe": "pe_check.py"}
+
+# Giao thức (Unix socket, mỗi kết nối một yêu cầu): client gửi một dòng JSON
+#   {"op": "grade", "mode": "check"|"pe", "cwd": ..., "argv": [...]}  hoặc  {"op": "ping"} / {"op": "shutdown"}
+# daemon trả về nhiều dòng JSON: {"out": text} / {"err": text} theo thời gian thực, cuối cùng {"exit": code}
+# (hoặc {"error": ...} khi không chấm được).
+
+
+class GradeDaemonClient:
+    """Client gửi yêu cầu chấm tới grade daemon và nhận output từng dòng."""
+
+    def __init__(self, path: Path = SOCKET_FILE) -> None:
+        self.path = Path(path)
+
+    @classmethod
+    def discover(cls) -> "GradeDaemonClient | None":
+        """None nếu hệ điều hành không có Unix socket hoặc không có daemon nào đang chạy."""
+        if not hasattr(socket, "AF_UNIX"):
+            return None
+        client = cls()
+        return client if client.ping() else None
+
+    def _connect(self, timeout: float | None) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(self.path))
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _frames(self, payload: dict, timeout: float | None = None):
+        with self._connect(timeout) as sock:
+            sock.sendall((json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8"))
+            for line in sock.makefile("rb"):
+                yield json.loads(line)
+
+    def ping(self) -> dict | None:
+        """Trạng thái daemon (số lượt đã chấm, số JVM đang giữ), None nếu không kết nối được."""
+        try:
+            return next(self._frames({"op": "ping"}, timeout=2), None)
+        except (OSError, ValueError):
+            return None
+
+    def shutdown(self) -> None:
+        try:
+            for _frame in self._frames({"op": "shutdown"}, timeout=10):
+                pass
+        except (OSError, ValueError):
+            pass
+
+    def grade(self, mode: str, cwd: Path, argv: list[str]) -> int:
+        """Chấm bài trong cwd bằng daemon, in output ra stdout / stderr ngay khi nhận; trả về exit code."""
+        payload = {"op": "grade", "mode": mode, "cwd": str(Path(cwd).resolve()), "argv": argv}
+        for frame in self._frames(payload):
+            if "out" in frame:
+                sys.stdout.write(frame["out"])
+                sys.stdout.flush()
+            elif "err" in frame:
+                sys.stderr.write(frame["err"])
+                sys.stderr.flush()
+            elif "error" in frame:
+                print(f"❌ Grade daemon: {frame['error']}")
+                return 1
+            elif "exit" in frame:
+                return frame["exit"]
+        print("❌ Grade daemon đóng kết nối giữa chừng")
+        return 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Chấm bài qua grade daemon (python grade_daemon.py start); "
+        "không có daemon thì chạy check.py / pe_check.py trực tiếp"
+    )
+    parser.add_argument("mode", choices=sorted(SCRIPTS), help="check: như check.py, pe: như pe_check.py")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Tham số của check.py / pe_check.py")
+    args = parser.parse_args()
+
+    client = GradeDaemonClient.discover()
+    if client is None:
+        script = Path(__file__).resolve().parent / SCRIPTS[args.mode]
+        sys.exit(subprocess.call([sys.executable, str(script), *args.args]))
+    try:
+        sys.exit(client.grade(args.mode, Path.cwd(), args.args))
+    except KeyboardInterrupt:
+        # Đóng kết nối: daemon chấm nốt lượt này nhưng không gửi output nữa
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
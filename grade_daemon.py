@@ -0,0 +1,250 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+import traceback
+from pathlib import Path
+
+import check
+import pe_check
+from compile_daemon import CompileDaemonClient, start_daemon, stop_daemon
+from exec_engine import DEFAULT_MAX_JVMS, configure_engine
+from grade_client import SOCKET_FILE, GradeDaemonClient
+from jvm_harness import DEFAULT_POOL_IDLE, HarnessPool, ensure_harness
+from profiler import PROFILER
+
+RUNNERS = {"check": check, "pe": pe_check}
+
+
+class _Connection:
+    """Kết nối của một client: gửi frame JSON; client đã ngắt thì bỏ qua phần output còn lại."""
+
+    def __init__(self, wfile) -> None:
+        self.wfile = wfile
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def send(self, frame: dict) -> None:
+        with self._lock:
+            if self.closed:
+                return
+            try:
+                self.wfile.write((json.dumps(frame, ensure_ascii=False) + "\n").encode("utf-8"))
+                self.wfile.flush()
+            except OSError:
+                self.closed = True
+
+
+class _FrameWriter(io.TextIOBase):
+    """sys.stdout / sys.stderr trong một lượt chấm: mỗi dòng in xong được gửi ngay về client."""
+
+    def __init__(self, connection: _Connection, key: str) -> None:
+        super().__init__()
+        self.connection = connection
+        self.key = key
+        self._pending = ""
+
+    def write(self, text: str) -> int:
+        head, newline, self._pending = (self._pending + text).rpartition("\n")
+        if newline:
+            self.connection.send({self.key: head + newline})
+        return len(text)
+
+    def flush(self) -> None:
+        if self._pending:
+            self.connection.send({self.key: self._pending})
+            self._pending = ""
+
+
+class GradeDaemon:
+    """Tiến trình chấm thường trú: giữ bộ test đã parse, compile cache / compile daemon và pool warm JVM.
+
+    Mỗi lần chấm lại qua grade_client.py không phải khởi động Python, parse test hay khởi động JVM mới;
+    bài không đổi thì dùng lại luôn JVM đã nạp class của lần trước.
+    """
+
+    def __init__(
+        self, warm_jvm: bool = True, max_idle: int = DEFAULT_POOL_IDLE, max_jvms: int = DEFAULT_MAX_JVMS
+    ) -> None:
+        self.warm_jvm = warm_jvm
+        self.pool = HarnessPool(max_idle)
+        # Engine cấu hình một lần cho cả daemon; run() không tạo lại engine khi nhận harness_pool
+        configure_engine(max_jvms)
+        self.graded = 0
+        self.started = time.time()
+        # Lượt chấm đổi sys.stdout của cả tiến trình và dùng chung engine / pool: chấm lần lượt từng yêu cầu
+        self._lock = threading.Lock()
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "graded": self.graded,
+            "idle_jvms": self.pool.idle_count(),
+            "uptime": round(time.time() - self.started),
+        }
+
+    def grade(self, request: dict, connection: _Connection) -> None:
+        """Chấm một yêu cầu của client, stream output về qua connection và kết thúc bằng frame exit."""
+        runner = RUNNERS.get(request.get("mode"))
+        cwd = Path(str(request.get("cwd", "")))
+        if runner is None or not cwd.is_absolute() or not cwd.is_dir():
+            connection.send({"error": "yêu cầu không hợp lệ (mode / thư mục)"})
+            return
+        if not self._lock.acquire(blocking=False):
+            connection.send({"out": "⏳ Daemon đang chấm bài khác, chờ đến lượt...\n"})
+            self._lock.acquire()
+        try:
+            code = self._run(runner, cwd, [str(arg) for arg in request.get("argv", [])], connection)
+        finally:
+            self._lock.release()
+        connection.send({"exit": code})
+
+    def _run(self, runner, cwd: Path, argv: list[str], connection: _Connection) -> int:
+        out, err = _FrameWriter(connection, "out"), _FrameWriter(connection, "err")
+        started = time.perf_counter()
+        code = 0
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            try:
+                parser = runner.build_parser()
+                parser.prog = Path(runner.__file__).name
+                args = parser.parse_args(argv)
+                if getattr(args, "watch", False):
+                    parser.error("--watch chạy trong terminal của bạn: dùng python check.py --watch")
+                # Test chạy trong warm JVM lấy từ pool, trừ khi daemon được start với --cold-jvm
+                args.warm_jvm = args.warm_jvm or self.warm_jvm
+                runner.run(args, cwd, self.pool)
+            except SystemExit as exc:
+                # argparse: --help hoặc tham số sai
+                code = exc.code if isinstance(exc.code, int) else 1
+            except Exception:  # noqa: BLE001
+                traceback.print_exc()
+                code = 1
+            finally:
+                PROFILER.reset()
+                out.flush()
+                err.flush()
+        self.graded += 1
+        elapsed = time.perf_counter() - started
+        print(f"[{time.strftime('%H:%M:%S')}] {runner.__name__} {cwd} - {elapsed:.2f}s (exit {code})")
+        return code
+
+
+class _GradeHandler(socketserver.StreamRequestHandler):
+    # Mỗi kết nối một yêu cầu: một dòng JSON gửi đi, trả về nhiều dòng JSON (xem grade_client.py)
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        connection = _Connection(self.wfile)
+        op = request.get("op")
+        if op == "ping":
+            connection.send(self.server.grader.status())
+        elif op == "shutdown":
+            connection.send({"ok": True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        elif op == "grade":
+            self.server.grader.grade(request, connection)
+        else:
+            connection.send({"error": f"unknown op {op!r}"})
+
+
+def serve(grader: GradeDaemon, path: Path = SOCKET_FILE) -> socketserver.BaseServer:
+    """Mở Unix socket cho grade daemon; chỉ user hiện tại kết nối được (quyền 0600)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Socket còn lại của daemon đã chết
+    path.unlink(missing_ok=True)
+    old_umask = os.umask(0o177)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(str(path), _GradeHandler)
+    finally:
+        os.umask(old_umask)
+    server.daemon_threads = True
+    server.grader = grader
+    return server
+
+
+def start(args: argparse.Namespace) -> None:
+    if not hasattr(socket, "AF_UNIX"):
+        print("❌ Hệ điều hành không hỗ trợ Unix socket - dùng check.py / pe_check.py trực tiếp")
+        return
+    if GradeDaemonClient().ping() is not None:
+        print(f"⚠️  Grade daemon đã chạy ở {SOCKET_FILE}")
+        return
+
+    # Biên dịch sẵn harness, và giữ javac nóng bằng compile daemon (nếu chưa có daemon nào)
+    try:
+        ensure_harness()
+    except (OSError, RuntimeError) as exc:
+        print(f"⚠️  Không biên dịch được JVM harness: {exc}")
+    javac = None
+    if not args.no_compile_daemon and CompileDaemonClient.discover() is None:
+        try:
+            javac = start_daemon()
+        except (OSError, RuntimeError) as exc:
+            print(f"⚠️  Không khởi động được compile daemon, biên dịch bằng javac: {exc}")
+
+    grader = GradeDaemon(warm_jvm=not args.cold_jvm, max_idle=args.max_idle_jvms, max_jvms=args.max_jvms)
+    server = serve(grader)
+    print(f"✓ Grade daemon đang chạy ở {SOCKET_FILE} (Ctrl+C hoặc `python grade_daemon.py stop` để dừng)")
+    print("  Chấm bài: python grade_client.py check | pe [tham số của check.py / pe_check.py]")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        SOCKET_FILE.unlink(missing_ok=True)
+        grader.pool.close()
+        if javac is not None:
+            stop_daemon(*javac)
+    print(f"✓ Đã tắt grade daemon ({grader.graded} lượt chấm)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Grade daemon: giữ test đã parse, compile cache và warm JVM giữa các lần chấm trong phòng máy"
+    )
+    parser.add_argument(
+        "action", choices=["start", "stop", "status"], help="start: chạy daemon, stop: tắt, status: xem trạng thái"
+    )
+    parser.add_argument("--cold-jvm", action="store_true", help="Mỗi test một JVM mới như check.py mặc định")
+    parser.add_argument(
+        "--max-idle-jvms",
+        type=int,
+        default=DEFAULT_POOL_IDLE,
+        help=f"Số warm JVM rảnh giữ lại giữa các lượt chấm (mặc định {DEFAULT_POOL_IDLE})",
+    )
+    parser.add_argument(
+        "--max-jvms",
+        type=int,
+        default=DEFAULT_MAX_JVMS,
+        help=f"Số JVM chạy đồng thời tối đa của daemon (mặc định {DEFAULT_MAX_JVMS} = số CPU)",
+    )
+    parser.add_argument("--no-compile-daemon", action="store_true", help="Không khởi động compile daemon kèm theo")
+    args = parser.parse_args()
+
+    if args.action == "start":
+        start(args)
+        return
+    client = GradeDaemonClient()
+    status = client.ping()
+    if status is None:
+        print("⚠️  Không có grade daemon nào đang chạy")
+    elif args.action == "stop":
+        client.shutdown()
+        print("✓ Đã tắt grade daemon")
+    else:
+        print(
+            f"✓ Grade daemon pid {status['pid']}: {status['graded']} lượt chấm, "
+            f"{status['idle_jvms']} warm JVM rảnh, chạy được {status['uptime']}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
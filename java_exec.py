@@ -0,0 +1,348 @@
+import json
+from pathlib import Path
+
+OUTPUT_MARKER = "OUTPUT:"
+BUILD_MARKER = "BUILD SUCCESSFUL"
+
+DEFAULT_MAX_OUTPUT_BYTES = 64 * 1024 * 1024
+
+# Thời gian chạy tối đa (giây) mặc định của một test case
+DEFAULT_TIMEOUT = 10
+
+# File giới hạn thời gian từng test (sinh bởi calibrate.py), đặt cạnh test cases
+TIME_LIMITS_FILE = "time_limits.json"
+
+CHUNK_SIZE = 64 * 1024
+
+# Số ký tự expected / actual in kèm vị trí khác nhau đầu tiên
+DIVERGENCE_CONTEXT = 40
+
+# Kết quả đặc biệt của một lần chạy (ngoài PASS / FAIL / ERROR)
+VERDICT_TIMEOUT = "TIMEOUT"
+VERDICT_OUTPUT_LIMIT = "OUTPUT_LIMIT"
+VERDICT_EARLY_MISMATCH = "EARLY_MISMATCH"
+# Vượt TIME_LIMIT / MEMORY_LIMIT khai báo trong test case
+VERDICT_TLE = "TLE"
+VERDICT_MLE = "MLE"
+# Không chạy được chương trình vì lỗi của máy chấm (không có java, harness / engine lỗi...): không phải kết quả
+# của bài làm, nên không được lưu vào results database / journal / output store - lần chấm sau chạy lại
+VERDICT_INTERNAL_ERROR = "INTERNAL_ERROR"
+
+# Bộ nhớ ngoài heap của JVM (metaspace, code cache, stack các thread, GC) được cộng thêm vào giới hạn
+# của hệ điều hành - heap đã bị giới hạn riêng bằng -Xmx
+JVM_NATIVE_HEADROOM_MB = 256
+
+# Thông báo của JVM khi hết bộ nhớ (heap theo -Xmx hoặc bộ nhớ native theo giới hạn của hệ điều hành)
+OUT_OF_MEMORY_MARKERS = (
+    "java.lang.OutOfMemoryError",
+    "insufficient memory for the Java Runtime Environment",
+    "Could not reserve enough space",
+)
+
+
+class RunAborted(Exception):
+    """Chương trình bị dừng giữa chừng bởi bộ giám sát output."""
+
+    verdict = "ERROR"
+
+
+class OutputLimitExceeded(RunAborted):
+    """stdout vượt quá giới hạn số byte cho phép."""
+
+    verdict = VERDICT_OUTPUT_LIMIT
+
+
+class EarlyMismatch(RunAborted):
+    """Phần output đã in ra không còn khả năng khớp với expected."""
+
+    verdict = VERDICT_EARLY_MISMATCH
+
+
+class RunMessage(str):
+    """stderr do runner tạo ra cho lần chạy bị dừng (timeout, vượt giới hạn, dừng sớm...), mang theo verdict.
+
+    Verdict đi kèm giá trị chứ không được đoán từ nội dung stderr: chương trình tự in "TIMEOUT" ra stderr,
+    hay expected / actual trong thông báo dừng sớm có chữ đó, không đổi được kết quả.
+    """
+
+    verdict: str
+
+    def __new__(cls, text: str, verdict: str) -> "RunMessage":
+        message = super().__new__(cls, text)
+        message.verdict = verdict
+        return message
+
+
+def run_verdict(stderr: str, returncode: int) -> str | None:
+    """Verdict của lần chạy bị runner dừng (stderr là RunMessage); None nếu chương trình tự kết thúc."""
+    if returncode != -1:
+        return None
+    return getattr(stderr, "verdict", None)
+
+
+def test_timeout(tc: dict, time_limits: dict[str, float], key: str) -> float:
+    """Giới hạn thời gian (giây) của một test: TIME_LIMIT trong test case > time_limits.json > mặc định."""
+    if tc["time_limit_ms"]:
+        return tc["time_limit_ms"] / 1000
+    return time_limits.get(key, DEFAULT_TIMEOUT)
+
+
+def heap_flags(memory_limit_mb: int | None) -> list[str]:
+    """Flag giới hạn heap của JVM cho test có MEMORY_LIMIT (MB)."""
+    return [f"-Xmx{memory_limit_mb}m"] if memory_limit_mb else []
+
+
+def os_memory_limit(memory_limit_mb: int | None) -> int | None:
+    """Giới hạn bộ nhớ (MB) đặt cho tiến trình java ở mức hệ điều hành: heap + phần native của JVM."""
+    return memory_limit_mb + JVM_NATIVE_HEADROOM_MB if memory_limit_mb else None
+
+
+def apply_limits(tc: dict, stderr: str, returncode: int) -> tuple[str, int]:
+    """Đổi lần chạy lỗi thành TLE / MLE nếu test có TIME_LIMIT / MEMORY_LIMIT; giữ nguyên trong các trường hợp khác.
+
+    Lần chạy không có giới hạn khai báo vẫn là TIMEOUT / ERROR như cũ.
+    """
+    if returncode == 0:
+        return stderr, returncode
+    if tc["time_limit_ms"] and run_verdict(stderr, returncode) == VERDICT_TIMEOUT:
+        return RunMessage(f"TLE - chạy quá giới hạn {tc['time_limit_ms']} ms", VERDICT_TLE), -1
+    if tc["memory_limit_mb"] and any(marker in stderr for marker in OUT_OF_MEMORY_MARKERS):
+        return RunMessage(f"MLE - vượt giới hạn bộ nhớ {tc['memory_limit_mb']} MB", VERDICT_MLE), -1
+    return stderr, returncode
+
+
+def extract_output(stdout: str, single_section: bool = False) -> str:
+    """Lấy phần output sau "OUTPUT:" (bỏ "BUILD SUCCESSFUL"); giữ nguyên nếu không có "OUTPUT:".
+
+    single_section=True: phần output kết thúc ở "OUTPUT:" tiếp theo (cách check.py tách output).
+    """
+    if OUTPUT_MARKER not in stdout:
+        return stdout
+    output_part = stdout.split(OUTPUT_MARKER, 1)[1]
+    if single_section:
+        output_part = output_part.split(OUTPUT_MARKER, 1)[0]
+    return output_part.split(BUILD_MARKER, 1)[0].strip()
+
+
+def load_time_limits(test_dir: Path) -> dict[str, float]:
+    """Đọc giới hạn thời gian đã hiệu chỉnh cho từng test (key: "tc1" hoặc "Q1/TC1"); {} nếu chưa có."""
+    path = Path(test_dir) / TIME_LIMITS_FILE
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return {key: float(value) for key, value in data.get("limits", {}).items()}
+
+
+class StreamComparator:
+    """So sánh output theo từng đoạn với expected đã chuẩn hóa, cùng quy tắc với normalize_output (strip,
+    REMOVE_SPACES, CASE_SENSITIVE), mà không tạo bản sao chuẩn hóa của toàn bộ output.
+
+    Bộ nhớ dùng thêm chỉ cỡ một đoạn (cộng khoảng trắng cuối đang chờ). Dừng ở chỗ khác nhau đầu tiên;
+    divergence cho biết vị trí đó trong output thực tế (ký tự, dòng, cột) và trong expected.
+    """
+
+    def __init__(self, expected: str, remove_spaces: bool, case_sensitive: bool) -> None:
+        self.expected = expected
+        self.remove_spaces = remove_spaces
+        self.case_sensitive = case_sensitive
+        self.pos = 0  # số ký tự expected đã khớp
+        self.started = False
+        self.finished = False
+        self.divergence: dict | None = None
+        # Vị trí (offset, dòng, offset đầu dòng) của ký tự tiếp theo trong output thực tế (đã strip đầu)
+        self._at = (0, 1, 0)
+        # Khoảng trắng cuối chưa tính (bị bỏ nếu là phần cuối output): chỉ giữ độ dài, vị trí bắt đầu
+        # và chỗ khác expected đầu tiên (nếu có) - không giữ nội dung
+        self._pending = 0
+        self._pending_at = self._at
+        self._pending_divergence: dict | None = None
+
+    @staticmethod
+    def _after(at: tuple[int, int, int], text: str) -> tuple[int, int, int]:
+        offset, line, line_start = at
+        newlines = text.count("\n")
+        if newlines:
+            line_start = offset + text.rindex("\n") + 1
+        return offset + len(text), line + newlines, line_start
+
+    def _normalize(self, text: str) -> str:
+        if self.remove_spaces:
+            text = "".join(text.split())  # cùng tập ký tự với re.sub(r"\s+", ...) nhưng nhanh hơn nhiều
+        if not self.case_sensitive:
+            text = text.lower()
+        return text
+
+    def feed(self, text: str) -> bool:
+        """Nhận thêm output; trả về False khi đã khác expected."""
+        if self.divergence is not None or self.finished:
+            return self.divergence is None
+        start, self._at = self._at, self._after(self._at, text)
+        if not self.started:
+            stripped = text.lstrip()
+            if not stripped:
+                return True
+            # Vị trí tính trên output đã bỏ khoảng trắng đầu (giống phần được so sánh sau strip)
+            start = (0, 1, 0)
+            self._at = self._after(start, stripped)
+            text = stripped
+            self.started = True
+
+        body = text.rstrip()
+        if body:
+            if self._pending and not self.remove_spaces:
+                # Khoảng trắng đang chờ nằm giữa output - phải khớp expected
+                if self._pending_divergence is not None:
+                    self.divergence = self._pending_divergence
+                    return False
+                self.pos += self._pending
+            self._pending = 0
+            self._pending_divergence = None
+            piece = self._normalize(body)
+            if not self.expected.startswith(piece, self.pos):
+                self._diverge(body, start, piece)
+                return False
+            self.pos += len(piece)
+            start = self._after(start, body)
+        self._hold_whitespace(text[len(body):], start)
+        return True
+
+    def _hold_whitespace(self, space: str, at: tuple[int, int, int]) -> None:
+        if not space:
+            return
+        if not self._pending:
+            self._pending_at = at
+        if not self.remove_spaces and self._pending_divergence is None:
+            expected_at = self.pos + self._pending
+            if not self.expected.startswith(space, expected_at):
+                matched = _common_prefix(space, self.expected[expected_at : expected_at + len(space)])
+                self._pending_divergence = self._location(
+                    self._after(at, space[:matched]), expected_at + matched, space[matched:]
+                )
+        self._pending += len(space)
+
+    def finish(self) -> bool:
+        """Báo hết output; trả về True nếu output khớp expected."""
+        if not self.finished and self.divergence is None and self.pos != len(self.expected):
+            self.divergence = self._location(self._pending_at if self._pending else self._at, self.pos, "")
+        self.finished = True
+        return self.divergence is None
+
+    def _diverge(self, source: str, at: tuple[int, int, int], piece: str) -> None:
+        """Ghi vị trí khác nhau: tìm ký tự của source ứng với ký tự đầu tiên của piece (đã chuẩn hóa) bị sai."""
+        matched = _common_prefix(piece, self.expected[self.pos : self.pos + len(piece)])
+        index = 0
+        remaining = matched
+        while index < len(source):
+            size = len(self._normalize(source[index]))
+            if remaining < size:
+                break
+            remaining -= size
+            index += 1
+        self.divergence = self._location(self._after(at, source[:index]), self.pos + matched, source[index:])
+
+    def _location(self, at: tuple[int, int, int], expected_at: int, actual: str) -> dict:
+        offset, line, line_start = at
+        return {
+            "offset": offset,
+            "line": line,
+            "column": offset - line_start + 1,
+            "expected_offset": expected_at,
+            "expected_line": self.expected.count("\n", 0, expected_at) + 1,
+            "expected": self.expected[expected_at : expected_at + DIVERGENCE_CONTEXT],
+            "actual": actual[:DIVERGENCE_CONTEXT],
+        }
+
+
+def _common_prefix(first: str, second: str) -> int:
+    """Số ký tự đầu giống nhau của hai chuỗi."""
+    low, high = 0, min(len(first), len(second))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[:middle] == second[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def find_divergence(actual: str, expected: str, remove_spaces: bool, case_sensitive: bool) -> dict | None:
+    """So sánh actual với expected đã chuẩn hóa theo từng đoạn CHUNK_SIZE; None nếu khớp."""
+    comparator = StreamComparator(expected, remove_spaces, case_sensitive)
+    for index in range(0, len(actual), CHUNK_SIZE):
+        if not comparator.feed(actual[index : index + CHUNK_SIZE]):
+            break
+    comparator.finish()
+    return comparator.divergence
+
+
+def format_divergence(divergence: dict | None) -> str:
+    """Mô tả vị trí khác nhau đầu tiên giữa output và expected."""
+    if divergence is None:
+        return "khớp"
+    return (
+        f"khác từ dòng {divergence['line']}, cột {divergence['column']} (offset {divergence['offset']}): "
+        f"mong đợi {divergence['expected']!r}, nhận được {divergence['actual']!r}"
+    )
+
+
+class OutputWatcher:
+    """Theo dõi stdout theo từng đoạn: tách phần sau "OUTPUT:" và báo ngay khi không thể khớp expected.
+
+    expected phải đã được chuẩn hóa bằng normalize_output (strip / bỏ khoảng trắng / lower).
+    single_section=True: phần output kết thúc ở "OUTPUT:" tiếp theo (cách check.py tách output).
+    Nếu chương trình không in "OUTPUT:" thì không bao giờ dừng sớm (toàn bộ stdout sẽ được so sánh).
+    """
+
+    def __init__(self, expected: str, remove_spaces: bool, case_sensitive: bool, single_section: bool = False) -> None:
+        self.expected = expected
+        self.remove_spaces = remove_spaces
+        self.case_sensitive = case_sensitive
+        self.end_markers = [BUILD_MARKER] + ([OUTPUT_MARKER] if single_section else [])
+        self.comparator = StreamComparator(expected, remove_spaces, case_sensitive)
+        self.pending = ""
+        self.in_section = False
+        self.done = False
+        self.failed = False
+
+    @property
+    def divergence(self) -> dict | None:
+        """Vị trí khác nhau đầu tiên (tính từ sau "OUTPUT:"), khi đã dừng sớm."""
+        return self.comparator.divergence
+
+    def _partial_marker_len(self, text: str) -> int:
+        """Độ dài đuôi của text có thể là phần đầu của một marker kết thúc (bị cắt giữa hai đoạn)."""
+        for size in range(min(len(text), max(len(m) for m in self.end_markers) - 1), 0, -1):
+            tail = text[-size:]
+            if any(m.startswith(tail) for m in self.end_markers):
+                return size
+        return 0
+
+    def feed(self, text: str) -> bool:
+        """Nhận thêm output; trả về False khi chắc chắn không khớp expected."""
+        if self.failed or self.done:
+            return not self.failed
+        self.pending += text
+
+        if not self.in_section:
+            index = self.pending.find(OUTPUT_MARKER)
+            if index < 0:
+                # Giữ lại đuôi phòng trường hợp "OUTPUT:" bị cắt giữa hai đoạn
+                self.pending = self.pending[-(len(OUTPUT_MARKER) - 1):]
+                return True
+            self.pending = self.pending[index + len(OUTPUT_MARKER):]
+            self.in_section = True
+
+        cut = min((i for i in (self.pending.find(m) for m in self.end_markers) if i >= 0), default=-1)
+        if cut >= 0:
+            self.pending = self.pending[:cut]
+            self.done = True
+
+        # Chỉ so sánh phần chắc chắn không chứa marker bị cắt dở
+        safe = len(self.pending) if self.done else len(self.pending) - self._partial_marker_len(self.pending)
+        matched = self.comparator.feed(self.pending[:safe])
+        self.pending = self.pending[safe:]
+        if matched and self.done:
+            matched = self.comparator.finish()
+        self.failed = not matched
+        return matched
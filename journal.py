@@ -0,0 +1,89 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+
+class RunJournal:
+    """Write-ahead journal của một lượt chấm cả lớp.
+
+    Mỗi tiến trình ghi vào một file riêng (<pid>.jsonl) trong journal_dir, mỗi dòng JSON là kết quả
+    một test hoặc một bài đã chấm xong. Ghi bằng một lệnh write() O_APPEND nên không cần khóa giữa các
+    worker; fsync khi xong mỗi bài thay vì mỗi test để việc ghi không làm chậm lượt chấm.
+    """
+
+    def __init__(self, journal_dir: Path) -> None:
+        self.journal_dir = Path(journal_dir)
+        self._fd: int | None = None
+        self._pid: int | None = None
+
+    def _segment(self) -> int:
+        # Mở lại sau fork: mỗi worker có file riêng
+        if self._fd is None or self._pid != os.getpid():
+            self.journal_dir.mkdir(parents=True, exist_ok=True)
+            self._pid = os.getpid()
+            self._fd = os.open(
+                self.journal_dir / f"{self._pid}.jsonl", os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+            )
+        return self._fd
+
+    def append(self, entry: dict) -> None:
+        os.write(self._segment(), (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    def sync(self) -> None:
+        if self._fd is not None and self._pid == os.getpid():
+            os.fsync(self._fd)
+
+    def clear(self) -> None:
+        """Bỏ journal của lượt chấm trước (bắt đầu lượt mới, không --resume)."""
+        shutil.rmtree(self.journal_dir, ignore_errors=True)
+
+    def load(self) -> tuple[dict[str, dict[str, dict]], dict[str, dict]]:
+        """Đọc lại journal: ({bài: {test: kết quả}}, {bài đã chấm xong: dòng bảng điểm}).
+
+        Dòng cuối bị cắt dở (máy tắt giữa lúc ghi) được bỏ qua.
+        """
+        tests: dict[str, dict[str, dict]] = {}
+        done: dict[str, dict] = {}
+        for segment in sorted(self.journal_dir.glob("*.jsonl")):
+            for line in segment.read_text(encoding="utf-8", errors="replace").splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("type") == "test":
+                    tests.setdefault(entry["student"], {})[entry["test"]] = entry
+                elif entry.get("type") == "submission":
+                    done[entry["student"]] = entry["row"]
+        return tests, done
+
+    def for_submission(self, student: str, completed: dict[str, dict] | None = None) -> "SubmissionJournal":
+        return SubmissionJournal(self, student, completed or {})
+
+
+class SubmissionJournal:
+    """Phần journal của một bài: ghi kết quả từng test, trả lại kết quả đã có khi --resume."""
+
+    def __init__(self, journal: RunJournal, student: str, completed: dict[str, dict]) -> None:
+        self.journal = journal
+        self.student = student
+        self.completed_tests = completed
+
+    def completed(self, test_name: str) -> dict | None:
+        return self.completed_tests.get(test_name)
+
+    def record(self, test_name: str, passed: bool, earned: float, max_mark: float, verdict: str) -> None:
+        self.journal.append(
+            {
+                "type": "test",
+                "student": self.student,
+                "test": test_name,
+                "passed": passed,
+                "earned": earned,
+                "max_mark": max_mark,
+                "verdict": verdict,
+            }
+        )
+
+    def sync(self) -> None:
+        self.journal.sync()
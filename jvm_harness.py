@@ -0,0 +1,521 @@
+import hashlib
+import locale
+import os
+import queue
+import secrets
+import socket
+import subprocess
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+from java_exec import DEFAULT_MAX_OUTPUT_BYTES, OutputLimitExceeded
+
+CACHE_DIR = Path(os.environ.get("AUTOGRADE_CACHE", Path.home() / ".cache" / "auto-grade"))
+
+HARNESS_CLASS = "GraderHarness"
+
+# Mã trả về của harness khi output của test vượt quá giới hạn byte
+HARNESS_OUTPUT_LIMIT_RC = -3
+
+# Số JVM harness rảnh tối đa HarnessPool giữ lại giữa các lượt chấm
+DEFAULT_POOL_IDLE = 4
+
+# Khoảng kiểm tra JVM harness còn sống trong lúc chờ nó kết nối kênh kết quả (giây)
+_ACCEPT_POLL = 0.2
+
+# Harness chạy trong một JVM duy nhất: mỗi test case được nạp bằng một
+# URLClassLoader mới (reset toàn bộ static state), System.in/out/err được
+# chuyển hướng vào bộ đệm riêng (giữa hai test: vào một sink bỏ đi), kết quả
+# gửi về Python qua một socket localhost riêng (không phải stdout - bài làm
+# không in chen vào được) theo khung "@@RESULT <rc> <len_out> <len_err>\n" +
+# bytes. Harness kết nối tới cổng Python mở sẵn và gửi dòng secret (đọc từ
+# dòng đầu stdin) trước khi nạp bất kỳ class nào của bài làm. Input từng test
+# gửi sang theo khung "<len>\n" + bytes, hoặc "<len>\t<classpath>\t<main class>\n"
+# + bytes để chuyển sang bài khác (watch mode vừa biên dịch lại).
+HARNESS_SOURCE = r"""
+import java.io.*;
+import java.lang.reflect.*;
+import java.net.*;
+import java.util.*;
+
+public class GraderHarness {
+    private static final InputStream REAL_IN = System.in;
+    // Giữa hai test (thread bài làm còn sống sau main()): output bị bỏ đi
+    private static final PrintStream DISCARD = new PrintStream(new OutputStream() {
+        @Override
+        public void write(int b) {
+        }
+
+        @Override
+        public void write(byte[] b, int off, int len) {
+        }
+    }, true);
+    private static OutputStream channel;
+    private static final Object LOCK = new Object();
+    private static final int OUTPUT_LIMIT_RC = -3;
+    private static volatile ByteArrayOutputStream caseOut;
+    private static volatile ByteArrayOutputStream caseErr;
+    private static long maxOutput;
+
+    /** Ném ra khi bài làm in quá giới hạn byte; dừng main() của test hiện tại. */
+    static final class OutputLimitError extends Error {
+    }
+
+    static final class CappedBuffer extends ByteArrayOutputStream {
+        @Override
+        public synchronized void write(int b) {
+            check(1);
+            super.write(b);
+        }
+
+        @Override
+        public synchronized void write(byte[] b, int off, int len) {
+            check(len);
+            super.write(b, off, len);
+        }
+
+        private void check(int len) {
+            if (count + (long) len > maxOutput) {
+                throw new OutputLimitError();
+            }
+        }
+    }
+
+    private static URL[] toUrls(String classpath) throws MalformedURLException {
+        String[] entries = classpath.split(File.pathSeparator);
+        URL[] urls = new URL[entries.length];
+        for (int i = 0; i < entries.length; i++) {
+            urls[i] = new File(entries[i]).toURI().toURL();
+        }
+        return urls;
+    }
+
+    public static void main(String[] args) throws Exception {
+        URL[] urls = toUrls(args[0]);
+        String mainClass = args[1];
+        maxOutput = Long.parseLong(args[2]);
+        ClassLoader parent = platformLoader();
+        System.setOut(DISCARD);
+        System.setErr(DISCARD);
+
+        DataInputStream in = new DataInputStream(new BufferedInputStream(REAL_IN));
+        String secret = readLine(in);
+        Socket socket = new Socket(InetAddress.getLoopbackAddress(), Integer.parseInt(args[3]));
+        socket.setTcpNoDelay(true);
+        channel = new BufferedOutputStream(socket.getOutputStream());
+        channel.write((secret + "\n").getBytes("US-ASCII"));
+        channel.flush();
+
+        Runtime.getRuntime().addShutdownHook(new Thread(new Runnable() {
+            public void run() {
+                // System.exit() trong bài làm: gửi phần output đã có, Python lấy exit code
+                ByteArrayOutputStream out = caseOut, err = caseErr;
+                if (out != null) {
+                    System.out.flush();
+                    System.err.flush();
+                    writeFrame("@@EXIT 0", out.toByteArray(), err.toByteArray());
+                }
+            }
+        }));
+
+        String header;
+        while ((header = readLine(in)) != null) {
+            String[] parts = header.split("\t");
+            if (parts.length == 3) {
+                urls = toUrls(parts[1]);
+                mainClass = parts[2];
+            }
+            byte[] input = new byte[Integer.parseInt(parts[0].trim())];
+            in.readFully(input);
+            runCase(urls, parent, mainClass, input);
+        }
+    }
+
+    private static void runCase(URL[] urls, ClassLoader parent, String mainClass, byte[] input) {
+        ByteArrayOutputStream out = new CappedBuffer();
+        ByteArrayOutputStream err = new CappedBuffer();
+        PrintStream ps = new PrintStream(out, true);
+        PrintStream pe = new PrintStream(err, true);
+        caseOut = out;
+        caseErr = err;
+        System.setIn(new ByteArrayInputStream(input));
+        System.setOut(ps);
+        System.setErr(pe);
+        int rc = 0;
+        URLClassLoader loader = new URLClassLoader(urls, parent);
+        try {
+            Class<?> cls = Class.forName(mainClass, true, loader);
+            Method main = cls.getMethod("main", String[].class);
+            main.invoke(null, (Object) new String[0]);
+        } catch (ClassNotFoundException | NoSuchMethodException | NoClassDefFoundError e) {
+            pe.println("Error: Could not find or load main class " + mainClass);
+            pe.println("Caused by: " + e);
+            rc = 1;
+        } catch (Throwable t) {
+            Throwable cause = t instanceof InvocationTargetException ? t.getCause() : t;
+            if (isOutputLimit(cause)) {
+                rc = OUTPUT_LIMIT_RC;
+            } else {
+                pe.print("Exception in thread \"main\" ");
+                cause.printStackTrace(pe);
+                rc = 1;
+            }
+        } finally {
+            ps.flush();
+            pe.flush();
+            caseOut = null;
+            caseErr = null;
+            System.setIn(REAL_IN);
+            System.setOut(DISCARD);
+            System.setErr(DISCARD);
+            try {
+                loader.close();
+            } catch (IOException ignored) {
+            }
+        }
+        if (rc == OUTPUT_LIMIT_RC) {
+            out.reset();  // output bị cắt, không gửi về
+        }
+        writeFrame("@@RESULT " + rc, out.toByteArray(), err.toByteArray());
+    }
+
+    private static void writeFrame(String head, byte[] out, byte[] err) {
+        synchronized (LOCK) {
+            try {
+                channel.write((head + " " + out.length + " " + err.length + "\n").getBytes("US-ASCII"));
+                channel.write(out);
+                channel.write(err);
+                channel.flush();
+            } catch (IOException ignored) {
+            }
+        }
+    }
+
+    private static boolean isOutputLimit(Throwable t) {
+        for (; t != null; t = t.getCause()) {
+            if (t instanceof OutputLimitError) {
+                return true;
+            }
+        }
+        return false;
+    }
+
+    private static ClassLoader platformLoader() {
+        try {
+            return (ClassLoader) ClassLoader.class.getMethod("getPlatformClassLoader").invoke(null);
+        } catch (Exception e) {
+            return null;  // Java 8: bootstrap loader
+        }
+    }
+
+    private static String readLine(DataInputStream in) throws IOException {
+        ByteArrayOutputStream line = new ByteArrayOutputStream();
+        int b;
+        while ((b = in.read()) != -1 && b != '\n') {
+            line.write(b);
+        }
+        // Header có thể chứa classpath (đường dẫn tiếng Việt), Python gửi UTF-8
+        return (b == -1 && line.size() == 0) ? null : new String(line.toByteArray(), "UTF-8");
+    }
+}
+"""
+
+
+def ensure_java_tool(class_name: str, source: str) -> Path:
+    """Biên dịch một công cụ Java nội bộ (một lần, cache theo hash mã nguồn) và trả về thư mục classpath."""
+    digest = hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+    out_dir = CACHE_DIR / "tools" / class_name / digest
+    if (out_dir / f"{class_name}.class").exists():
+        return out_dir
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    source_file = out_dir / f"{class_name}.java"
+    source_file.write_text(source, encoding="utf-8")
+    result = subprocess.run(
+        ["javac", "-encoding", "UTF-8", "-d", str(out_dir), str(source_file)],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Không biên dịch được {class_name}:\n{result.stderr}")
+    return out_dir
+
+
+def ensure_harness() -> Path:
+    """Biên dịch GraderHarness.java nếu cần và trả về thư mục classpath."""
+    return ensure_java_tool(HARNESS_CLASS, HARNESS_SOURCE)
+
+
+def read_jar_main_class(jar_file: Path) -> str | None:
+    """Đọc Main-Class trong META-INF/MANIFEST.MF của file .jar."""
+    try:
+        with zipfile.ZipFile(jar_file) as jar:
+            manifest = jar.read("META-INF/MANIFEST.MF").decode("utf-8", errors="replace")
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+
+    # Manifest có thể gập dòng dài: dòng tiếp theo bắt đầu bằng một dấu cách
+    manifest = manifest.replace("\r\n", "\n").replace("\n ", "")
+    for line in manifest.split("\n"):
+        if line.startswith("Main-Class:"):
+            return line.split(":", 1)[1].strip() or None
+    return None
+
+
+class WarmJVM:
+    """Một JVM harness sống suốt quá trình chấm một bài, chạy lần lượt main() cho từng test case."""
+
+    def __init__(
+        self,
+        classpath: list[Path],
+        main_class: str,
+        cwd: Path,
+        max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+        jvm_flags: list[str] | None = None,
+    ) -> None:
+        self.classpath = [Path(p).resolve() for p in classpath]
+        self.main_class = main_class
+        self.cwd = Path(cwd)
+        self.max_output_bytes = max_output_bytes
+        self.jvm_flags = list(jvm_flags or [])
+        self.encoding = locale.getpreferredencoding(False)
+        self.process: subprocess.Popen | None = None
+        self._frames: queue.Queue = queue.Queue()
+        self._jvm_stderr: list[bytes] = []
+        # Classpath / main class đã đổi khi JVM đang chạy: gửi kèm trong khung input kế tiếp
+        self._retarget = False
+
+    def retarget(self, classpath: list[Path], main_class: str) -> None:
+        """Chuyển JVM sang classpath / main class khác (bài vừa biên dịch lại) mà không khởi động lại JVM."""
+        self.classpath = [Path(p).resolve() for p in classpath]
+        self.main_class = main_class
+        self._retarget = self.process is not None
+
+    def _start(self) -> None:
+        harness_dir = ensure_harness()
+        listener = socket.create_server(("127.0.0.1", 0))
+        secret = secrets.token_hex(16)
+        cmd = [
+            "java",
+            *self.jvm_flags,
+            "-cp",
+            str(harness_dir),
+            HARNESS_CLASS,
+            os.pathsep.join(str(p) for p in self.classpath),
+            self.main_class,
+            str(self.max_output_bytes),
+            str(listener.getsockname()[1]),
+        ]
+        try:
+            self.process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                cwd=str(self.cwd),
+            )
+        except OSError:
+            listener.close()
+            raise
+        try:
+            self.process.stdin.write(f"{secret}\n".encode("ascii"))
+            self.process.stdin.flush()
+        except OSError:
+            pass  # JVM chết ngay khi khởi động: _read_frames báo frame None
+        self._frames = queue.Queue()
+        self._jvm_stderr = []
+        self._retarget = False
+        threading.Thread(
+            target=self._read_frames, args=(self.process, listener, secret, self._frames), daemon=True
+        ).start()
+        threading.Thread(target=self._drain_stderr, args=(self.process, self._jvm_stderr), daemon=True).start()
+
+    @staticmethod
+    def _accept(process: subprocess.Popen, listener: socket.socket, secret: str) -> tuple | None:
+        """Chờ harness kết nối kênh kết quả (bỏ qua kết nối không gửi đúng secret); trả về (socket, stream đọc),
+        None nếu JVM đã chết."""
+        listener.settimeout(_ACCEPT_POLL)
+        while process.poll() is None:
+            try:
+                conn, _ = listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return None
+            conn.settimeout(None)
+            stream = conn.makefile("rb")
+            if stream.readline().rstrip(b"\n") == secret.encode("ascii"):
+                return conn, stream
+            stream.close()
+            conn.close()
+        return None
+
+    @classmethod
+    def _read_frames(
+        cls, process: subprocess.Popen, listener: socket.socket, secret: str, frames: queue.Queue
+    ) -> None:
+        with listener:
+            accepted = cls._accept(process, listener, secret)
+        if accepted is None:
+            frames.put(None)
+            return
+        conn, stream = accepted
+        with conn, stream:
+            while True:
+                header = stream.readline()
+                if not header:
+                    frames.put(None)
+                    return
+                parts = header.decode("ascii", errors="replace").split()
+                if len(parts) != 4 or parts[0] not in ("@@RESULT", "@@EXIT"):
+                    frames.put(None)  # kênh riêng của harness không thể sai khung
+                    return
+                out = stream.read(int(parts[2]))
+                err = stream.read(int(parts[3]))
+                frames.put((parts[0], int(parts[1]), out, err))
+
+    @staticmethod
+    def _drain_stderr(process: subprocess.Popen, sink: list[bytes]) -> None:
+        for chunk in iter(lambda: process.stderr.read(4096), b""):
+            sink.append(chunk)
+
+    def _decode(self, data: bytes) -> str:
+        return data.decode(self.encoding, errors="replace").replace("\r\n", "\n")
+
+    def run(self, input_data: str, timeout: float = 10, timings: dict | None = None) -> tuple[str, str, int]:
+        """Chạy main() với input; trả về (stdout, stderr, returncode) như subprocess.run.
+
+        Ném subprocess.TimeoutExpired khi quá thời gian (JVM bị kill, lần sau khởi động lại)
+        và OutputLimitExceeded khi output vượt quá max_output_bytes. timings (nếu có) được điền
+        started / first_output / finished như ExecutionEngine.run; lần chạy phải khởi động JVM
+        được tính hết là khởi động.
+        """
+        started = time.perf_counter()
+        cold_start = self.process is None or self.process.poll() is not None
+        if cold_start:
+            self._start()
+        try:
+            return self._run(input_data, timeout)
+        finally:
+            if timings is not None:
+                finished = time.perf_counter()
+                timings.update(started=started, first_output=finished if cold_start else started, finished=finished)
+
+    def _run(self, input_data: str, timeout: float) -> tuple[str, str, int]:
+
+        payload = input_data.encode(self.encoding)
+        header = str(len(payload))
+        if self._retarget:
+            header += f"\t{os.pathsep.join(str(p) for p in self.classpath)}\t{self.main_class}"
+            self._retarget = False
+        try:
+            self.process.stdin.write(f"{header}\n".encode("utf-8") + payload)
+            self.process.stdin.flush()
+        except OSError:
+            pass  # JVM đã chết, lỗi sẽ được báo qua frame None bên dưới
+
+        try:
+            frame = self._frames.get(timeout=timeout)
+        except queue.Empty:
+            args = self.process.args
+            self.close()
+            raise subprocess.TimeoutExpired(args, timeout) from None
+
+        if frame is None:
+            # JVM chết mà không gửi kết quả (crash, OutOfMemoryError, ...)
+            returncode = self.process.wait()
+            self.process = None
+            return "", self._decode(b"".join(self._jvm_stderr)), returncode
+
+        kind, returncode, out, err = frame
+        if kind == "@@RESULT" and returncode == HARNESS_OUTPUT_LIMIT_RC:
+            raise OutputLimitExceeded(f"OUTPUT LIMIT - stdout vượt quá {self.max_output_bytes} byte")
+        if kind == "@@EXIT":
+            # Bài làm gọi System.exit(): JVM đã tắt, exit code là của tiến trình
+            returncode = self.process.wait()
+            self.process = None
+        return self._decode(out), self._decode(err), returncode
+
+    def close(self) -> None:
+        """Tắt JVM harness."""
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process = None
+
+
+class HarnessPool:
+    """Giữ các WarmJVM đã dùng xong để lượt chấm sau dùng lại thay vì khởi động JVM mới (grade_daemon.py).
+
+    Key gồm classpath, main class, thư mục chạy, giới hạn output, flag JVM và version (hash mã nguồn / file
+    .jar). JVM khớp key được dùng lại nguyên trạng; bài đã sửa (khác classpath / version) thì một JVM cùng
+    thư mục chạy, giới hạn output và flag được chuyển sang bài mới bằng retarget() - mỗi test vẫn nạp class
+    bằng class loader mới nên không chạy nhầm class cũ. Giữ tối đa max_idle JVM rảnh, thừa thì tắt JVM lâu
+    nhất chưa dùng.
+    """
+
+    def __init__(self, max_idle: int = DEFAULT_POOL_IDLE) -> None:
+        self.max_idle = max_idle
+        self._idle: list[tuple[tuple, WarmJVM]] = []
+        self._leased: dict[int, tuple] = {}
+        self._lock = threading.Lock()
+
+    def acquire(
+        self,
+        classpath: list[Path],
+        main_class: str,
+        cwd: Path,
+        max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+        jvm_flags: list[str] | None = None,
+        version: str | None = None,
+    ) -> WarmJVM:
+        """Lấy một JVM rảnh khớp key, không có thì tạo WarmJVM mới (khởi động ở lần run() đầu tiên)."""
+        key = (
+            tuple(str(Path(p).resolve()) for p in classpath),
+            main_class,
+            str(Path(cwd).resolve()),
+            max_output_bytes,
+            tuple(jvm_flags or []),
+            version,
+        )
+        with self._lock:
+            # Ưu tiên JVM đã chạy đúng bài này; không có thì chuyển một JVM cùng thư mục chạy / flag sang bài mới
+            matches = [i for i, (idle_key, _h) in enumerate(self._idle) if idle_key == key]
+            matches = matches or [i for i, (idle_key, _h) in enumerate(self._idle) if idle_key[2:5] == key[2:5]]
+            if matches:
+                idle_key, harness = self._idle.pop(matches[-1])
+                if idle_key != key:
+                    harness.retarget(classpath, main_class)
+            else:
+                harness = WarmJVM(classpath, main_class, cwd, max_output_bytes, jvm_flags)
+            self._leased[id(harness)] = key
+        return harness
+
+    def release(self, harness: WarmJVM) -> None:
+        """Trả JVM về pool; JVM đã tắt (timeout, System.exit, crash) thì bỏ luôn."""
+        with self._lock:
+            key = self._leased.pop(id(harness), None)
+            if key is None or harness.process is None or harness.process.poll() is not None:
+                evicted = [harness]
+            else:
+                self._idle.append((key, harness))
+                evicted = []
+                while len(self._idle) > self.max_idle:
+                    evicted.append(self._idle.pop(0)[1])
+        for old in evicted:
+            old.close()
+
+    def idle_count(self) -> int:
+        with self._lock:
+            return len(self._idle)
+
+    def close(self) -> None:
+        """Tắt mọi JVM rảnh trong pool."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for _key, harness in idle:
+            harness.close()
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import subprocess
+import time
+import zipfile
+from pathlib import Path
+
+from compile_cache import tool_version
+from exec_engine import get_engine
+from java_exec import DEFAULT_MAX_OUTPUT_BYTES, RunAborted, heap_flags, os_memory_limit
+from jvm_harness import CACHE_DIR
+from resource_usage import quantile
+
+# File cấu hình profile khởi động JVM, đặt cạnh test cases (TestCases/ hoặc cạnh tests.txt)
+PROFILE_FILE = "jvm_profile.json"
+PROFILES = ("default", "fast")
+
+# Chương trình của sinh viên chạy rất ngắn: chỉ dùng C1, GC đơn giản, không ghi perf data.
+# Log của JVM (vd. cảnh báo CDS) chuyển sang stderr để không lẫn vào output được chấm.
+FAST_START_FLAGS = [
+    "-XX:TieredStopAtLevel=1",
+    "-XX:+UseSerialGC",
+    "-XX:-UsePerfData",
+    "-Xshare:auto",
+    "-Xlog:disable",
+    "-Xlog:all=warning:stderr",
+]
+
+CDS_DIR = CACHE_DIR / "cds"
+
+# Thời gian tối đa cho lần chạy tạo archive / đo thời gian khởi động
+PREPARE_TIMEOUT = 30
+
+# Số lần đo thời gian khởi động mỗi profile (so sánh trung vị - một lần đo lẻ chỉ là nhiễu)
+TIMING_SAMPLES = 3
+
+
+class JVMProfile:
+    """Profile khởi động JVM: "default" (như cũ) hoặc "fast" (flag cho lần chạy ngắn + AppCDS archive).
+
+    Với "fast", mỗi bài (theo nội dung mã nguồn / file .jar) được tạo một AppCDS archive bằng một lần
+    chạy thử, đồng thời đo thời gian khởi động so với profile mặc định. Nếu JVM không nhận các flag,
+    không tạo được archive hoặc kết quả khác với profile mặc định thì tự động quay về cấu hình an toàn hơn.
+    """
+
+    def __init__(self, name: str = "default", flags: list[str] | None = None, cds: bool = True) -> None:
+        self.name = name if name in PROFILES else "default"
+        self.flags = list(FAST_START_FLAGS if flags is None else flags) if self.name == "fast" else []
+        self.cds = cds and self.name == "fast"
+        self._usable: bool | None = None
+
+    @classmethod
+    def load(cls, suite_dir: Path, override: str | None = None) -> "JVMProfile":
+        """Đọc jvm_profile.json trong thư mục bộ test; override (--jvm-profile) thay cho "profile" trong file."""
+        try:
+            data = json.loads((Path(suite_dir) / PROFILE_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        return cls(override or data.get("profile", "default"), data.get("flags"), data.get("cds", True))
+
+    def usable(self) -> bool:
+        """JVM trong PATH có nhận các flag của profile không (thử một lần bằng java -version)."""
+        if self._usable is None:
+            ok = True
+            if self.flags:
+                try:
+                    result = subprocess.run(
+                        ["java", *self.flags, "-version"], stdin=subprocess.DEVNULL, capture_output=True, timeout=30
+                    )
+                    ok = result.returncode == 0
+                except (OSError, subprocess.TimeoutExpired):
+                    ok = False
+                if not ok:
+                    print("⚠️  JVM không hỗ trợ fast-start profile, dùng cấu hình mặc định")
+            self._usable = ok
+        return self._usable
+
+    def launch_flags(self) -> list[str]:
+        """Flag của profile (không kèm archive) - dùng cho JVM harness sống lâu."""
+        return self.flags if self.usable() else []
+
+    def prepare(
+        self,
+        target: list[str],
+        content_key: str,
+        train_input: str,
+        cwd: Path,
+        max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+        memory_limit: int | None = None,
+    ) -> list[str]:
+        """Trả về tham số cho lệnh java (sau "java") để chạy target (["-cp", dir, class] hoặc ["-jar", jar]).
+
+        content_key: hash nội dung bài làm; train_input: input của lần chạy thử tạo archive. Các lần chạy thử
+        đi qua engine với cùng giới hạn như một test: max_output_bytes, memory_limit (MEMORY_LIMIT, MB).
+        """
+        if self.name == "default" or not self.usable():
+            return target
+        if not self.cds:
+            return self.flags + target
+
+        key_source = "\0".join([tool_version("java"), *self.flags, *target, content_key])
+        key = hashlib.sha256(key_source.encode("utf-8")).hexdigest()[:32]
+        archive = CDS_DIR / f"{key}.jsa"
+        status_file = CDS_DIR / f"{key}.json"
+
+        # AppCDS chỉ archive class nằm trong file .jar - đóng gói thư mục .class thành jar trong cache
+        cds_target = target
+        if target[0] == "-cp" and Path(target[1]).is_dir():
+            cds_target = ["-cp", str(self._classes_jar(Path(target[1]), key)), *target[2:]]
+
+        try:
+            status = json.loads(status_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            limits = _RunLimits(cwd, max_output_bytes, memory_limit)
+            status = self._create_archive(archive, target, cds_target, train_input, limits)
+            tmp_file = status_file.with_name(f"{status_file.name}.tmp-{os.getpid()}")
+            tmp_file.write_text(json.dumps(status, indent=2), encoding="utf-8")
+            tmp_file.replace(status_file)
+
+        if not status["fast_ok"]:
+            return target
+        if status["archive"] and archive.exists():
+            return self.flags + [f"-XX:SharedArchiveFile={archive}"] + cds_target
+        return self.flags + cds_target
+
+    @staticmethod
+    def _classes_jar(classes_dir: Path, key: str) -> Path:
+        jar_file = CDS_DIR / f"{key}.jar"
+        if jar_file.exists():
+            return jar_file
+        CDS_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_file = jar_file.with_name(f"{jar_file.name}.tmp-{os.getpid()}")
+        with zipfile.ZipFile(tmp_file, "w", zipfile.ZIP_STORED) as jar:
+            for path in sorted(classes_dir.rglob("*")):
+                if path.is_file() and path.suffix not in (".java", ".log"):
+                    jar.write(path, path.relative_to(classes_dir).as_posix())
+        tmp_file.replace(jar_file)
+        return jar_file
+
+    def _create_archive(
+        self, archive: Path, target: list[str], cds_target: list[str], train_input: str, limits: "_RunLimits"
+    ) -> dict:
+        """Chạy thử một lần để tạo archive, rồi đo thời gian khởi động so với profile mặc định (trung vị của
+        TIMING_SAMPLES lần chạy xen kẽ mỗi profile)."""
+        CDS_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_archive = archive.with_name(f"{archive.stem}.tmp-{os.getpid()}.jsa")
+        limits.run([*self.flags, f"-XX:ArchiveClassesAtExit={tmp_archive}", *cds_target], train_input)
+        archived = tmp_archive.exists()
+        if archived:
+            tmp_archive.replace(archive)
+        else:
+            print("⚠️  Không tạo được AppCDS archive - fast-start chạy không có archive")
+
+        fast_args = self.flags + ([f"-XX:SharedArchiveFile={archive}"] if archived else []) + cds_target
+        default_times: list[float] = []
+        fast_times: list[float] = []
+        results: set = set()
+        for _ in range(TIMING_SAMPLES):
+            elapsed, default_result = limits.run(target, train_input)
+            default_times.append(elapsed)
+            elapsed, fast_result = limits.run(fast_args, train_input)
+            fast_times.append(elapsed)
+            results.update([default_result, fast_result])
+        default_time = quantile(sorted(default_times), 0.5)
+        fast_time = quantile(sorted(fast_times), 0.5)
+        # Mọi lần chạy (cả hai profile) phải chạy được và cho cùng một kết quả
+        same_result = None not in results and len(results) == 1
+        fast_ok = same_result and fast_time < default_time
+        if not same_result:
+            print("⚠️  Kết quả với fast-start profile khác profile mặc định - dùng cấu hình mặc định cho bài này")
+        elif not fast_ok:
+            print(f"⚠️  Fast-start không nhanh hơn ({default_time:.2f}s → {fast_time:.2f}s) - dùng cấu hình mặc định")
+        else:
+            saving = (1 - fast_time / default_time) * 100
+            print(f"⚡ Fast-start JVM: khởi động {default_time:.2f}s → {fast_time:.2f}s (nhanh hơn {saving:.0f}%)")
+        return {
+            "archive": archived,
+            "fast_ok": fast_ok,
+            "default_seconds": round(default_time, 4),
+            "fast_seconds": round(fast_time, 4),
+        }
+
+
+class _RunLimits:
+    """Cách chạy thử bài làm khi chuẩn bị profile: qua engine như một test (kill cả cây tiến trình khi quá
+    PREPARE_TIMEOUT, giới hạn output và bộ nhớ)."""
+
+    def __init__(self, cwd: Path, max_output_bytes: int, memory_limit: int | None) -> None:
+        self.cwd = cwd
+        self.max_output_bytes = max_output_bytes
+        self.memory_limit = memory_limit
+
+    def run(self, java_args: list[str], input_data: str) -> tuple[float, tuple[str, int] | None]:
+        """Chạy java với java_args; trả về (thời gian, (stdout, returncode)), None thay cho kết quả nếu lỗi."""
+        start = time.perf_counter()
+        try:
+            stdout, _stderr, returncode = get_engine().run(
+                ["java", *heap_flags(self.memory_limit), *java_args],
+                input_data,
+                cwd=str(self.cwd),
+                timeout=PREPARE_TIMEOUT,
+                max_output_bytes=self.max_output_bytes,
+                memory_limit_mb=os_memory_limit(self.memory_limit),
+            )
+        except (OSError, subprocess.TimeoutExpired, RunAborted):
+            return time.perf_counter() - start, None
+        return time.perf_counter() - start, (stdout, returncode)
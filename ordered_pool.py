@@ -0,0 +1,86 @@
+import contextlib
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class _ThreadStdout(io.TextIOBase):
+    """sys.stdout chuyển hướng theo thread: thread có bộ đệm riêng thì ghi vào đó, còn lại ghi ra target."""
+
+    def __init__(self, target) -> None:
+        super().__init__()
+        self.target = target
+        self.local = threading.local()
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self.local, "buffer", None)
+        (buffer if buffer is not None else self.target).write(text)
+        return len(text)
+
+    def flush(self) -> None:
+        if getattr(self.local, "buffer", None) is None:
+            self.target.flush()
+
+
+class _NullWriter(io.TextIOBase):
+    def write(self, text: str) -> int:
+        return len(text)
+
+
+@contextlib.contextmanager
+def suppressed_stdout():
+    """Bỏ output mà thread hiện tại in ra trong khối lệnh (--quiet); thread khác vẫn in bình thường.
+
+    Trong task của run_ordered chỉ thay bộ đệm riêng của thread; ngoài đó (chạy tuần tự) thay sys.stdout.
+    """
+    proxy = sys.stdout
+    if isinstance(proxy, _ThreadStdout) and getattr(proxy.local, "buffer", None) is not None:
+        previous, proxy.local.buffer = proxy.local.buffer, _NullWriter()
+        try:
+            yield
+        finally:
+            proxy.local.buffer = previous
+    else:
+        with contextlib.redirect_stdout(_NullWriter()):
+            yield
+
+
+def run_ordered(func: Callable[[T], R], items: Iterable[T], jobs: int = 1) -> Iterator[R]:
+    """Chạy func cho từng item trên tối đa `jobs` thread, trả kết quả theo đúng thứ tự items.
+
+    Output mà func in ra (kể cả lồng nhau) được gom theo từng item và in ra theo thứ tự,
+    nên console giống hệt khi chạy tuần tự. jobs <= 1 thì chạy tuần tự như cũ.
+    """
+    if jobs <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    proxy = sys.stdout if isinstance(sys.stdout, _ThreadStdout) else None
+    installed = proxy is None
+    if installed:
+        proxy = _ThreadStdout(sys.stdout)
+        sys.stdout = proxy
+
+    def task(item: T) -> tuple[str, R]:
+        proxy.local.buffer = io.StringIO()
+        try:
+            result = func(item)
+        finally:
+            text = proxy.local.buffer.getvalue()
+            proxy.local.buffer = None
+        return text, result
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for text, result in pool.map(task, items):
+                proxy.write(text)
+                yield result
+    finally:
+        if installed:
+            sys.stdout = proxy.target
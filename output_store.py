@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+
+from java_exec import run_verdict
+from jvm_harness import CACHE_DIR
+
+DEFAULT_MAX_BYTES = int(os.environ.get("AUTOGRADE_OUTPUTS_MAX_MB", "1024")) * 1024 * 1024
+
+
+def hash_files(root: Path, files: list[Path]) -> str:
+    """Hash nội dung các file (theo đường dẫn tương đối với root) - định danh một bài làm."""
+    root = Path(root)
+    digest = hashlib.sha256()
+    for path in sorted(files, key=lambda f: Path(f).relative_to(root).as_posix()):
+        digest.update(b"\0" + Path(path).relative_to(root).as_posix().encode("utf-8") + b"\0")
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def comparison_key(expected_normalized: str, remove_spaces: bool, case_sensitive: bool) -> str:
+    """Định danh cách so sánh đã dùng khi dừng sớm (EARLY_MISMATCH chỉ còn đúng nếu cách so sánh không đổi)."""
+    return hash_text(f"{int(remove_spaces)}{int(case_sensitive)}\0{expected_normalized}")
+
+
+class OutputStore:
+    """Lưu output thô của từng lần chạy, key = hash(bài làm, input) - chấm lại không cần chạy Java."""
+
+    def __init__(self, root: Path | None = None, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = Path(root) if root else CACHE_DIR / "outputs"
+        self.max_bytes = max_bytes
+
+    def _path(self, submission_hash: str, input_data: str) -> Path:
+        key = hash_text(f"{submission_hash}\0{hash_text(input_data)}")
+        return self.root / key[:2] / f"{key}.json.z"
+
+    def save(
+        self,
+        submission_hash: str,
+        input_data: str,
+        stdout: str,
+        stderr: str,
+        returncode: int,
+        elapsed: float,
+        timeout: float,
+        mismatch_key: str | None = None,
+        memory_limit: int | None = None,
+    ) -> None:
+        """Ghi kết quả một lần chạy (stdout chưa tách "OUTPUT:"); lỗi ghi file không làm hỏng lượt chấm."""
+        record = {
+            "stdout": stdout,
+            "stderr": stderr,
+            "returncode": returncode,
+            # verdict của runner (TIMEOUT, OUTPUT_LIMIT, ...) - không suy ra lại được từ nội dung stderr
+            "verdict": run_verdict(stderr, returncode),
+            "elapsed": round(elapsed, 4),
+            "timeout": timeout,
+            "mismatch_key": mismatch_key,
+            "memory_limit": memory_limit,
+        }
+        path = self._path(submission_hash, input_data)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = path.with_name(f"{path.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+            tmp_file.write_bytes(zlib.compress(json.dumps(record, ensure_ascii=False).encode("utf-8")))
+            tmp_file.replace(path)
+        except OSError:
+            pass
+
+    def load(self, submission_hash: str, input_data: str) -> dict | None:
+        """Kết quả đã lưu của bài làm với input này; None nếu chưa từng chạy."""
+        path = self._path(submission_hash, input_data)
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # cập nhật thời điểm dùng gần nhất cho LRU
+            return json.loads(zlib.decompress(data).decode("utf-8"))
+        except (OSError, ValueError, zlib.error):
+            return None
+
+    def evict(self) -> None:
+        """Xóa các kết quả ít dùng nhất cho đến khi tổng dung lượng <= max_bytes."""
+        entries = []
+        total = 0
+        for path in self.root.glob("*/*.json.z"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        for _mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
@@ -1,58 +1,106 @@
+import argparse
 import subprocess
-import re
+import threading
+import time
 from pathlib import Path
 
+from exec_engine import DEFAULT_MAX_JVMS, configure_engine, get_engine
+from java_exec import (
+    DEFAULT_MAX_OUTPUT_BYTES,
+    DEFAULT_TIMEOUT,
+    VERDICT_EARLY_MISMATCH,
+    VERDICT_INTERNAL_ERROR,
+    VERDICT_TIMEOUT,
+    OutputWatcher,
+    RunAborted,
+    RunMessage,
+    apply_limits,
+    extract_output,
+    find_divergence,
+    format_divergence,
+    heap_flags,
+    load_time_limits,
+    os_memory_limit,
+    run_verdict,
+    test_timeout,
+)
+from journal import SubmissionJournal
+from jvm_harness import HarnessPool, WarmJVM, read_jar_main_class
+from jvm_profile import PROFILES, JVMProfile
+from ordered_pool import run_ordered, suppressed_stdout
+from profiler import PROFILER, context, span
+from progress import ProgressBar
+from resource_usage import format_limits, format_usage, usage_summary
+from output_store import OutputStore, comparison_key, hash_files
+from result_sink import ResultSink
+from results_db import ResultsDB, test_case_hash
+from test_suite import load_tests_file, normalize_output
+
 
 class PETestRunner:
-    def __init__(self, base_dir: Path) -> None:
+    def __init__(
+        self,
+        base_dir: Path,
+        warm_jvm: bool = False,
+        test_file: Path | None = None,
+        jobs: int = 1,
+        max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+        early_exit: bool = True,
+        record_outputs: bool = True,
+        incremental: bool = True,
+        journal: SubmissionJournal | None = None,
+        jvm_profile: str | None = None,
+        harness_pool: HarnessPool | None = None,
+        sink: ResultSink | None = None,
+        console: str = "full",
+    ) -> None:
         self.base_dir = Path(base_dir)
-        self.test_file = self.base_dir / "tests.txt"
+        self.test_file = Path(test_file) if test_file else self.base_dir / "tests.txt"
+        # warm_jvm: mỗi file .jar dùng một JVM harness cho tất cả test case
+        self.warm_jvm = warm_jvm
+        # jobs: số câu hỏi / test case chạy đồng thời (output vẫn in theo thứ tự)
+        self.jobs = jobs
+        self._harness_local = threading.local()
+        self._harnesses: list[WarmJVM] = []
+        # Tắt warm JVM (khi không dựng được harness) một lần cho mọi thread
+        self._warm_lock = threading.Lock()
+        # harness_pool: HarnessPool của grade_daemon.py - JVM harness được trả về pool thay vì tắt sau lượt chấm
+        self.harness_pool = harness_pool
+        # Giới hạn stdout mỗi test, và dừng sớm khi output chắc chắn sai
+        self.max_output_bytes = max_output_bytes
+        self.early_exit = early_exit
+        # Giới hạn thời gian từng test, key "Q1/TC1" (time_limits.json cạnh tests.txt, sinh bởi calibrate.py)
+        self.time_limits = load_time_limits(self.test_file.parent)
+        # record_outputs: lưu output thô từng test (key = hash file .jar + hash input) để chấm lại bằng rescore.py
+        self.output_store = OutputStore() if record_outputs else None
+        self._jar_hashes: dict[Path, str] = {}
+        # Kết quả đã chấm theo (hash .jar, hash test); incremental=False: chạy lại mọi test (vẫn ghi kết quả)
+        self.results_db = ResultsDB()
+        self.incremental = incremental
+        # journal: ghi từng test khi xong, bỏ qua test đã ghi khi batch_check.py --resume
+        self.journal = journal
+        # Profile khởi động JVM (jvm_profile.json cạnh tests.txt hoặc --jvm-profile); tham số java đã chuẩn bị
+        # (flag + AppCDS archive) cho từng file .jar, tạo ở lần chạy đầu tiên
+        self.jvm_profile = JVMProfile.load(self.test_file.parent, jvm_profile)
+        self._java_args: dict[Path, list[str]] = {}
+        self._java_args_lock = threading.Lock()
+        # sink: ResultSink ghi kết quả từng test ra JSONL / CSV ngay khi xong (kèm stdout / stderr đã cắt ngắn)
+        self.sink = sink
+        self._outputs: dict[str, tuple[str, str]] = {}
+        # console: full / quiet / progress (xem progress.CONSOLE_MODES); progress: thanh tiến độ của lượt chấm
+        self.console = console
+        self._progress: ProgressBar | None = None
 
     def parse_tests(self) -> dict:
-        """Parse file tests.txt để lấy thông tin test cho 4 bài (Q1..Q4)."""
+        """Parse file tests.txt để lấy thông tin test cho 4 bài (Q1..Q4).
+
+        Parse một lượt và dùng lại bộ test đã biên dịch (kèm expected đã chuẩn hóa) nếu file không đổi.
+        """
         if not self.test_file.exists():
             print(f"⚠️  Không tìm thấy file: {self.test_file}")
             return {}
 
-        content = self.test_file.read_text(encoding="utf-8")
-        tests: dict[int, list[dict]] = {}
-
-        # Parse từng bài (Q1, Q2, Q3, Q4)
-        for q_num in range(1, 5):
-            pattern = rf"===\s*Q{q_num}\s*===\s*\n(.*?)(?=(?:===\s*Q\d\s*===)|$)"
-            match = re.search(pattern, content, re.DOTALL)
-            if not match:
-                continue
-
-            q_content = match.group(1)
-
-            # Parse từng test case trong bài
-            tc_pattern = (
-                r"---\s*TC(\d+)\s*---\s*\n"
-                r"INPUT:\s*\n(.*?)\n"
-                r"OUTPUT:\s*\n(.*?)\n"
-                r"REMOVE_SPACES:\s*\n(YES|NO)\s*\n"
-                r"CASE_SENSITIVE:\s*\n(YES|NO)\s*\n"
-                r"MARK:\s*\n([\d.]+)"
-            )
-
-            test_cases: list[dict] = []
-            for tc_match in re.finditer(tc_pattern, q_content, re.DOTALL):
-                test_cases.append(
-                    {
-                        "tc_num": int(tc_match.group(1)),
-                        "input": tc_match.group(2).strip(),
-                        "expected_output": tc_match.group(3).strip(),
-                        "remove_spaces": tc_match.group(4) == "YES",
-                        "case_sensitive": tc_match.group(5) == "YES",
-                        "mark": float(tc_match.group(6)),
-                    }
-                )
-
-            if test_cases:
-                tests[q_num] = test_cases
-
-        return tests
+        return load_tests_file(self.test_file)
 
     def find_jar_file(self, question_dir: Path) -> Path | None:
         """Tìm file .jar trong thư mục run/ của từng câu hỏi."""
@@ -72,42 +120,172 @@ class PETestRunner:
         # Nếu không có, lấy file đầu tiên
         return jar_files[0]
 
-    def run_jar_with_input(self, jar_file: Path, input_data: str) -> tuple[str, str, int]:
-        """Chạy file .jar với input (timeout 10s)."""
-        try:
-            result = subprocess.run(
-                ["java", "-jar", str(jar_file)],
-                input=input_data,
-                capture_output=True,
-                text=True,
-                timeout=10,
-                cwd=str(jar_file.parent),
-            )
-
-            stdout = result.stdout
-
-            # Nếu output có từ khóa OUTPUT:, chỉ lấy phần sau đó
-            if "OUTPUT:" in stdout:
-                output_part = stdout.split("OUTPUT:", 1)[1]
-                if "BUILD SUCCESSFUL" in output_part:
-                    output_part = output_part.split("BUILD SUCCESSFUL", 1)[0]
-                stdout = output_part.strip()
-
-            return stdout, result.stderr, result.returncode
+    def _get_harness(self, jar_file: Path) -> WarmJVM | None:
+        """Lấy (hoặc tạo) JVM harness của thread hiện tại cho file .jar; None nếu jar không có Main-Class."""
+        harnesses = getattr(self._harness_local, "by_jar", None)
+        if harnesses is None:
+            harnesses = self._harness_local.by_jar = {}
+        if jar_file not in harnesses:
+            main_class = read_jar_main_class(jar_file)
+            if not main_class:
+                return None
+            if self.harness_pool is not None:
+                harnesses[jar_file] = self.harness_pool.acquire(
+                    [jar_file],
+                    main_class,
+                    jar_file.parent,
+                    self.max_output_bytes,
+                    self.jvm_profile.launch_flags(),
+                    version=self.jar_hash(jar_file),
+                )
+            else:
+                harnesses[jar_file] = WarmJVM(
+                    [jar_file], main_class, jar_file.parent, self.max_output_bytes, self.jvm_profile.launch_flags()
+                )
+            self._harnesses.append(harnesses[jar_file])
+        return harnesses[jar_file]
+
+    def _disable_warm_jvm(self, error: Exception) -> None:
+        """Chuyển cả lượt chấm về chế độ mỗi test một JVM; chỉ báo ở thread tắt đầu tiên."""
+        with self._warm_lock:
+            if not self.warm_jvm:
+                return
+            self.warm_jvm = False
+        print(f"⚠️  Không dùng được warm JVM, chuyển về chế độ thường: {error}")
+
+    def close_harnesses(self) -> None:
+        """Tắt tất cả JVM harness đang chạy (hoặc trả về harness_pool để lượt chấm sau dùng lại)."""
+        for harness in self._harnesses:
+            if self.harness_pool is not None:
+                self.harness_pool.release(harness)
+            else:
+                harness.close()
+        self._harnesses.clear()
+        self._harness_local = threading.local()
 
+    def run_jar_with_input(
+        self,
+        jar_file: Path,
+        input_data: str,
+        watcher: OutputWatcher | None = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        usage: dict | None = None,
+        memory_limit: int | None = None,
+    ) -> tuple[str, str, int]:
+        """Chạy file .jar với input (mặc định timeout 10s); watcher theo dõi output để dừng sớm khi sai.
+
+        usage (nếu có) nhận thời gian chạy, CPU time (user / system) và peak RSS của tiến trình java.
+        memory_limit (MEMORY_LIMIT của test, MB): giới hạn heap (-Xmx) và bộ nhớ của tiến trình java.
+        """
+        # Chuẩn bị profile khởi động trước khi bấm giờ - lần chạy tạo archive không tính vào thời gian của test
+        # Warm JVM dùng chung một heap - test có MEMORY_LIMIT chạy trong JVM riêng
+        warm = self.warm_jvm and not memory_limit
+        java_args = None if warm else self.java_args(jar_file, input_data, memory_limit)
+        # Mốc thời gian cho profiler (khởi động JVM / chạy chương trình); None khi không profile
+        timings: dict | None = {} if PROFILER.enabled else None
+        start = time.perf_counter()
+        try:
+            harness = self._get_harness(jar_file) if warm else None
+            if harness is not None:
+                try:
+                    # Warm JVM vẫn tính vào giới hạn số JVM chạy đồng thời của engine
+                    with get_engine().slot():
+                        stdout, stderr, returncode = harness.run(input_data, timeout=timeout, timings=timings)
+                except RuntimeError as exc:
+                    # Không dựng được harness - quay về chế độ mỗi test một JVM
+                    self._disable_warm_jvm(exc)
+                    return self.run_jar_with_input(jar_file, input_data, watcher, timeout, usage, memory_limit)
+            else:
+                java_args = java_args or self.java_args(jar_file, input_data, memory_limit)
+                stdout, stderr, returncode = get_engine().run(
+                    ["java", *heap_flags(memory_limit), *java_args],
+                    input_data,
+                    cwd=str(jar_file.parent),
+                    timeout=timeout,
+                    max_output_bytes=self.max_output_bytes,
+                    watcher=watcher,
+                    timings=timings,
+                    usage=usage,
+                    memory_limit_mb=os_memory_limit(memory_limit),
+                )
         except subprocess.TimeoutExpired:
-            return "", "⏱️  TIMEOUT - Chương trình chạy quá 10 giây", -1
+            stdout, stderr, returncode = (
+                "",
+                RunMessage(f"⏱️  TIMEOUT - Chương trình chạy quá {timeout:g} giây", VERDICT_TIMEOUT),
+                -1,
+            )
+        except RunAborted as exc:
+            stdout, stderr, returncode = "", RunMessage(str(exc), exc.verdict), -1
         except Exception as exc:  # noqa: BLE001
-            return "", f"❌ Lỗi: {str(exc)}", -1
+            stdout, stderr, returncode = "", RunMessage(f"❌ Lỗi: {str(exc)}", VERDICT_INTERNAL_ERROR), -1
+
+        elapsed = time.perf_counter() - start
+        if timings:
+            PROFILER.add_run(timings)
+        if usage is not None:
+            # Warm JVM dùng chung một tiến trình: chỉ có thời gian chạy, không có CPU / RSS riêng từng test
+            usage.setdefault("wall", round(elapsed, 4))
+        self._record_output(
+            jar_file, input_data, (stdout, stderr, returncode), elapsed, timeout, watcher, memory_limit
+        )
+
+        # Nếu output có từ khóa OUTPUT:, chỉ lấy phần sau đó
+        return extract_output(stdout), stderr, returncode
+
+    def java_args(self, jar_file: Path, train_input: str, memory_limit: int | None = None) -> list[str]:
+        """Tham số lệnh java cho file .jar theo profile khởi động (fast: tạo AppCDS archive ở lần chạy đầu).
+
+        Các lần chạy thử có cùng giới hạn output / MEMORY_LIMIT (memory_limit, MB) như test đầu tiên.
+        """
+        with self._java_args_lock:
+            if jar_file not in self._java_args:
+                with span("prepare_jvm"):
+                    self._java_args[jar_file] = self.jvm_profile.prepare(
+                        ["-jar", str(jar_file)],
+                        self.jar_hash(jar_file),
+                        train_input,
+                        jar_file.parent,
+                        self.max_output_bytes,
+                        memory_limit,
+                    )
+            return self._java_args[jar_file]
+
+    def jar_hash(self, jar_file: Path) -> str:
+        """Hash nội dung file .jar (định danh bài làm trong output store), tính một lần mỗi jar."""
+        if jar_file not in self._jar_hashes:
+            self._jar_hashes[jar_file] = hash_files(jar_file.parent, [jar_file])
+        return self._jar_hashes[jar_file]
+
+    def _record_output(
+        self,
+        jar_file: Path,
+        input_data: str,
+        result: tuple[str, str, int],
+        elapsed: float,
+        timeout: float,
+        watcher: OutputWatcher | None,
+        memory_limit: int | None = None,
+    ) -> None:
+        """Lưu output thô vào output store để chấm lại (rescore.py) mà không cần chạy Java."""
+        if self.output_store is None:
+            return
+        stdout, stderr, returncode = result
+        if run_verdict(stderr, returncode) == VERDICT_INTERNAL_ERROR:
+            return  # lỗi của máy chấm, không phải output của bài làm
+        mismatch_key = None
+        if watcher is not None and run_verdict(stderr, returncode) == VERDICT_EARLY_MISMATCH:
+            mismatch_key = comparison_key(watcher.expected, watcher.remove_spaces, watcher.case_sensitive)
+        try:
+            submission_hash = self.jar_hash(jar_file)
+        except OSError:
+            return
+        self.output_store.save(
+            submission_hash, input_data, stdout, stderr, returncode, elapsed, timeout, mismatch_key, memory_limit
+        )
 
     def normalize_output(self, text: str, remove_spaces: bool = False, case_sensitive: bool = True) -> str:
         """Chuẩn hóa output theo config so sánh."""
-        result = text.strip()
-        if remove_spaces:
-            result = re.sub(r"\s+", "", result)
-        if not case_sensitive:
-            result = result.lower()
-        return result
+        return normalize_output(text, remove_spaces, case_sensitive)
 
     def compare_outputs(
         self,
@@ -115,14 +293,154 @@ class PETestRunner:
         expected: str,
         remove_spaces: bool = False,
         case_sensitive: bool = True,
+        normalized_expected: str | None = None,
     ) -> bool:
-        """So sánh output thực tế và mong đợi theo cấu hình."""
-        actual_norm = self.normalize_output(actual, remove_spaces, case_sensitive)
-        expected_norm = self.normalize_output(expected, remove_spaces, case_sensitive)
-        return actual_norm == expected_norm
+        """So sánh output thực tế và mong đợi theo cấu hình (normalized_expected: expected đã chuẩn hóa sẵn).
+
+        Output được chuẩn hóa và so sánh theo từng đoạn, không tạo bản sao của cả output.
+        """
+        if normalized_expected is None:
+            normalized_expected = self.normalize_output(expected, remove_spaces, case_sensitive)
+        return find_divergence(actual, normalized_expected, remove_spaces, case_sensitive) is None
+
+    def run_test_case(self, jar_file: Path, tc: dict, q_num: int = 0) -> dict:
+        """Chạy 1 test case với file .jar, in chi tiết và trả về kết quả."""
+        tc_num = tc["tc_num"]
+        print(f"┌─ Test Case {tc_num} ─────────────────────────────────────")
+
+        input_display = (tc["input"][:80] + "...") if len(tc["input"]) > 80 else tc["input"]
+        print(f"│ 📥 Input:    {input_display}")
+
+        expected_display = (
+            tc["expected_output"][:80] + "..." if len(tc["expected_output"]) > 80 else tc["expected_output"]
+        )
+        print(f"│ 📋 Expected: {expected_display}")
+
+        test_name = f"Q{q_num}/TC{tc_num}"
+        timeout = test_timeout(tc, self.time_limits, test_name)
+        submission_hash = self.jar_hash(jar_file)
+        test_hash = test_case_hash(tc, timeout, self.max_output_bytes)
+        stored = self.results_db.get(submission_hash, test_hash) if self.incremental else None
+        if stored is not None:
+            print(f"│ ↺ File .jar và test không đổi - dùng kết quả đã chấm: {stored['verdict']}")
+            print(f"│ 💯 Score: {stored['earned']}/{tc['mark']}")
+            print(f"└{'─' * 65}\n")
+            return {"tc_num": tc_num, **stored, "max_mark": tc["mark"]}
+
+        watcher = None
+        if self.early_exit:
+            watcher = OutputWatcher(
+                tc["expected_normalized"],
+                tc["remove_spaces"],
+                tc["case_sensitive"],
+            )
+        if tc["time_limit_ms"] or tc["memory_limit_mb"]:
+            print(f"│ ⏳ Limits:   {format_limits(tc)}")
+        usage: dict = {}
+        stdout, stderr, returncode = self.run_jar_with_input(
+            jar_file, tc["input"], watcher, timeout, usage, tc["memory_limit_mb"]
+        )
+        stderr, returncode = apply_limits(tc, stderr, returncode)
+        if self.sink is not None:
+            self._outputs[test_name] = (stdout, stderr)
+        print(f"│ 📈 Resource: {format_usage(usage)}")
+
+        if returncode != 0:
+            print(f"│ ❌ ERROR: {stderr[:100]}")
+            print(f"│ 💯 Score: 0/{tc['mark']}")
+            print(f"└{'─' * 65}\n")
+            verdict = run_verdict(stderr, returncode) or "ERROR"
+            # INTERNAL_ERROR (lỗi của máy chấm) không được lưu: lần chấm sau chạy lại test này
+            if verdict != VERDICT_INTERNAL_ERROR:
+                self.results_db.put(submission_hash, test_hash, test_name, False, 0.0, tc["mark"], verdict, usage)
+            return {
+                "tc_num": tc_num,
+                "passed": False,
+                "max_mark": tc["mark"],
+                "earned": 0.0,
+                "verdict": verdict,
+                "usage": usage,
+            }
+
+        actual_display = stdout[:80] + "..." if len(stdout) > 80 else stdout
+        print(f"│ 📤 Actual:   {actual_display}")
+
+        with span("compare"):
+            divergence = find_divergence(stdout, tc["expected_normalized"], tc["remove_spaces"], tc["case_sensitive"])
+        passed = divergence is None
+
+        if passed:
+            print("│ ✅ PASS")
+            print(f"│ 💯 Score: {tc['mark']}/{tc['mark']}")
+        else:
+            print("│ ❌ FAIL")
+            print(f"│ 🔎 Diff:     {format_divergence(divergence)}")
+            print(f"│ 💯 Score: 0/{tc['mark']}")
+
+        print(f"└{'─' * 65}\n")
+        verdict = "PASS" if passed else "FAIL"
+        earned = tc["mark"] if passed else 0.0
+        self.results_db.put(submission_hash, test_hash, test_name, passed, earned, tc["mark"], verdict, usage)
+        return {
+            "tc_num": tc_num,
+            "passed": passed,
+            "max_mark": tc["mark"],
+            "earned": earned,
+            "verdict": verdict,
+            "usage": usage,
+        }
+
+    def _run_profiled(self, jar_file: Path, tc: dict, q_num: int) -> dict:
+        """Chạy test case với tên bài / test gắn vào các span của profiler (test chạy trên thread riêng)."""
+        test_name = f"Q{q_num}/TC{tc['tc_num']}"
+        with context(submission=str(self.base_dir), test=test_name):
+            result = self._run_or_resume(jar_file, tc, q_num)
+        if self.sink is not None:
+            # Test không chạy Java lần này (kết quả đã chấm / journal) được ghi với reused=True
+            output = self._outputs.pop(test_name, None)
+            stdout, stderr = output or (None, None)
+            self.sink.record(
+                test_name,
+                result["verdict"],
+                result["passed"],
+                result["earned"],
+                result["max_mark"],
+                result.get("usage"),
+                stdout,
+                stderr,
+                reused=output is None,
+            )
+        if self._progress is not None:
+            self._progress.advance(result["passed"])
+        return result
 
-    def run_question(self, q_num: int, test_cases: list[dict]) -> dict | None:
-        """Chạy test cho 1 câu hỏi (folder 1..4)."""
+    def _run_or_resume(self, jar_file: Path, tc: dict, q_num: int) -> dict:
+        """Chạy test case (hoặc lấy kết quả đã ghi trong journal khi tiếp tục lượt chấm bị gián đoạn)."""
+        if self.journal is None:
+            return self.run_test_case(jar_file, tc, q_num)
+
+        test_name = f"Q{q_num}/TC{tc['tc_num']}"
+        done = self.journal.completed(test_name)
+        if done is not None:
+            print(f"┌─ Test Case {tc['tc_num']} ─────────────────────────────────────")
+            print(f"│ ↻ Đã chấm trước khi bị gián đoạn: {done['verdict']}")
+            print(f"│ 💯 Score: {done['earned']}/{done['max_mark']}")
+            print(f"└{'─' * 65}\n")
+            return {
+                "tc_num": tc["tc_num"],
+                "passed": done["passed"],
+                "max_mark": done["max_mark"],
+                "earned": done["earned"],
+                "verdict": done["verdict"],
+            }
+
+        result = self.run_test_case(jar_file, tc, q_num)
+        if result["verdict"] != VERDICT_INTERNAL_ERROR:
+            self.journal.record(test_name, result["passed"], result["earned"], result["max_mark"], result["verdict"])
+        return result
+
+    def run_question(self, q_num: int, test_cases: list[dict], jobs: int | None = None) -> dict | None:
+        """Chạy test cho 1 câu hỏi (folder 1..4); jobs: số test case chạy đồng thời (mặc định self.jobs)."""
         print(f"\n{'=' * 70}")
         print(f"🔷 QUESTION {q_num}")
         print(f"{'=' * 70}")
@@ -132,7 +450,8 @@ class PETestRunner:
             print(f"⚠️  Không tìm thấy folder: {question_dir}")
             return None
 
-        jar_file = self.find_jar_file(question_dir)
+        with span("find_jar", submission=str(self.base_dir), test=f"Q{q_num}"):
+            jar_file = self.find_jar_file(question_dir)
         if not jar_file:
             print(f"⚠️  Không tìm thấy file .jar trong {question_dir / 'run'}")
             return None
@@ -143,68 +462,11 @@ class PETestRunner:
         earned_mark = 0.0
         results: list[dict] = []
 
-        for tc in test_cases:
-            tc_num = tc["tc_num"]
-            print(f"┌─ Test Case {tc_num} ─────────────────────────────────────")
-
-            input_display = (tc["input"][:80] + "...") if len(tc["input"]) > 80 else tc["input"]
-            print(f"│ 📥 Input:    {input_display}")
-
-            expected_display = (
-                tc["expected_output"][:80] + "..." if len(tc["expected_output"]) > 80 else tc["expected_output"]
-            )
-            print(f"│ 📋 Expected: {expected_display}")
-
-            stdout, stderr, returncode = self.run_jar_with_input(jar_file, tc["input"])
-
-            if returncode != 0:
-                print(f"│ ❌ ERROR: {stderr[:100]}")
-                print(f"│ 💯 Score: 0/{tc['mark']}")
-                print(f"└{'─' * 65}\n")
-                results.append(
-                    {
-                        "tc_num": tc_num,
-                        "passed": False,
-                        "max_mark": tc["mark"],
-                        "earned": 0.0,
-                    }
-                )
-                total_mark += tc["mark"]
-                continue
-
-            actual_display = stdout[:80] + "..." if len(stdout) > 80 else stdout
-            print(f"│ 📤 Actual:   {actual_display}")
-
-            passed = self.compare_outputs(
-                stdout, tc["expected_output"], tc["remove_spaces"], tc["case_sensitive"]
-            )
-
-            if passed:
-                print("│ ✅ PASS")
-                print(f"│ 💯 Score: {tc['mark']}/{tc['mark']}")
-                earned_mark += tc["mark"]
-                results.append(
-                    {
-                        "tc_num": tc_num,
-                        "passed": True,
-                        "max_mark": tc["mark"],
-                        "earned": tc["mark"],
-                    }
-                )
-            else:
-                print("│ ❌ FAIL")
-                print(f"│ 💯 Score: 0/{tc['mark']}")
-                results.append(
-                    {
-                        "tc_num": tc_num,
-                        "passed": False,
-                        "max_mark": tc["mark"],
-                        "earned": 0.0,
-                    }
-                )
-
-            print(f"└{'─' * 65}\n")
-            total_mark += tc["mark"]
+        jobs = self.jobs if jobs is None else jobs
+        for result in run_ordered(lambda tc: self._run_profiled(jar_file, tc, q_num), test_cases, jobs):
+            results.append(result)
+            total_mark += result["max_mark"]
+            earned_mark += result["earned"]
 
         return {
             "question": q_num,
@@ -213,27 +475,54 @@ class PETestRunner:
             "results": results,
         }
 
-    def run_all_tests(self) -> None:
-        """Chạy tất cả test cho 4 câu hỏi."""
+    def run_all_tests(self, questions: list[int] | None = None) -> list[dict]:
+        """Chạy tất cả test cho 4 câu hỏi (hoặc chỉ các câu trong questions), trả về kết quả từng câu."""
         print("\n" + "=" * 70)
         print("🎯 PE TEST RUNNER - BẮT ĐẦU CHẤM BÀI")
         print("=" * 70)
 
-        all_tests = self.parse_tests()
+        with span("parse_tests", submission=str(self.base_dir)):
+            all_tests = self.parse_tests()
         if not all_tests:
             print("⚠️  Không tìm thấy test case nào trong tests.txt")
-            return
+            return []
 
+        def run_or_skip(q_num: int) -> dict | None:
+            if q_num not in all_tests:
+                print(f"\n⚠️  Không có test case cho Question {q_num}")
+                return None
+            if self.console == "full":
+                return self.run_question(q_num, all_tests[q_num], test_jobs)
+            # --quiet / --progress: bỏ output chi tiết của câu, chỉ báo câu không chấm được
+            with suppressed_stdout():
+                result = self.run_question(q_num, all_tests[q_num], test_jobs)
+            if result is None:
+                print(f"⚠️  Question {q_num}: không tìm thấy folder / file .jar")
+            return result
+
+        selected = list(questions or range(1, 5))
+        # Song song ở một tầng: nhiều câu thì mỗi câu chạy test tuần tự, chỉ một câu thì song song theo test case
+        # (tránh jobs x jobs thread)
+        question_jobs = min(self.jobs, len(selected))
+        test_jobs = self.jobs if question_jobs <= 1 else 1
+        if self.console == "progress":
+            self._progress = ProgressBar(sum(len(all_tests.get(q_num, [])) for q_num in selected))
         all_results: list[dict] = []
-        for q_num in range(1, 5):
-            if q_num in all_tests:
-                result = self.run_question(q_num, all_tests[q_num])
+        try:
+            for result in run_ordered(run_or_skip, selected, question_jobs):
                 if result:
                     all_results.append(result)
-            else:
-                print(f"\n⚠️  Không có test case cho Question {q_num}")
-
+        finally:
+            # Kể cả khi một test ném lỗi - không để lại JVM harness chạy ngầm (worker của batch_check.py)
+            self.close_harnesses()
+        if self._progress is not None:
+            self._progress.close()
+            self._progress = None
+
+        if self.output_store is not None:
+            self.output_store.evict()
         self.print_summary(all_results)
+        return all_results
 
     def print_summary(self, all_results: list[dict]) -> None:
         """In tổng kết điểm cuối cùng."""
@@ -257,10 +546,18 @@ class PETestRunner:
             print(f"{status} Question {q_num}: {earned:.1f}/{max_mark:.1f} ({percentage:.1f}%)")
 
             for tc_result in result["results"]:
+                # --quiet / --progress: chỉ liệt kê test trượt
+                if tc_result["passed"] and self.console != "full":
+                    continue
                 tc_status = "✅" if tc_result["passed"] else "❌"
+                verdict = tc_result.get("verdict", "")
+                note = f" ({verdict})" if verdict not in ("", "PASS", "FAIL", "ERROR") else ""
                 print(
-                    f"   {tc_status} TC{tc_result['tc_num']}: {tc_result['earned']:.1f}/{tc_result['max_mark']:.1f}"
+                    f"   {tc_status} TC{tc_result['tc_num']}: {tc_result['earned']:.1f}/{tc_result['max_mark']:.1f}{note}"
                 )
+            # Phân bố tài nguyên các test của câu (test lấy từ journal khi --resume không có số liệu)
+            for line in usage_summary([tc_result.get("usage") for tc_result in result["results"]]):
+                print(f"   📈 {line}")
 
         print("─" * 70)
 
@@ -280,8 +577,99 @@ class PETestRunner:
         print("=" * 70)
 
 
-def main() -> None:
-    current_dir = Path.cwd()
+def build_parser() -> argparse.ArgumentParser:
+    """Tham số dòng lệnh của pe_check.py (grade_daemon.py dùng lại để nhận cùng tham số từ client)."""
+    parser = argparse.ArgumentParser(description="Chấm bài PE (1..4/run/*.jar) theo tests.txt")
+    parser.add_argument(
+        "--warm-jvm",
+        action="store_true",
+        help="Chạy tất cả test case của mỗi câu trong một JVM harness (reset static giữa các test)",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=1, help="Số câu hỏi / test case chạy đồng thời (mặc định 1 = tuần tự)"
+    )
+    parser.add_argument(
+        "--max-jvms",
+        type=int,
+        default=DEFAULT_MAX_JVMS,
+        help=f"Số JVM chạy đồng thời tối đa (mặc định {DEFAULT_MAX_JVMS} = số CPU)",
+    )
+    parser.add_argument(
+        "--max-output-mb",
+        type=float,
+        default=DEFAULT_MAX_OUTPUT_BYTES / (1024 * 1024),
+        help="Giới hạn stdout mỗi test case (MB); vượt quá sẽ bị dừng với kết quả OUTPUT_LIMIT",
+    )
+    parser.add_argument(
+        "--no-early-exit",
+        action="store_true",
+        help="Không dừng sớm chương trình khi output đã chắc chắn sai (EARLY_MISMATCH)",
+    )
+    parser.add_argument(
+        "--no-record", action="store_true", help="Không lưu output thô của từng test (dùng cho rescore.py)"
+    )
+    parser.add_argument(
+        "--regrade-all",
+        action="store_true",
+        help="Chạy lại mọi test, không dùng kết quả đã chấm khi file .jar và test không đổi",
+    )
+    parser.add_argument(
+        "--jvm-profile",
+        choices=PROFILES,
+        default=None,
+        help="Profile khởi động JVM: fast = flag cho chương trình ngắn + AppCDS archive "
+        "(mặc định theo jvm_profile.json cạnh tests.txt, không có thì default)",
+    )
+    parser.add_argument(
+        "--results",
+        type=Path,
+        default=None,
+        metavar="FILE.jsonl",
+        help="Ghi kết quả từng test (verdict, điểm, thời gian, output đã cắt ngắn) ra file JSONL ngay khi chấm xong",
+    )
+    parser.add_argument(
+        "--results-csv",
+        type=Path,
+        default=None,
+        metavar="FILE.csv",
+        help="Ghi bảng điểm từng test ra file CSV, mỗi test một dòng ngay khi chấm xong",
+    )
+    console = parser.add_mutually_exclusive_group()
+    console.add_argument(
+        "--quiet",
+        dest="console",
+        action="store_const",
+        const="quiet",
+        default="full",
+        help="Không in chi tiết từng test, chỉ in tổng kết (và các test trượt)",
+    )
+    console.add_argument(
+        "--progress",
+        dest="console",
+        action="store_const",
+        const="progress",
+        help="Như --quiet nhưng hiện thanh tiến độ",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="profile",
+        default=None,
+        metavar="PREFIX",
+        help="Đo thời gian từng phase: in bảng tổng kết, ghi span ra PREFIX.json và metrics Prometheus "
+        "ra PREFIX.prom (mặc định PREFIX = profile)",
+    )
+    return parser
+
+
+def run(args: argparse.Namespace, current_dir: Path, harness_pool: HarnessPool | None = None) -> None:
+    """Chấm bài PE trong current_dir với tham số đã parse; harness_pool: xem PETestRunner.
+
+    Người gọi truyền harness_pool (grade_daemon.py) tự cấu hình engine một lần; run() không tạo lại engine.
+    """
+    if args.profile:
+        PROFILER.enable()
+
     print(f"📁 Working directory: {current_dir}")
 
     missing: list[str] = []
@@ -310,8 +698,40 @@ def main() -> None:
         print("└── tests.txt")
         return
 
-    runner = PETestRunner(current_dir)
-    runner.run_all_tests()
+    # Kết quả từng test ghi ra JSONL / CSV (nếu có --results / --results-csv)
+    sink = None
+    if args.results or args.results_csv:
+        results = args.results and current_dir / args.results
+        results_csv = args.results_csv and current_dir / args.results_csv
+        ResultSink.prepare(results, results_csv)
+        sink = ResultSink(results, results_csv, submission=current_dir.name)
+
+    if harness_pool is None:
+        configure_engine(args.max_jvms)
+    runner = PETestRunner(
+        current_dir,
+        warm_jvm=args.warm_jvm,
+        jobs=args.jobs,
+        max_output_bytes=int(args.max_output_mb * 1024 * 1024),
+        early_exit=not args.no_early_exit,
+        record_outputs=not args.no_record,
+        incremental=not args.regrade_all,
+        jvm_profile=args.jvm_profile,
+        harness_pool=harness_pool,
+        sink=sink,
+        console=args.console,
+    )
+    try:
+        runner.run_all_tests()
+    finally:
+        if sink is not None:
+            sink.close()
+    if args.profile:
+        PROFILER.report(current_dir / args.profile)
+
+
+def main() -> None:
+    run(build_parser().parse_args(), Path.cwd())
 
 
 if __name__ == "__main__":
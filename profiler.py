@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from resource_usage import quantile
+
+# Thứ tự các phase trong bảng tổng kết; phase khác (nếu có) xếp sau theo tên
+PHASES = (
+    "parse_tests",
+    "compile",
+    "find_main_class",
+    "find_jar",
+    "prepare_jvm",
+    "jvm_startup",
+    "execution",
+    "compare",
+)
+
+METRIC_PREFIX = "autograde"
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _NullSpan:
+    """Context manager rỗng dùng khi profiler tắt - không đo, không cấp phát."""
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+    def __init__(self, profiler: "Profiler", phase: str, attrs: dict) -> None:
+        self.profiler = profiler
+        self.phase = phase
+        self.attrs = attrs
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> bool:
+        self.profiler.add(self.phase, self.start, time.perf_counter(), **self.attrs)
+        return False
+
+
+class _Context:
+    def __init__(self, profiler: "Profiler", attrs: dict) -> None:
+        self.profiler = profiler
+        self.attrs = attrs
+
+    def __enter__(self) -> None:
+        local = self.profiler._local
+        self.previous = getattr(local, "attrs", {})
+        local.attrs = {**self.previous, **self.attrs}
+
+    def __exit__(self, *exc) -> bool:
+        self.profiler._local.attrs = self.previous
+        return False
+
+
+class Profiler:
+    """Đo thời gian từng phase (parse test, biên dịch, khởi động JVM, chạy, so sánh) của từng bài / test.
+
+    Khi tắt (mặc định), span() và context() trả về một context manager rỗng dùng chung, nên code chấm
+    chỉ tốn một lần kiểm tra cờ. Span lưu thời điểm bắt đầu theo epoch để gộp được span từ nhiều tiến trình.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.spans: list[dict] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+        self._epoch = time.time()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def reset(self) -> None:
+        """Tắt và xóa các span đã đo (grade_daemon.py dùng lại tiến trình cho lượt chấm sau)."""
+        with self._lock:
+            self.enabled = False
+            self.spans = []
+
+    def span(self, phase: str, **attrs):
+        """with span("compile"): ... - đo thời gian khối lệnh (kèm thuộc tính của context hiện tại)."""
+        if not self.enabled:
+            return _NULL
+        return _Span(self, phase, attrs)
+
+    def context(self, **attrs):
+        """with context(submission=..., test=...): ... - gắn thuộc tính cho mọi span trong thread hiện tại."""
+        if not self.enabled:
+            return _NULL
+        return _Context(self, attrs)
+
+    def add(self, phase: str, start: float, end: float, **attrs) -> None:
+        """Ghi một span đã đo (start / end theo time.perf_counter())."""
+        entry = {
+            "phase": phase,
+            "start": round(self._epoch + (start - self._origin), 6),
+            "duration": round(end - start, 6),
+            "pid": os.getpid(),
+            **getattr(self._local, "attrs", {}),
+            **attrs,
+        }
+        with self._lock:
+            self.spans.append(entry)
+
+    def add_run(self, timings: dict) -> None:
+        """Tách một lần chạy thành jvm_startup (đến byte output đầu tiên) và execution (phần còn lại).
+
+        timings do ExecutionEngine.run / WarmJVM.run điền: started, first_output (nếu có), finished.
+        """
+        started = timings.get("started")
+        if started is None:
+            return
+        finished = timings.get("finished", time.perf_counter())
+        first_output = min(timings.get("first_output", finished), finished)
+        self.add("jvm_startup", started, first_output)
+        self.add("execution", first_output, finished)
+
+    def drain(self) -> list[dict]:
+        """Lấy và xóa các span đã ghi (worker của batch_check.py gửi span về tiến trình chính)."""
+        with self._lock:
+            spans, self.spans = self.spans, []
+        return spans
+
+    def extend(self, spans: list[dict]) -> None:
+        with self._lock:
+            self.spans.extend(spans)
+
+    def summary(self) -> dict[str, dict]:
+        """Thống kê theo phase: số span, tổng, trung bình, p50/p95/p99, max (giây)."""
+        durations: dict[str, list[float]] = {}
+        with self._lock:
+            for entry in self.spans:
+                durations.setdefault(entry["phase"], []).append(entry["duration"])
+        order = {phase: i for i, phase in enumerate(PHASES)}
+        result: dict[str, dict] = {}
+        for phase in sorted(durations, key=lambda p: (order.get(p, len(PHASES)), p)):
+            values = sorted(durations[phase])
+            result[phase] = {
+                "count": len(values),
+                "total": sum(values),
+                "mean": sum(values) / len(values),
+                "max": values[-1],
+                **{f"p{int(q * 100)}": quantile(values, q) for q in QUANTILES},
+            }
+        return result
+
+    def print_table(self) -> None:
+        summary = self.summary()
+        if not summary:
+            return
+        grand_total = sum(stats["total"] for stats in summary.values()) or 1.0
+        print(f"\n{'=' * 78}")
+        print("⏱️  PROFILE - THỜI GIAN THEO PHASE")
+        print(f"{'=' * 78}")
+        print(f"{'Phase':<16} {'Số lần':>7} {'Tổng (s)':>10} {'%':>6} {'TB (ms)':>9} {'p95 (ms)':>9} {'Max (ms)':>9}")
+        for phase, stats in summary.items():
+            print(
+                f"{phase:<16} {stats['count']:>7} {stats['total']:>10.3f} {stats['total'] / grand_total * 100:>5.1f}% "
+                f"{stats['mean'] * 1000:>9.1f} {stats['p95'] * 1000:>9.1f} {stats['max'] * 1000:>9.1f}"
+            )
+
+    def write_json(self, path: Path) -> None:
+        """Ghi toàn bộ span thô (kèm thống kê theo phase) ra file JSON."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda entry: entry["start"])
+        data = {"spans": spans, "summary": self.summary()}
+        _atomic_write(Path(path), json.dumps(data, indent=2, ensure_ascii=False) + "\n")
+
+    def write_prometheus(self, path: Path) -> None:
+        """Ghi thống kê theo định dạng text của Prometheus (cho textfile collector của node exporter)."""
+        name = f"{METRIC_PREFIX}_phase_duration_seconds"
+        lines = [
+            f"# HELP {name} Thời gian từng phase của lượt chấm gần nhất.",
+            f"# TYPE {name} summary",
+        ]
+        for phase, stats in self.summary().items():
+            for q in QUANTILES:
+                lines.append(f'{name}{{phase="{phase}",quantile="{q}"}} {stats[f"p{int(q * 100)}"]:.6f}')
+            lines.append(f'{name}_sum{{phase="{phase}"}} {stats["total"]:.6f}')
+            lines.append(f'{name}_count{{phase="{phase}"}} {stats["count"]}')
+        lines += [
+            f"# HELP {METRIC_PREFIX}_last_run_timestamp_seconds Thời điểm ghi profile của lượt chấm gần nhất.",
+            f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge",
+            f"{METRIC_PREFIX}_last_run_timestamp_seconds {time.time():.3f}",
+        ]
+        _atomic_write(Path(path), "\n".join(lines) + "\n")
+
+    def report(self, output_prefix: Path) -> None:
+        """In bảng tổng kết và ghi <prefix>.json (span thô) + <prefix>.prom (Prometheus)."""
+        self.print_table()
+        output_prefix = Path(output_prefix)
+        json_file = output_prefix.with_name(output_prefix.name + ".json")
+        prom_file = output_prefix.with_name(output_prefix.name + ".prom")
+        self.write_json(json_file)
+        self.write_prometheus(prom_file)
+        print(f"📄 Span: {json_file} | Prometheus: {prom_file}")
+
+
+def _atomic_write(path: Path, text: str) -> None:
+    # Node exporter có thể đọc file bất kỳ lúc nào - ghi file tạm rồi đổi tên
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    tmp_file.write_text(text, encoding="utf-8")
+    tmp_file.replace(path)
+
+
+PROFILER = Profiler()
+
+
+def span(phase: str, **attrs):
+    return PROFILER.span(phase, **attrs)
+
+
+def context(**attrs):
+    return PROFILER.context(**attrs)
@@ -0,0 +1,65 @@
+import sys
+import threading
+import time
+
+# Chế độ console của runner: full = in chi tiết từng test, quiet = chỉ in tổng kết (và test trượt),
+# progress = như quiet nhưng có thanh tiến độ
+CONSOLE_MODES = ("full", "quiet", "progress")
+
+# Khoảng thời gian tối thiểu giữa hai lần vẽ lại thanh tiến độ (giây)
+REDRAW_INTERVAL = 0.1
+BAR_WIDTH = 30
+
+
+class ProgressBar:
+    """Thanh tiến độ một dòng cho --progress: đã xong / tổng, số PASS / FAIL, tốc độ và thời gian còn lại.
+
+    Ghi vào sys.stdout tại thời điểm tạo (output từng test đã bị tắt). Console không phải terminal thì in
+    một dòng mỗi 10% thay vì vẽ lại bằng \\r.
+    """
+
+    def __init__(self, total: int, label: str = "test") -> None:
+        self.total = max(total, 0)
+        self.label = label
+        self.done = 0
+        self.passed = 0
+        self.stream = sys.stdout
+        self.interactive = hasattr(self.stream, "isatty") and self.stream.isatty()
+        self._started = time.perf_counter()
+        self._last_draw = 0.0
+        self._last_decile = -1
+        self._lock = threading.Lock()
+
+    def advance(self, passed: bool) -> None:
+        with self._lock:
+            self.done += 1
+            self.passed += bool(passed)
+            now = time.perf_counter()
+            if self.interactive:
+                if now - self._last_draw >= REDRAW_INTERVAL or self.done == self.total:
+                    self._last_draw = now
+                    self.stream.write("\r" + self._line(now))
+                    self.stream.flush()
+            else:
+                decile = self.done * 10 // self.total if self.total else 10
+                if decile != self._last_decile:
+                    self._last_decile = decile
+                    self.stream.write(self._line(now) + "\n")
+
+    def _line(self, now: float) -> str:
+        elapsed = now - self._started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        fraction = self.done / self.total if self.total else 1.0
+        filled = int(BAR_WIDTH * min(fraction, 1.0))
+        eta = (self.total - self.done) / rate if rate > 0 else 0.0
+        return (
+            f"[{'█' * filled}{'░' * (BAR_WIDTH - filled)}] {self.done}/{self.total} {self.label} "
+            f"| ✓ {self.passed} ✗ {self.done - self.passed} | {rate:.1f}/s | còn ~{eta:.0f}s"
+        )
+
+    def close(self) -> None:
+        """Kết thúc dòng tiến độ (terminal) để phần in tiếp theo bắt đầu ở dòng mới."""
+        with self._lock:
+            if self.interactive and self.done:
+                self.stream.write("\r" + self._line(time.perf_counter()) + "\n")
+                self.stream.flush()
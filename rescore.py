@@ -0,0 +1,180 @@
+import argparse
+import time
+from pathlib import Path
+
+from batch_check import discover_submissions, write_gradebook
+from check import JavaTestRunner
+from java_exec import (
+    VERDICT_EARLY_MISMATCH,
+    VERDICT_TIMEOUT,
+    VERDICT_TLE,
+    RunMessage,
+    apply_limits,
+    extract_output,
+    run_verdict,
+    test_timeout,
+)
+from output_store import OutputStore, comparison_key, hash_files
+from pe_check import PETestRunner
+from test_suite import load_tc_suite
+
+
+def rescore_case(
+    runner: JavaTestRunner | PETestRunner, record: dict | None, tc: dict, timeout: float, single_section: bool
+) -> tuple[bool, float, str] | None:
+    """Chấm lại một test từ output đã lưu; trả về (passed, earned, verdict) hoặc None nếu phải chạy lại."""
+    if record is None or record.get("memory_limit") != tc["memory_limit_mb"]:
+        return None  # chưa chạy, hoặc đã chạy với MEMORY_LIMIT khác
+    if "verdict" not in record:
+        return None  # lưu bởi phiên bản cũ, không có verdict của runner
+    stderr = RunMessage(record["stderr"], record["verdict"]) if record["verdict"] else record["stderr"]
+    stderr, returncode = apply_limits(tc, stderr, record["returncode"])
+    if returncode != 0:
+        verdict = run_verdict(stderr, returncode) or "ERROR"
+        if verdict in (VERDICT_TIMEOUT, VERDICT_TLE) and record["timeout"] < timeout:
+            return None  # giới hạn thời gian đã được nới - chưa biết chương trình có chạy xong không
+        if verdict == VERDICT_EARLY_MISMATCH and record["mismatch_key"] != comparison_key(
+            tc["expected_normalized"], tc["remove_spaces"], tc["case_sensitive"]
+        ):
+            return None  # bị dừng sớm theo expected / cách so sánh cũ - output đã lưu không đầy đủ
+        return False, 0.0, verdict
+    if record["elapsed"] > timeout:
+        # giới hạn thời gian đã bị siết lại
+        return False, 0.0, VERDICT_TLE if tc["time_limit_ms"] else VERDICT_TIMEOUT
+
+    passed = runner.compare_outputs(
+        extract_output(record["stdout"], single_section),
+        tc["expected_output"],
+        tc["remove_spaces"],
+        tc["case_sensitive"],
+        normalized_expected=tc["expected_normalized"],
+    )
+    return passed, tc["mark"] if passed else 0.0, "PASS" if passed else "FAIL"
+
+
+def _new_row(submission: Path) -> dict:
+    return {"student": submission.name, "status": "OK", "earned": 0.0, "total": 0.0, "scores": {}, "details": []}
+
+
+def _finish_row(row: dict, missing: int) -> dict:
+    if missing:
+        row["status"] = f"MISSING {missing}"
+    return row
+
+
+def rescore_given(submission: Path, tests: Path | None, store: OutputStore) -> dict:
+    """Chấm lại một bài định dạng given/src từ output đã lưu (không biên dịch, không chạy Java)."""
+    row = _new_row(submission)
+    java_dir = submission / "given" if (submission / "given").is_dir() else submission
+    test_dir = tests or submission / "TestCases"
+    runner = JavaTestRunner(java_dir, test_dir, record_outputs=False)
+    java_files = list(runner.src_dir.glob("*.java"))
+    if not java_files:
+        row["status"] = "NOT_GRADED"
+        return row
+    submission_hash = hash_files(runner.src_dir, java_files)
+
+    missing = 0
+    for tc_name, tc in load_tc_suite(test_dir).items():
+        timeout = test_timeout(tc, runner.time_limits, tc_name)
+        result = rescore_case(runner, store.load(submission_hash, tc["input"]), tc, timeout, single_section=True)
+        row["total"] += tc["mark"]
+        if result is None:
+            missing += 1
+            row["details"].append((tc_name, 0.0, tc["mark"], "MISSING"))
+            continue
+        _passed, earned, verdict = result
+        row["scores"][tc_name] = earned
+        row["earned"] += earned
+        row["details"].append((tc_name, earned, tc["mark"], verdict))
+    return _finish_row(row, missing)
+
+
+def rescore_pe(submission: Path, tests: Path | None, store: OutputStore) -> dict:
+    """Chấm lại một bài định dạng PE (1..4/run/*.jar) từ output đã lưu."""
+    row = _new_row(submission)
+    runner = PETestRunner(submission, test_file=tests, record_outputs=False)
+    missing = 0
+    for q_num, test_cases in sorted(runner.parse_tests().items()):
+        jar_file = runner.find_jar_file(submission / str(q_num))
+        if not jar_file:
+            continue  # giống khi chấm: câu không có .jar thì bỏ qua
+        submission_hash = runner.jar_hash(jar_file)
+        earned_q = 0.0
+        for tc in test_cases:
+            key = f"Q{q_num}/TC{tc['tc_num']}"
+            timeout = test_timeout(tc, runner.time_limits, key)
+            result = rescore_case(runner, store.load(submission_hash, tc["input"]), tc, timeout, single_section=False)
+            row["total"] += tc["mark"]
+            if result is None:
+                missing += 1
+                row["details"].append((key, 0.0, tc["mark"], "MISSING"))
+                continue
+            _passed, earned, verdict = result
+            earned_q += earned
+            row["details"].append((key, earned, tc["mark"], verdict))
+        row["scores"][f"Q{q_num}"] = earned_q
+        row["earned"] += earned_q
+    return _finish_row(row, missing)
+
+
+def print_row(row: dict) -> None:
+    """In kết quả chấm lại của một bài."""
+    print("=" * 60)
+    print(f"CHẤM LẠI: {row['student']}")
+    print("=" * 60)
+    for name, earned, max_mark, verdict in row["details"]:
+        status = "✓ PASS" if verdict == "PASS" else "✗ FAIL"
+        if verdict not in ("PASS", "FAIL", "ERROR"):
+            status += f" ({verdict})"
+        print(f"{name}: {status} - {earned}/{max_mark} điểm")
+    print(f"\nTổng điểm: {row['earned']}/{row['total']}")
+    if row["status"] != "OK":
+        print(f"⚠️  {row['status']}: chưa có output đã lưu cho các test trên - cần chạy lại check.py / batch_check.py")
+    print("=" * 60)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Chấm lại từ output đã lưu (sau khi sửa MARK / REMOVE_SPACES / CASE_SENSITIVE / expected)"
+    )
+    parser.add_argument("path", type=Path, help="Một bài làm (thư mục chứa given/ hoặc 1..4/) hoặc thư mục cả lớp")
+    parser.add_argument("--mode", choices=["given", "pe"], default="given")
+    parser.add_argument(
+        "--tests",
+        type=Path,
+        help="Test dùng chung: thư mục TestCases/ (given) hoặc file tests.txt (pe). Mặc định lấy trong từng bài",
+    )
+    parser.add_argument("--output", type=Path, default=Path("gradebook.csv"), help="File bảng điểm CSV (cả lớp)")
+    args = parser.parse_args()
+
+    path = args.path.resolve()
+    tests = args.tests.resolve() if args.tests else None
+    store = OutputStore()
+    rescore = rescore_pe if args.mode == "pe" else rescore_given
+
+    if path in discover_submissions(path.parent, args.mode):
+        print_row(rescore(path, tests, store))
+        return
+
+    submissions = discover_submissions(path, args.mode) if path.is_dir() else []
+    if not submissions:
+        print(f"⚠️  Không tìm thấy bài làm nào trong {path}")
+        return
+
+    start = time.perf_counter()
+    rows: list[dict] = []
+    for submission in submissions:
+        row = rescore(submission, tests, store)
+        rows.append(row)
+        print(f"{row['student']}: {row['earned']:.1f}/{row['total']:.1f} {row['status']}")
+
+    write_gradebook(rows, args.output)
+    missing = sum(1 for row in rows if row["status"].startswith("MISSING"))
+    print(f"📊 Đã chấm lại {len(rows)} bài trong {time.perf_counter() - start:.2f}s, ghi bảng điểm: {args.output}")
+    if missing:
+        print(f"⚠️  {missing} bài thiếu output đã lưu - chạy lại batch_check.py cho các bài này")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+def cpu_seconds(usage: dict | None) -> float | None:
+    """CPU time (user + system, giây) của một lần chạy; None nếu không đo được (Windows, warm JVM)."""
+    if not usage or "user" not in usage:
+        return None
+    return usage["user"] + usage["system"]
+
+
+def peak_rss_mb(usage: dict | None) -> float | None:
+    return usage.get("peak_rss_mb") if usage else None
+
+
+def format_usage(usage: dict | None) -> str:
+    """Một dòng mô tả tài nguyên của lần chạy: thời gian, CPU (user + sys), peak RSS."""
+    if not usage:
+        return "không có số liệu"
+    parts = [f"{usage['wall']:.2f}s"] if "wall" in usage else []
+    if "user" in usage:
+        parts.append(f"CPU {cpu_seconds(usage):.2f}s (user {usage['user']:.2f}s + sys {usage['system']:.2f}s)")
+    if usage.get("peak_rss_mb") is not None:
+        parts.append(f"RSS {usage['peak_rss_mb']:.1f} MB")
+    return " | ".join(parts) or "không có số liệu"
+
+
+def format_limits(tc: dict) -> str:
+    """Giới hạn khai báo trong test case: TIME_LIMIT (ms) / MEMORY_LIMIT (MB)."""
+    parts = []
+    if tc["time_limit_ms"]:
+        parts.append(f"thời gian {tc['time_limit_ms']} ms")
+    if tc["memory_limit_mb"]:
+        parts.append(f"bộ nhớ {tc['memory_limit_mb']} MB")
+    return " | ".join(parts) or "không giới hạn"
+
+
+def quantile(ordered: list[float], q: float) -> float:
+    """Quantile q (0..1) của danh sách đã sắp xếp, nội suy tuyến tính giữa hai phần tử gần nhất (như numpy)."""
+    pos = (len(ordered) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def distribution(values: list[float | None]) -> dict | None:
+    """min / p50 / p95 / max của các giá trị đo được (bỏ qua None); None nếu không có giá trị nào."""
+    ordered = sorted(v for v in values if v is not None)
+    if not ordered:
+        return None
+    return {"min": ordered[0], "p50": quantile(ordered, 0.5), "p95": quantile(ordered, 0.95), "max": ordered[-1]}
+
+
+def format_distribution(label: str, values: list[float | None], unit: str) -> str | None:
+    stats = distribution(values)
+    if stats is None:
+        return None
+    return (
+        f"{label}: min {stats['min']:.2f}{unit} | p50 {stats['p50']:.2f}{unit} | "
+        f"p95 {stats['p95']:.2f}{unit} | max {stats['max']:.2f}{unit}"
+    )
+
+
+def usage_summary(usages: list[dict | None]) -> list[str]:
+    """Các dòng phân bố thời gian chạy / CPU / peak RSS của một nhóm lần chạy (một câu, một bài, cả lớp)."""
+    lines = [
+        format_distribution("Thời gian", [u.get("wall") if u else None for u in usages], "s"),
+        format_distribution("CPU", [cpu_seconds(u) for u in usages], "s"),
+        format_distribution("Peak RSS", [peak_rss_mb(u) for u in usages], " MB"),
+    ]
+    return [line for line in lines if line]
@@ -0,0 +1,121 @@
+import csv
+import io
+import json
+import os
+import threading
+from pathlib import Path
+
+from resource_usage import cpu_seconds, peak_rss_mb
+
+# Số ký tự stdout / stderr tối đa ghi vào mỗi dòng JSONL
+DEFAULT_OUTPUT_CHARS = 1000
+
+CSV_COLUMNS = [
+    "submission",
+    "test",
+    "verdict",
+    "passed",
+    "earned",
+    "max_mark",
+    "wall_seconds",
+    "cpu_seconds",
+    "peak_rss_mb",
+    "reused",
+]
+
+
+def _truncate(text: str | None, limit: int) -> tuple[str | None, bool]:
+    if text is None or len(text) <= limit:
+        return text, False
+    return text[:limit], True
+
+
+class ResultSink:
+    """Ghi kết quả từng test ngay khi chấm xong: JSONL (đầy đủ, kèm output đã cắt ngắn) và / hoặc CSV (bảng điểm
+    từng test).
+
+    Mỗi dòng được ghi bằng một lệnh write() trên file mở ở chế độ append, nên nhiều tiến trình (worker của
+    batch_check.py) ghi chung một file mà không chen lẫn dòng. Gọi prepare() một lần ở tiến trình chính trước.
+    shared_with: các bài giống hệt submission (batch_check.py chỉ chấm một lần) - mỗi test được ghi thêm một
+    dòng cho từng bài đó, JSONL kèm "shared_from".
+    """
+
+    def __init__(
+        self,
+        jsonl: Path | None = None,
+        csv_file: Path | None = None,
+        submission: str = "",
+        output_chars: int = DEFAULT_OUTPUT_CHARS,
+        shared_with: list[str] | None = None,
+    ) -> None:
+        self.submission = submission
+        self.shared_with = list(shared_with or [])
+        self.output_chars = output_chars
+        self._files = {
+            kind: os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            for kind, path in (("jsonl", jsonl), ("csv", csv_file))
+            if path is not None
+        }
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def prepare(jsonl: Path | None = None, csv_file: Path | None = None, append: bool = False) -> None:
+        """Tạo file kết quả (xóa nội dung cũ trừ khi append, vd. --resume) và ghi dòng tiêu đề CSV."""
+        for path in filter(None, (jsonl, csv_file)):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if not append:
+                path.write_bytes(b"")
+        if csv_file is not None and (not csv_file.exists() or csv_file.stat().st_size == 0):
+            csv_file.write_text(",".join(CSV_COLUMNS) + "\n", encoding="utf-8-sig")
+
+    def record(
+        self,
+        test: str,
+        verdict: str,
+        passed: bool,
+        earned: float,
+        max_mark: float,
+        usage: dict | None = None,
+        stdout: str | None = None,
+        stderr: str | None = None,
+        reused: bool = False,
+    ) -> None:
+        """Ghi một test; reused: kết quả lấy lại từ results database / journal, không chạy Java lần này."""
+        entry = {
+            "submission": self.submission,
+            "test": test,
+            "verdict": verdict,
+            "passed": bool(passed),
+            "earned": earned,
+            "max_mark": max_mark,
+            "wall_seconds": (usage or {}).get("wall"),
+            "cpu_seconds": cpu_seconds(usage),
+            "peak_rss_mb": peak_rss_mb(usage),
+            "reused": reused,
+        }
+        lines = {kind: "" for kind in self._files}
+        outputs = {}
+        for key, text in (("stdout", stdout), ("stderr", stderr)):
+            outputs[key], truncated = _truncate(text, self.output_chars)
+            if truncated:
+                outputs[f"{key}_truncated"] = True
+        for name in [self.submission, *self.shared_with]:
+            entry["submission"] = name
+            if "jsonl" in self._files:
+                shared = {"shared_from": self.submission} if name != self.submission else {}
+                lines["jsonl"] += json.dumps({**entry, **outputs, **shared}, ensure_ascii=False) + "\n"
+            if "csv" in self._files:
+                row = io.StringIO()
+                csv.writer(row, lineterminator="\n").writerow(
+                    ["" if entry[c] is None else entry[c] for c in CSV_COLUMNS]
+                )
+                lines["csv"] += row.getvalue()
+        with self._lock:
+            for kind, line in lines.items():
+                os.write(self._files[kind], line.encode("utf-8"))
+
+    def close(self) -> None:
+        with self._lock:
+            for fd in self._files.values():
+                os.close(fd)
+            self._files = {}
@@ -0,0 +1,130 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from jvm_harness import CACHE_DIR
+from output_store import hash_text
+
+RESULTS_DB = CACHE_DIR / "results.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    submission_hash TEXT NOT NULL,
+    test_hash TEXT NOT NULL,
+    test_name TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    earned REAL NOT NULL,
+    max_mark REAL NOT NULL,
+    verdict TEXT NOT NULL,
+    graded_at REAL NOT NULL,
+    wall_seconds REAL,
+    cpu_user REAL,
+    cpu_system REAL,
+    peak_rss_mb REAL,
+    PRIMARY KEY (submission_hash, test_hash)
+)
+"""
+
+# Cột thêm sau phiên bản đầu của bảng: database cũ được bổ sung bằng ALTER TABLE
+_USAGE_COLUMNS = {"wall_seconds": "wall", "cpu_user": "user", "cpu_system": "system", "peak_rss_mb": "peak_rss_mb"}
+
+
+def test_case_hash(tc: dict, timeout: float, max_output_bytes: int) -> str:
+    """Hash mọi thứ quyết định kết quả của một test: input, expected đã chuẩn hóa, cấu hình, điểm, giới hạn."""
+    parts = [
+        tc["input"],
+        tc["expected_normalized"],
+        str(int(tc["remove_spaces"])),
+        str(int(tc["case_sensitive"])),
+        repr(float(tc["mark"])),
+        repr(float(timeout)),
+        str(max_output_bytes),
+    ]
+    # TIME_LIMIT / MEMORY_LIMIT chỉ thêm khi có - hash của test không khai báo giới hạn giữ nguyên như cũ
+    if tc["time_limit_ms"]:
+        parts.append(f"time={tc['time_limit_ms']}")
+    if tc["memory_limit_mb"]:
+        parts.append(f"mem={tc['memory_limit_mb']}")
+    return hash_text("\0".join(parts))
+
+
+class ResultsDB:
+    """Kết quả đã chấm theo (hash bài làm, hash test) - chấm lại chỉ chạy các cặp đã thay đổi."""
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = Path(path) if path else RESULTS_DB
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Mỗi thread một connection; WAL + busy timeout để nhiều worker của batch_check.py ghi cùng lúc
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+            for column in _USAGE_COLUMNS:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE results ADD COLUMN {column} REAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, submission_hash: str, test_hash: str) -> dict | None:
+        """Kết quả đã lưu của cặp (bài làm, test) kèm tài nguyên đã dùng ("usage"); None nếu chưa chấm."""
+        try:
+            row = (
+                self._connection()
+                .execute(
+                    f"SELECT passed, earned, max_mark, verdict, {', '.join(_USAGE_COLUMNS)} FROM results "
+                    "WHERE submission_hash = ? AND test_hash = ?",
+                    (submission_hash, test_hash),
+                )
+                .fetchone()
+            )
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        usage = {key: value for key, value in zip(_USAGE_COLUMNS.values(), row[4:]) if value is not None}
+        return {
+            "passed": bool(row[0]),
+            "earned": row[1],
+            "max_mark": row[2],
+            "verdict": row[3],
+            "usage": usage or None,
+        }
+
+    def put(
+        self,
+        submission_hash: str,
+        test_hash: str,
+        test_name: str,
+        passed: bool,
+        earned: float,
+        max_mark: float,
+        verdict: str,
+        usage: dict | None = None,
+    ) -> None:
+        """Ghi (hoặc thay) kết quả của một cặp (bài làm, test); lỗi database không làm hỏng lượt chấm."""
+        usage = usage or {}
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        submission_hash,
+                        test_hash,
+                        test_name,
+                        int(passed),
+                        earned,
+                        max_mark,
+                        verdict,
+                        time.time(),
+                        *(usage.get(key) for key in _USAGE_COLUMNS.values()),
+                    ),
+                )
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,325 @@
+import argparse
+import importlib.util
+import inspect
+import random
+import sys
+from pathlib import Path
+from typing import Callable
+
+from check import JavaTestRunner
+from java_exec import OutputWatcher, find_divergence, format_divergence, run_verdict
+from ordered_pool import run_ordered
+from pe_check import PETestRunner
+from progress import ProgressBar
+from test_suite import load_tc_suite, load_tests_file, normalize_output
+
+# Số input mỗi JVM chạy trong một đợt (một đợt = BATCH_SIZE x jobs input); JVM được khởi động lại sau mỗi đợt,
+# và điều kiện dừng (--max-failures) được kiểm tra giữa hai đợt
+BATCH_SIZE = 200
+DEFAULT_COUNT = 1000
+# Thời gian tối đa mỗi input (giây) - input sinh ngẫu nhiên thường nhỏ hơn test chấm điểm nhiều
+DEFAULT_INPUT_TIMEOUT = 2.0
+# Số ký tự tối đa khi in input / output của phản ví dụ
+DISPLAY_CHARS = 2000
+
+
+class Program:
+    """Lời giải mẫu hoặc bài làm đã biên dịch; warm_jvm: chạy liên tiếp mọi input trong cùng một JVM harness
+    (mỗi thread một JVM, static được reset giữa các input) thay vì mỗi input một lần khởi động JVM."""
+
+    def __init__(self, runner: JavaTestRunner | PETestRunner, jar_file: Path | None = None) -> None:
+        self.runner = runner
+        self.jar_file = jar_file
+
+    @classmethod
+    def given(cls, java_dir: Path, test_dir: Path, warm_jvm: bool) -> "Program | None":
+        """Bài định dạng given/src (biên dịch qua compile cache); None nếu biên dịch lỗi."""
+        runner = JavaTestRunner(java_dir, test_dir, warm_jvm=warm_jvm, record_outputs=False, incremental=False)
+        if not runner.compile_java():
+            return None
+        runner.main_class = runner.find_main_class()
+        return cls(runner)
+
+    @classmethod
+    def pe(cls, base_dir: Path, q_num: int, test_file: Path, warm_jvm: bool) -> "Program | None":
+        """Câu q_num của bài PE (q_num/run/*.jar); None nếu không có file .jar."""
+        runner = PETestRunner(base_dir, warm_jvm=warm_jvm, test_file=test_file, record_outputs=False)
+        jar_file = runner.find_jar_file(base_dir / str(q_num))
+        if jar_file is None:
+            print(f"⚠️  Không tìm thấy file .jar trong {base_dir / str(q_num) / 'run'}")
+            return None
+        print(f"📦 Sử dụng: {jar_file}")
+        return cls(runner, jar_file)
+
+    def run(self, input_data: str, watcher: OutputWatcher | None = None, timeout: float = DEFAULT_INPUT_TIMEOUT):
+        """(stdout sau "OUTPUT:", stderr, returncode) như khi chấm."""
+        if self.jar_file is None:
+            return self.runner.run_java_with_input(input_data, watcher, timeout)
+        return self.runner.run_jar_with_input(self.jar_file, input_data, watcher, timeout)
+
+    def close(self) -> None:
+        self.runner.close_harnesses()
+
+
+def load_generator(path: Path) -> Callable[[random.Random, int], str]:
+    """Nạp generator: file Python định nghĩa generate(rng) hoặc generate(rng, size) trả về một input (str)."""
+    spec = importlib.util.spec_from_file_location(f"stress_generator_{path.stem}", path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"không nạp được {path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    generate = getattr(module, "generate", None)
+    if not callable(generate):
+        raise ImportError(f"{path} không có hàm generate(rng)")
+    if len(inspect.signature(generate).parameters) >= 2:
+        return generate
+    return lambda rng, size: generate(rng)
+
+
+def make_input(
+    generate: Callable[[random.Random, int], str], seed: int, index: int, count: int, max_size: int
+) -> str:
+    """Input thứ index: cùng seed luôn sinh lại đúng input đó; size tăng dần từ 1 đến max_size trong lượt chạy."""
+    rng = random.Random(f"{seed}/{index}")
+    size = 1 + (max_size - 1) * index // max(count - 1, 1)
+    text = generate(rng, size)
+    return text if text.endswith("\n") else text + "\n"
+
+
+def stress(
+    reference: Program,
+    student: Program,
+    generate: Callable[[random.Random, int], str],
+    rules: tuple[bool, bool],
+    count: int = DEFAULT_COUNT,
+    seed: int = 0,
+    max_size: int = 100,
+    jobs: int = 1,
+    timeout: float = DEFAULT_INPUT_TIMEOUT,
+    max_failures: int = 0,
+) -> dict:
+    """Chạy lời giải mẫu và bài làm trên count input sinh ngẫu nhiên, so sánh như khi chấm (rules =
+    (REMOVE_SPACES, CASE_SENSITIVE)). Trả về số input đã chạy / không hợp lệ và các input bài làm sai.
+
+    Input làm lời giải mẫu lỗi (exit code khác 0, timeout) bị coi là không hợp lệ và bỏ qua.
+    max_failures > 0: dừng sau đợt có đủ số input sai này.
+    """
+    remove_spaces, case_sensitive = rules
+
+    def check_one(item: tuple[int, str]) -> dict:
+        index, input_data = item
+        expected, stderr, returncode = reference.run(input_data, timeout=timeout)
+        if returncode != 0:
+            return {"index": index, "verdict": "INVALID"}
+        expected_normalized = normalize_output(expected, remove_spaces, case_sensitive)
+        watcher = OutputWatcher(expected_normalized, remove_spaces, case_sensitive)
+        actual, stderr, returncode = student.run(input_data, watcher, timeout)
+        if returncode != 0:
+            verdict = run_verdict(stderr, returncode) or "ERROR"
+            detail = stderr.strip()[:200]
+        else:
+            divergence = find_divergence(actual, expected_normalized, remove_spaces, case_sensitive)
+            if divergence is None:
+                return {"index": index, "verdict": "PASS"}
+            verdict, detail = "FAIL", format_divergence(divergence)
+        return {
+            "index": index,
+            "verdict": verdict,
+            "detail": detail,
+            "input": input_data,
+            "expected": expected,
+            "actual": actual,
+        }
+
+    summary: dict = {"runs": 0, "invalid": 0, "failures": []}
+    progress = ProgressBar(count, label="input")
+    batch_size = BATCH_SIZE * jobs
+    for start in range(0, count, batch_size):
+        batch = [
+            (index, make_input(generate, seed, index, count, max_size))
+            for index in range(start, min(start + batch_size, count))
+        ]
+        for result in run_ordered(check_one, batch, jobs):
+            summary["runs"] += 1
+            if result["verdict"] == "INVALID":
+                summary["invalid"] += 1
+            elif result["verdict"] != "PASS":
+                summary["failures"].append(result)
+            progress.advance(result["verdict"] in ("PASS", "INVALID"))
+        # Mỗi đợt chạy trên thread mới (harness theo thread): tắt JVM của đợt vừa xong
+        reference.close()
+        student.close()
+        if max_failures and len(summary["failures"]) >= max_failures:
+            break
+    progress.close()
+    return summary
+
+
+def smallest_failure(failures: list[dict]) -> dict | None:
+    """Phản ví dụ nhỏ nhất: ít dòng input nhất, rồi ngắn nhất, rồi sinh ra sớm nhất."""
+    return min(failures, key=lambda f: (f["input"].count("\n"), len(f["input"]), f["index"]), default=None)
+
+
+def _display(text: str) -> str:
+    if len(text) <= DISPLAY_CHARS:
+        return text
+    return text[:DISPLAY_CHARS] + f"\n... (còn {len(text) - DISPLAY_CHARS} ký tự)"
+
+
+def write_test_case(path: Path, failure: dict, rules: tuple[bool, bool], mark: float = 0.0) -> None:
+    """Ghi phản ví dụ thành file test định dạng tc*.txt (expected = output của lời giải mẫu)."""
+    remove_spaces, case_sensitive = rules
+    lines = [
+        "INPUT:",
+        failure["input"].rstrip("\n"),
+        "OUTPUT:",
+        failure["expected"].strip("\n"),
+        "REMOVE_SPACES:",
+        "YES" if remove_spaces else "NO",
+        "CASE_SENSITIVE:",
+        "YES" if case_sensitive else "NO",
+        "MARK:",
+        str(mark),
+    ]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Stress test: so sánh bài làm với lời giải mẫu trên hàng nghìn input sinh ngẫu nhiên"
+    )
+    parser.add_argument("reference", type=Path, help="Lời giải mẫu: thư mục given/ hoặc thư mục PE chứa 1..4/")
+    parser.add_argument("--mode", choices=["given", "pe"], default="given")
+    parser.add_argument(
+        "--submission",
+        type=Path,
+        default=Path("."),
+        help="Bài làm: thư mục chứa given/ hoặc 1..4/ (mặc định thư mục hiện tại)",
+    )
+    parser.add_argument(
+        "--question", type=int, choices=range(1, 5), help="Câu cần stress test (bắt buộc với --mode pe)"
+    )
+    parser.add_argument(
+        "--tests",
+        type=Path,
+        help="Thư mục TestCases/ (given) hoặc file tests.txt (pe) để lấy REMOVE_SPACES / CASE_SENSITIVE; "
+        "mặc định lấy trong bài làm",
+    )
+    parser.add_argument(
+        "--generator",
+        type=Path,
+        help="File Python có hàm generate(rng[, size]) trả về một input; mặc định TestCases/generator.py "
+        "(given) hoặc generator_q<N>.py cạnh tests.txt (pe)",
+    )
+    parser.add_argument("--count", type=int, default=DEFAULT_COUNT, help=f"Số input (mặc định {DEFAULT_COUNT})")
+    parser.add_argument("--seed", type=int, default=0, help="Seed - cùng seed sinh lại đúng các input (mặc định 0)")
+    parser.add_argument(
+        "--max-size", type=int, default=100, help="size lớn nhất truyền cho generate(rng, size), tăng dần từ 1"
+    )
+    parser.add_argument("--jobs", type=int, default=1, help="Số input chạy đồng thời (mỗi thread một cặp JVM)")
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_INPUT_TIMEOUT,
+        help=f"Thời gian tối đa mỗi input (giây, mặc định {DEFAULT_INPUT_TIMEOUT:g})",
+    )
+    parser.add_argument(
+        "--max-failures", type=int, default=0, help="Dừng sớm khi đã có đủ số input sai này (mặc định 0 = chạy hết)"
+    )
+    parser.add_argument("--remove-spaces", action="store_const", const=True, help="So sánh bỏ khoảng trắng")
+    parser.add_argument(
+        "--case-insensitive",
+        dest="case_sensitive",
+        action="store_const",
+        const=False,
+        help="So sánh không phân biệt hoa thường",
+    )
+    parser.add_argument(
+        "--cold-jvm",
+        action="store_true",
+        help="Mỗi input một JVM mới (chậm; chỉ dùng khi bài không chạy được trong harness)",
+    )
+    parser.add_argument("--save", type=Path, help="Ghi phản ví dụ nhỏ nhất thành file test (định dạng tc*.txt)")
+    args = parser.parse_args()
+    if args.mode == "pe" and args.question is None:
+        parser.error("--mode pe cần --question")
+
+    reference_dir = args.reference.resolve()
+    submission = args.submission.resolve()
+    warm_jvm = not args.cold_jvm
+    if args.mode == "pe":
+        test_file = (args.tests or submission / "tests.txt").resolve()
+        generator = args.generator or test_file.parent / f"generator_q{args.question}.py"
+        question_tests = load_tests_file(test_file).get(args.question, []) if test_file.is_file() else []
+        tc = question_tests[0] if question_tests else None
+        print(f"🔷 Question {args.question} - lời giải mẫu:")
+        reference = Program.pe(reference_dir, args.question, test_file, warm_jvm)
+        print("🔷 Bài làm:")
+        student = Program.pe(submission, args.question, test_file, warm_jvm) if reference else None
+    else:
+        java_dir = submission / "given" if (submission / "given").is_dir() else submission
+        test_dir = (args.tests or submission / "TestCases").resolve()
+        generator = args.generator or test_dir / "generator.py"
+        tc = next(iter(load_tc_suite(test_dir).values()), None) if test_dir.is_dir() else None
+        print("=== Lời giải mẫu ===")
+        reference = Program.given(reference_dir, test_dir, warm_jvm)
+        print("=== Bài làm ===")
+        student = Program.given(java_dir, test_dir, warm_jvm) if reference else None
+    if reference is None or student is None:
+        print("❌ Không chạy được lời giải mẫu / bài làm - dừng stress test")
+        return
+
+    # Quy tắc so sánh: mặc định như test case đầu tiên của câu (hoặc bài), ghi đè bằng tham số
+    rules = (
+        args.remove_spaces if args.remove_spaces is not None else bool(tc and tc["remove_spaces"]),
+        args.case_sensitive if args.case_sensitive is not None else (tc["case_sensitive"] if tc else True),
+    )
+    try:
+        generate = load_generator(generator.resolve())
+    except (OSError, ImportError, SyntaxError) as exc:
+        print(f"❌ Không nạp được generator {generator}: {exc}")
+        return
+
+    print(f"\n🎲 Stress test {args.count} input (seed {args.seed}, generator {generator.name})")
+    try:
+        summary = stress(
+            reference,
+            student,
+            generate,
+            rules,
+            count=args.count,
+            seed=args.seed,
+            max_size=args.max_size,
+            jobs=max(1, args.jobs),
+            timeout=args.timeout,
+            max_failures=args.max_failures,
+        )
+    except KeyboardInterrupt:
+        print("\n⏸️  Đã dừng")
+        return
+    finally:
+        reference.close()
+        student.close()
+
+    failures = summary["failures"]
+    print(
+        f"\n✓ Đã chạy {summary['runs']} input: {len(failures)} sai, "
+        f"{summary['invalid']} không hợp lệ (lời giải mẫu lỗi)"
+    )
+    failure = smallest_failure(failures)
+    if failure is None:
+        print("✅ Bài làm khớp lời giải mẫu trên mọi input")
+        return
+    print(f"❌ Phản ví dụ nhỏ nhất: input #{failure['index']} (--seed {args.seed}) - {failure['verdict']}")
+    print(f"📥 Input:\n{_display(failure['input'].rstrip())}")
+    print(f"📋 Expected (lời giải mẫu):\n{_display(failure['expected'])}")
+    print(f"📤 Actual:\n{_display(failure['actual'])}")
+    print(f"🔎 {failure['detail']}")
+    if args.save:
+        write_test_case(args.save, failure, rules)
+        print(f"💾 Đã ghi phản ví dụ: {args.save}")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
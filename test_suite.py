@@ -0,0 +1,212 @@
+import hashlib
+import pickle
+import re
+import threading
+from pathlib import Path
+
+from jvm_harness import CACHE_DIR
+
+# Tăng khi đổi cách parse / chuẩn hóa để bỏ cache cũ
+SUITE_FORMAT_VERSION = 2
+
+SUITE_CACHE_DIR = CACHE_DIR / "suites"
+
+INPUT_FIELD = "INPUT"
+OUTPUT_FIELD = "OUTPUT"
+CONFIG_FIELDS = ("REMOVE_SPACES", "CASE_SENSITIVE", "MARK", "TIME_LIMIT", "MEMORY_LIMIT")
+
+_QUESTION_HEADER = re.compile(r"===\s*Q(\d+)\s*===")
+_TC_HEADER = re.compile(r"---\s*TC(\d+)\s*---")
+
+_memory_cache: dict[str, tuple[tuple, object]] = {}
+_memory_lock = threading.Lock()
+
+
+def normalize_output(text: str, remove_spaces: bool = False, case_sensitive: bool = True) -> str:
+    """Chuẩn hóa output theo config so sánh (dùng chung cho check.py và pe_check.py)."""
+    result = text.strip()
+    if remove_spaces:
+        result = re.sub(r"\s+", "", result)
+    if not case_sensitive:
+        result = result.lower()
+    return result
+
+
+def _field_label(line: str, allowed: tuple[str, ...]) -> str | None:
+    """Trả về tên field nếu dòng là nhãn "FIELD:" thuộc allowed."""
+    stripped = line.strip()
+    if stripped.endswith(":") and stripped[:-1] in allowed:
+        return stripped[:-1]
+    return None
+
+
+def _build_case(fields: dict[str, list[str]]) -> dict:
+    """Tạo test case từ các field đã gom; chuẩn hóa sẵn expected output."""
+
+    def value(name: str) -> str:
+        return "\n".join(fields.get(name, [])).strip()
+
+    def flag(name: str, default: bool) -> bool:
+        text = value(name).split()
+        return text[0] == "YES" if text and text[0] in ("YES", "NO") else default
+
+    def limit(name: str) -> int | None:
+        # Giới hạn tùy chọn (số nguyên dương); thiếu hoặc sai định dạng thì không giới hạn
+        text = value(name).split()
+        try:
+            number = int(float(text[0])) if text else 0
+        except (ValueError, OverflowError):
+            return None
+        return number if number > 0 else None
+
+    mark_text = value("MARK").split()
+    try:
+        mark = float(mark_text[0]) if mark_text else 0.0
+    except ValueError:
+        mark = 0.0
+
+    case = {
+        "input": value(INPUT_FIELD),
+        "expected_output": value(OUTPUT_FIELD),
+        "remove_spaces": flag("REMOVE_SPACES", False),
+        "case_sensitive": flag("CASE_SENSITIVE", True),
+        "mark": mark,
+        "time_limit_ms": limit("TIME_LIMIT"),
+        "memory_limit_mb": limit("MEMORY_LIMIT"),
+    }
+    case["expected_normalized"] = normalize_output(
+        case["expected_output"], case["remove_spaces"], case["case_sensitive"]
+    )
+    return case
+
+
+def parse_suite_text(content: str, with_headers: bool) -> list[tuple[int, int, dict]]:
+    """Parse một lượt duy nhất; trả về [(question, tc_num, case)].
+
+    with_headers=False: định dạng tc*.txt (một test, không có tiêu đề) -> question = tc_num = 0.
+    with_headers=True: định dạng tests.txt với "=== Qn ===" và "--- TCn ---".
+    INPUT chỉ kết thúc ở nhãn OUTPUT:, OUTPUT chỉ kết thúc ở nhãn cấu hình (hoặc tiêu đề mới),
+    nên nội dung input/output có thể chứa các dòng trùng tên nhãn khác.
+    """
+    cases: list[tuple[int, int, dict]] = []
+    question = tc_num = 0
+    fields: dict[str, list[str]] | None = None if with_headers else {}
+    current: str | None = None
+
+    def finish() -> None:
+        if fields is not None and (INPUT_FIELD in fields or OUTPUT_FIELD in fields):
+            cases.append((question, tc_num, _build_case(fields)))
+
+    for line in content.splitlines():
+        if with_headers:
+            q_match = _QUESTION_HEADER.fullmatch(line.strip())
+            tc_match = _TC_HEADER.fullmatch(line.strip())
+            if q_match or tc_match:
+                finish()
+                if q_match:
+                    question, fields = int(q_match.group(1)), None
+                else:
+                    tc_num, fields = int(tc_match.group(1)), {}
+                current = None
+                continue
+            if fields is None:
+                continue
+
+        if current == INPUT_FIELD:
+            allowed: tuple[str, ...] = (OUTPUT_FIELD,)
+        elif current == OUTPUT_FIELD:
+            allowed = CONFIG_FIELDS
+        else:
+            allowed = (INPUT_FIELD, OUTPUT_FIELD) + CONFIG_FIELDS
+        label = _field_label(line, allowed)
+        if label:
+            current = label
+            fields[label] = []
+        elif current:
+            fields[current].append(line)
+
+    finish()
+    return cases
+
+
+def _signature(sources: list[Path]) -> tuple:
+    return tuple((str(p), p.stat().st_mtime_ns, p.stat().st_size) for p in sources)
+
+
+def _content_hash(sources: list[Path]) -> str:
+    digest = hashlib.sha256(str(SUITE_FORMAT_VERSION).encode("ascii"))
+    for path in sources:
+        digest.update(b"\0" + path.name.encode("utf-8") + b"\0")
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _load_cached(cache_name: str, sources: list[Path], build):
+    """Lấy bộ test đã biên dịch: bộ nhớ -> file cache (khớp mtime/size hoặc hash nội dung) -> parse lại."""
+    signature = _signature(sources)
+    with _memory_lock:
+        cached = _memory_cache.get(cache_name)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    cache_file = SUITE_CACHE_DIR / f"{hashlib.sha256(cache_name.encode('utf-8')).hexdigest()[:24]}.pickle"
+    stored = None
+    try:
+        with open(cache_file, "rb") as f:
+            stored = pickle.load(f)
+    except (OSError, pickle.PickleError, EOFError, AttributeError):
+        stored = None
+
+    if stored and stored.get("version") == SUITE_FORMAT_VERSION and stored.get("signature") == signature:
+        suite = stored["suite"]
+    else:
+        content_hash = _content_hash(sources)
+        if stored and stored.get("version") == SUITE_FORMAT_VERSION and stored.get("hash") == content_hash:
+            suite = stored["suite"]  # chỉ mtime thay đổi (vd. copy lại file)
+        else:
+            suite = build()
+        data = {"version": SUITE_FORMAT_VERSION, "signature": signature, "hash": content_hash, "suite": suite}
+        try:
+            SUITE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_suffix(f".tmp-{threading.get_ident()}")
+            with open(tmp_file, "wb") as f:
+                pickle.dump(data, f)
+            tmp_file.replace(cache_file)
+        except OSError:
+            pass  # không ghi được cache thì vẫn dùng bản vừa parse
+
+    with _memory_lock:
+        _memory_cache[cache_name] = (signature, suite)
+    return suite
+
+
+def parse_tc_file(tc_file: Path) -> dict:
+    """Parse một file tc*.txt (không dùng cache)."""
+    cases = parse_suite_text(Path(tc_file).read_text(encoding="utf-8"), with_headers=False)
+    return cases[0][2] if cases else _build_case({})
+
+
+def load_tc_suite(test_dir: Path) -> dict[str, dict]:
+    """Bộ test định dạng TestCases/tc*.txt: {tên file (tc1, ...): test case}, theo thứ tự tên file."""
+    test_dir = Path(test_dir).resolve()
+    sources = sorted(test_dir.glob("tc*.txt"))
+
+    def build() -> dict[str, dict]:
+        return {path.stem: parse_tc_file(path) for path in sources}
+
+    return _load_cached(f"tc:{test_dir}", sources, build)
+
+
+def load_tests_file(test_file: Path) -> dict[int, list[dict]]:
+    """Bộ test định dạng tests.txt: {số câu: [test case có tc_num]} cho Q1..Q4."""
+    test_file = Path(test_file).resolve()
+
+    def build() -> dict[int, list[dict]]:
+        tests: dict[int, list[dict]] = {}
+        content = test_file.read_text(encoding="utf-8")
+        for question, tc_num, case in parse_suite_text(content, with_headers=True):
+            if 1 <= question <= 4:
+                tests.setdefault(question, []).append({"tc_num": tc_num, **case})
+        return tests
+
+    return _load_cached(f"pe:{test_file}", [test_file], build)
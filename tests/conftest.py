@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Các module nằm ở thư mục gốc của repo; cache (bộ test đã biên dịch...) ghi vào thư mục tạm thay vì ~/.cache
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("AUTOGRADE_CACHE", tempfile.mkdtemp(prefix="auto-grade-tests-"))
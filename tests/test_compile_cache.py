@@ -0,0 +1,59 @@
+import os
+
+from compile_cache import SIZE_FILE, CompileCache
+
+
+def _sources(root, files: dict) -> list:
+    paths = []
+    for rel, text in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def test_key_depends_on_content_paths_and_flags_not_order(tmp_path):
+    cache = CompileCache(tmp_path / "builds", use_daemon=False)
+    src = tmp_path / "src"
+    files = _sources(src, {"Main.java": "class Main {}", "util/Helper.java": "class Helper {}"})
+    key = cache.key(src, files, ["-encoding", "UTF-8"])
+
+    assert cache.key(src, list(reversed(files)), ["-encoding", "UTF-8"]) == key
+    assert cache.key(src, files, ["-encoding", "UTF-8", "--release", "17"]) != key
+    (src / "Main.java").write_text("class Main { }", encoding="utf-8")
+    assert cache.key(src, files, ["-encoding", "UTF-8"]) != key
+
+    other = tmp_path / "other"
+    moved = _sources(other, {"Main.java": "class Main { }", "Helper.java": "class Helper {}"})
+    assert cache.key(other, moved, ["-encoding", "UTF-8"]) != cache.key(src, files, ["-encoding", "UTF-8"])
+
+
+def _build(root, name: str, size: int, mtime: float):
+    build_dir = root / name[:2] / name
+    build_dir.mkdir(parents=True)
+    (build_dir / SIZE_FILE).write_text(str(size), encoding="ascii")
+    os.utime(build_dir, (mtime, mtime))
+    return build_dir
+
+
+def test_evict_removes_least_recently_used_builds(tmp_path):
+    root = tmp_path / "builds"
+    oldest = _build(root, "aa01", 400, 1000)
+    middle = _build(root, "bb02", 400, 2000)
+    newest = _build(root, "cc03", 400, 3000)
+    partial = _build(root, "dd04.tmp-1-2", 400, 500)
+
+    CompileCache(root, max_bytes=900, use_daemon=False).evict()
+
+    assert not oldest.exists()
+    assert middle.exists() and newest.exists()
+    # Build đang được ghi dở của worker khác không bị đụng tới
+    assert partial.exists()
+
+
+def test_evict_keeps_everything_under_limit(tmp_path):
+    root = tmp_path / "builds"
+    builds = [_build(root, f"{i:02d}ab", 100, 1000 + i) for i in range(3)]
+    CompileCache(root, max_bytes=300, use_daemon=False).evict()
+    assert all(build.exists() for build in builds)
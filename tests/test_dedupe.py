@@ -0,0 +1,80 @@
+import csv
+import json
+
+from batch_check import submission_fingerprint
+from fingerprint import normalize_java_source
+from result_sink import ResultSink
+
+SOURCE = """public class Main {
+    public static void main(String[] args) {
+        System.out.println("a  b"); // in ra
+    }
+}
+"""
+
+REFORMATTED = """/* Bài làm */
+public class Main
+{
+  public static void main(String[] args)
+  {
+    System.out.println("a  b");
+  }
+}
+"""
+
+
+def _submission(root, name, source):
+    src = root / name / "src"
+    src.mkdir(parents=True)
+    (src / "Main.java").write_text(source, encoding="utf-8")
+    return root / name
+
+
+def test_normalize_drops_comments_and_whitespace_but_keeps_strings():
+    assert normalize_java_source(SOURCE) == normalize_java_source(REFORMATTED)
+    assert '"a  b"' in normalize_java_source(SOURCE)
+    assert normalize_java_source('String s = "// không phải comment";') == 'String s="// không phải comment";'
+
+
+def test_normalize_keeps_meaningful_spaces():
+    assert normalize_java_source("int  x = a - -b;") == "int x=a- -b;"
+    assert normalize_java_source("x = a--b;") == "x=a--b;"
+
+
+def test_fingerprint_matches_reformatted_copy_only_when_normalized(tmp_path):
+    first = _submission(tmp_path, "alice", SOURCE)
+    second = _submission(tmp_path, "bob", REFORMATTED)
+    tests = tmp_path / "tests"
+    assert submission_fingerprint(first, "given", tests) != submission_fingerprint(second, "given", tests)
+    assert submission_fingerprint(first, "given", tests, normalize=True) == submission_fingerprint(
+        second, "given", tests, normalize=True
+    )
+
+
+def test_fingerprint_changes_with_code(tmp_path):
+    first = _submission(tmp_path, "alice", SOURCE)
+    second = _submission(tmp_path, "bob", SOURCE.replace("a  b", "a b"))
+    tests = tmp_path / "tests"
+    assert submission_fingerprint(first, "given", tests, normalize=True) != submission_fingerprint(
+        second, "given", tests, normalize=True
+    )
+
+
+def test_sink_writes_rows_for_every_shared_submission(tmp_path):
+    jsonl, csv_file = tmp_path / "r.jsonl", tmp_path / "r.csv"
+    ResultSink.prepare(jsonl, csv_file)
+    sink = ResultSink(jsonl, csv_file, "alice", shared_with=["bob"])
+    sink.record("tc1", "PASS", True, 1.0, 1.0, None, "ok", "", False)
+    sink.close()
+
+    records = [json.loads(line) for line in jsonl.read_text(encoding="utf-8").splitlines()]
+    assert [r["submission"] for r in records] == ["alice", "bob"]
+    assert "shared_from" not in records[0]
+    assert records[1]["shared_from"] == "alice"
+    assert records[1]["stdout"] == "ok"
+    with open(csv_file, encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [(r["submission"], r["test"], r["verdict"]) for r in rows] == [
+        ("alice", "tc1", "PASS"),
+        ("bob", "tc1", "PASS"),
+    ]
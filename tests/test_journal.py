@@ -0,0 +1,40 @@
+import os
+
+from journal import RunJournal
+
+
+def test_load_returns_tests_and_finished_submissions(tmp_path):
+    journal = RunJournal(tmp_path / "journal")
+    sub = journal.for_submission("alice")
+    sub.record("tc1", True, 1.0, 1.0, "PASS")
+    sub.record("tc2", False, 0.0, 1.0, "FAIL")
+    journal.append({"type": "submission", "student": "alice", "row": {"student": "alice", "earned": "1.00"}})
+    journal.sync()
+
+    tests, done = journal.load()
+    assert set(tests["alice"]) == {"tc1", "tc2"}
+    assert tests["alice"]["tc2"]["verdict"] == "FAIL"
+    assert done == {"alice": {"student": "alice", "earned": "1.00"}}
+
+
+def test_load_skips_truncated_trailing_line(tmp_path):
+    journal = RunJournal(tmp_path / "journal")
+    journal.for_submission("bob").record("tc1", True, 1.0, 1.0, "PASS")
+    journal.sync()
+    # Máy tắt giữa lúc ghi dòng thứ hai
+    segment = tmp_path / "journal" / f"{os.getpid()}.jsonl"
+    with open(segment, "a", encoding="utf-8") as f:
+        f.write('{"type": "test", "student": "bob", "test": "tc2", "pas')
+
+    tests, done = journal.load()
+    assert list(tests["bob"]) == ["tc1"]
+    assert done == {}
+    # Bài chưa xong được chấm lại, bỏ qua test đã có kết quả
+    assert RunJournal(tmp_path / "journal").for_submission("bob", tests["bob"]).completed("tc1")["passed"] is True
+
+
+def test_clear_removes_previous_run(tmp_path):
+    journal = RunJournal(tmp_path / "journal")
+    journal.for_submission("carol").record("tc1", True, 1.0, 1.0, "PASS")
+    journal.clear()
+    assert journal.load() == ({}, {})
@@ -0,0 +1,70 @@
+from distributed import MAX_ATTEMPTS, LeaseTable
+
+
+def _job(job_id: str) -> dict:
+    return {"id": job_id, "student": job_id, "attempt": 0}
+
+
+def _lease(table: LeaseTable, worker: str = "w1") -> dict | None:
+    return table.handle({"op": "lease", "worker": worker})["job"]
+
+
+def test_lease_in_order_then_report_closed():
+    table = LeaseTable()
+    table.submit([_job("a"), _job("b")])
+    assert _lease(table)["id"] == "a"
+    assert _lease(table)["id"] == "b"
+    assert table.handle({"op": "lease", "worker": "w1"}) == {"job": None, "closed": False}
+    table.close()
+    assert table.handle({"op": "lease", "worker": "w1"}) == {"job": None, "closed": True}
+
+
+def test_expired_lease_is_requeued_first_then_failed():
+    table = LeaseTable(lease_seconds=-1)
+    table.submit([_job("a"), _job("b")])
+    job = _lease(table)
+    requeued, failed = table.expire()
+    assert [j["id"] for j in requeued] == ["a"] and failed == []
+    # Job hết hạn được lease lại trước các job khác
+    assert _lease(table, "w2") is job
+
+    for _ in range(MAX_ATTEMPTS - 2):
+        table.expire()
+        assert _lease(table) is job
+    requeued, failed = table.expire()
+    assert requeued == [] and [j["id"] for j in failed] == ["a"]
+    assert _lease(table)["id"] == "b"
+
+
+def test_heartbeat_keeps_lease_alive():
+    table = LeaseTable(lease_seconds=60)
+    table.submit([_job("a")])
+    _lease(table)
+    assert table.handle({"op": "heartbeat", "job_id": "a"}) == {"ok": True}
+    assert table.expire() == ([], [])
+    assert table.handle({"op": "heartbeat", "job_id": "missing"}) == {"ok": False}
+
+
+def test_complete_records_result_once_even_after_requeue():
+    table = LeaseTable(lease_seconds=-1)
+    table.submit([_job("a")])
+    _lease(table, "slow")
+    table.expire()
+    # Worker chậm vẫn gửi kết quả sau khi job đã được đưa lại hàng đợi
+    assert table.handle({"op": "complete", "job_id": "a", "result": {"earned": 1}}) == {"ok": True}
+    assert table.handle({"op": "complete", "job_id": "a", "result": {"earned": 2}}) == {"ok": True}
+    assert [(job["id"], result) for job, result in table.drain_results()] == [("a", {"earned": 1})]
+    assert table.drain_results() == []
+    assert _lease(table) is None
+    # Job đã xong không bị expire
+    assert table.expire() == ([], [])
+    assert table.handle({"op": "complete", "job_id": "missing", "result": {}}) == {"ok": False}
+
+
+def test_finished_lease_is_not_expired():
+    table = LeaseTable(lease_seconds=-1)
+    table.submit([_job("a")])
+    _lease(table)
+    table.handle({"op": "complete", "job_id": "a", "result": {}})
+    assert table.expire() == ([], [])
+    assert table.handle({"op": "bogus"}) == {"error": "unknown op 'bogus'"}
@@ -0,0 +1,53 @@
+import subprocess
+import sys
+
+import pytest
+
+from exec_engine import get_engine
+from java_exec import VERDICT_MLE, VERDICT_TIMEOUT, VERDICT_TLE, RunMessage, apply_limits, run_verdict
+
+# Chương trình "ăn" bộ nhớ: báo lỗi giống JVM khi hết bộ nhớ
+MEMORY_HOG = """
+import sys
+try:
+    data = bytearray(512 * 1024 * 1024)
+except MemoryError:
+    sys.stderr.write('Exception in thread "main" java.lang.OutOfMemoryError: Java heap space\\n')
+    sys.exit(1)
+print("allocated")
+"""
+
+
+def _case(time_limit_ms=None, memory_limit_mb=None) -> dict:
+    return {"time_limit_ms": time_limit_ms, "memory_limit_mb": memory_limit_mb}
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="RLIMIT_DATA chỉ áp dụng trên Linux")
+def test_memory_limit_gives_mle(tmp_path):
+    stdout, stderr, returncode = get_engine().run(
+        [sys.executable, "-c", MEMORY_HOG], "", str(tmp_path), timeout=30, memory_limit_mb=128
+    )
+    assert "allocated" not in stdout
+    stderr, returncode = apply_limits(_case(memory_limit_mb=64), stderr, returncode)
+    assert returncode == -1
+    assert run_verdict(stderr, returncode) == VERDICT_MLE
+
+
+def test_without_memory_limit_runs(tmp_path):
+    stdout, stderr, returncode = get_engine().run([sys.executable, "-c", MEMORY_HOG], "", str(tmp_path), timeout=30)
+    assert (stdout.strip(), returncode) == ("allocated", 0)
+    assert apply_limits(_case(memory_limit_mb=64), stderr, returncode) == (stderr, 0)
+
+
+def test_timeout_with_time_limit_gives_tle(tmp_path):
+    with pytest.raises(subprocess.TimeoutExpired):
+        get_engine().run([sys.executable, "-c", "import time; time.sleep(30)"], "", str(tmp_path), timeout=0.5)
+    stderr, returncode = apply_limits(_case(time_limit_ms=500), RunMessage("TIMEOUT", VERDICT_TIMEOUT), -1)
+    assert run_verdict(stderr, returncode) == VERDICT_TLE
+
+
+def test_no_declared_limits_keeps_verdict():
+    stderr = RunMessage("TIMEOUT", VERDICT_TIMEOUT)
+    assert apply_limits(_case(), stderr, -1) == (stderr, -1)
+    crash = "java.lang.OutOfMemoryError: Java heap space"
+    assert apply_limits(_case(), crash, 1) == (crash, 1)
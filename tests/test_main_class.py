@@ -0,0 +1,97 @@
+import struct
+
+import pytest
+
+from check import JavaTestRunner, read_main_class_name
+
+
+def _utf8(text: str) -> bytes:
+    data = text.encode("utf-8")
+    return struct.pack(">BH", 1, len(data)) + data
+
+
+def _member(flags: int, name: int, descriptor: int, attributes: list[bytes] = ()) -> bytes:
+    data = struct.pack(">HHHH", flags, name, descriptor, len(attributes))
+    for body in attributes:
+        data += struct.pack(">HI", 5, len(body)) + body  # tên attribute: Utf8 #5 ("Code")
+    return data
+
+
+def _class_file(main_flags: int = 0x0009, main_descriptor: int = 7, name: str = "demo/Hello") -> bytes:
+    """File .class tối thiểu (Java 8) của class name (mặc định demo/Hello) với field, hằng long và hai method."""
+    pool = [
+        struct.pack(">BH", 7, 2),  # 1: Class name
+        _utf8(name),  # 2
+        struct.pack(">BH", 7, 4),  # 3: Class java/lang/Object
+        _utf8("java/lang/Object"),  # 4
+        _utf8("Code"),  # 5
+        _utf8("main"),  # 6
+        _utf8("([Ljava/lang/String;)V"),  # 7
+        _utf8("helper"),  # 8
+        _utf8("()V"),  # 9
+        struct.pack(">Bq", 5, 1 << 40),  # 10-11: long chiếm hai slot
+        _utf8("count"),  # 12
+        _utf8("I"),  # 13
+        struct.pack(">BHH", 12, 6, 7),  # 14: NameAndType
+    ]
+    data = b"\xca\xfe\xba\xbe" + struct.pack(">HHH", 0, 52, 15) + b"".join(pool)
+    data += struct.pack(">HHHH", 0x0021, 1, 3, 0)  # access, this, super, không có interface
+    data += struct.pack(">H", 1) + _member(0x0002, 12, 13)
+    data += struct.pack(">H", 2)
+    data += _member(0x0009, 8, 9, [b"\x00" * 13])
+    data += _member(main_flags, 6, main_descriptor, [b"\x00\x01\x00\x01\x00\x00\x00\x01\xb1\x00\x00\x00\x00"])
+    return data + struct.pack(">H", 0)
+
+
+def test_main_class(tmp_path):
+    class_file = tmp_path / "Hello.class"
+    class_file.write_bytes(_class_file())
+    assert read_main_class_name(class_file) == "demo.Hello"
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        _class_file(main_flags=0x0001),  # main không static
+        _class_file(main_descriptor=9),  # main()
+        _class_file()[:60],  # file bị cắt
+        b"not a class file",
+    ],
+    ids=["not-static", "no-args", "truncated", "bad-magic"],
+)
+def test_no_main_class(tmp_path, data):
+    class_file = tmp_path / "Hello.class"
+    class_file.write_bytes(data)
+    assert read_main_class_name(class_file) is None
+
+
+def test_missing_file(tmp_path):
+    assert read_main_class_name(tmp_path / "Missing.class") is None
+
+
+def _runner(tmp_path, classes: dict) -> JavaTestRunner:
+    src = tmp_path / "given" / "src"
+    for rel, data in classes.items():
+        (src / rel).parent.mkdir(parents=True, exist_ok=True)
+        (src / rel).write_bytes(data)
+    (tmp_path / "TestCases").mkdir()
+    return JavaTestRunner(tmp_path / "given", tmp_path / "TestCases", compile_cache=False, record_outputs=False)
+
+
+def test_find_main_class_in_package(tmp_path):
+    runner = _runner(tmp_path, {"demo/Hello.class": _class_file(), "demo/Util.class": _class_file(main_flags=0x0001)})
+    assert runner.find_main_class() == "demo.Hello"
+
+
+def test_find_main_class_prefers_main(tmp_path):
+    runner = _runner(tmp_path, {"demo/Hello.class": _class_file(), "Main.class": _class_file(name="Main")})
+    assert runner.find_main_class() == "Main"
+
+
+def test_find_main_class_fallback(tmp_path, capsys):
+    runner = _runner(tmp_path, {"Util.class": _class_file(main_descriptor=9, name="Util")})
+    assert runner.find_main_class() == "main"
+    assert "DANH SÁCH FILE" in capsys.readouterr().out
+    # Danh sách file chỉ in một lần mỗi lượt chấm
+    runner.find_main_class()
+    assert "DANH SÁCH FILE" not in capsys.readouterr().out
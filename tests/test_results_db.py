@@ -0,0 +1,72 @@
+import sqlite3
+
+import results_db
+from results_db import ResultsDB
+
+
+def _tc(**overrides) -> dict:
+    tc = {
+        "input": "1 2\n",
+        "expected_normalized": "3",
+        "remove_spaces": False,
+        "case_sensitive": True,
+        "mark": 1.0,
+        "time_limit_ms": None,
+        "memory_limit_mb": None,
+    }
+    tc.update(overrides)
+    return tc
+
+
+def test_round_trip_with_usage(tmp_path):
+    db = ResultsDB(tmp_path / "results.sqlite3")
+    usage = {"wall": 0.5, "user": 0.2, "system": 0.1, "peak_rss_mb": 40.0}
+    db.put("sub", "test", "tc1", True, 1.0, 1.0, "PASS", usage)
+    assert db.get("sub", "test") == {"passed": True, "earned": 1.0, "max_mark": 1.0, "verdict": "PASS", "usage": usage}
+    # Database mở lại từ đĩa cho cùng kết quả
+    assert ResultsDB(tmp_path / "results.sqlite3").get("sub", "test")["verdict"] == "PASS"
+
+
+def test_missing_pair_and_replace(tmp_path):
+    db = ResultsDB(tmp_path / "results.sqlite3")
+    assert db.get("sub", "test") is None
+    db.put("sub", "test", "tc1", True, 1.0, 1.0, "PASS")
+    db.put("sub", "test", "tc1", False, 0.0, 1.0, "FAIL")
+    assert db.get("sub", "test") == {"passed": False, "earned": 0.0, "max_mark": 1.0, "verdict": "FAIL", "usage": None}
+    assert db.get("other", "test") is None
+
+
+def test_hash_changes_with_everything_that_decides_the_result():
+    base = results_db.test_case_hash(_tc(), 5.0, 1024)
+    assert results_db.test_case_hash(_tc(), 5.0, 1024) == base
+    changed = [
+        results_db.test_case_hash(_tc(input="2 2\n"), 5.0, 1024),
+        results_db.test_case_hash(_tc(expected_normalized="4"), 5.0, 1024),
+        results_db.test_case_hash(_tc(remove_spaces=True), 5.0, 1024),
+        results_db.test_case_hash(_tc(case_sensitive=False), 5.0, 1024),
+        results_db.test_case_hash(_tc(mark=2.0), 5.0, 1024),
+        results_db.test_case_hash(_tc(time_limit_ms=500), 5.0, 1024),
+        results_db.test_case_hash(_tc(memory_limit_mb=64), 5.0, 1024),
+        results_db.test_case_hash(_tc(), 10.0, 1024),
+        results_db.test_case_hash(_tc(), 5.0, 2048),
+    ]
+    assert base not in changed
+    assert len(set(changed)) == len(changed)
+
+
+def test_old_database_gains_usage_columns(tmp_path):
+    path = tmp_path / "results.sqlite3"
+    conn = sqlite3.connect(str(path))
+    conn.execute(
+        "CREATE TABLE results (submission_hash TEXT NOT NULL, test_hash TEXT NOT NULL, test_name TEXT NOT NULL, "
+        "passed INTEGER NOT NULL, earned REAL NOT NULL, max_mark REAL NOT NULL, verdict TEXT NOT NULL, "
+        "graded_at REAL NOT NULL, PRIMARY KEY (submission_hash, test_hash))"
+    )
+    conn.execute("INSERT INTO results VALUES ('sub', 'test', 'tc1', 1, 1.0, 1.0, 'PASS', 0)")
+    conn.commit()
+    conn.close()
+
+    db = ResultsDB(path)
+    assert db.get("sub", "test")["usage"] is None
+    db.put("sub", "test", "tc1", True, 1.0, 1.0, "PASS", {"wall": 0.3})
+    assert db.get("sub", "test")["usage"] == {"wall": 0.3}
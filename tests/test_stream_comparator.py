@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from java_exec import StreamComparator, find_divergence
+from test_suite import normalize_output
+
+CHUNK_SIZES = [1, 2, 3, 5, 64 * 1024]
+
+CASES = [
+    ("Hello World", "Hello World"),
+    ("  Hello World \n\n", "Hello World"),
+    ("Hello  World", "Hello World"),
+    ("Hello\nWorld\n", "Hello\nWorld"),
+    ("Hello\n World", "Hello\nWorld"),
+    ("HELLO world", "hello World"),
+    ("Sum: 150\r\n", "Sum: 150"),
+    ("a\tb\n\nc", "a b c"),
+    ("", ""),
+    ("   \n\t", ""),
+    ("abc", "abcd"),
+    ("abcd", "abc"),
+    ("abc   ", "abc d"),
+]
+
+
+def _compare(actual: str, expected: str, remove_spaces: bool, case_sensitive: bool, chunk_size: int) -> bool:
+    comparator = StreamComparator(
+        normalize_output(expected, remove_spaces, case_sensitive), remove_spaces, case_sensitive
+    )
+    for index in range(0, len(actual), chunk_size):
+        if not comparator.feed(actual[index : index + chunk_size]):
+            break
+    return comparator.finish()
+
+
+def _reference(actual: str, expected: str, remove_spaces: bool, case_sensitive: bool) -> bool:
+    return normalize_output(actual, remove_spaces, case_sensitive) == normalize_output(
+        expected, remove_spaces, case_sensitive
+    )
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("remove_spaces", [False, True])
+@pytest.mark.parametrize("case_sensitive", [True, False])
+@pytest.mark.parametrize("actual, expected", CASES)
+def test_matches_normalize_output(actual, expected, remove_spaces, case_sensitive, chunk_size):
+    assert _compare(actual, expected, remove_spaces, case_sensitive, chunk_size) == _reference(
+        actual, expected, remove_spaces, case_sensitive
+    )
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_random_outputs(chunk_size):
+    rng = random.Random(chunk_size)
+    alphabet = "aB \n\t"
+    for _ in range(2000):
+        expected = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 8)))
+        # Một nửa số lần: output chỉ khác expected ở khoảng trắng / hoa thường
+        if rng.random() < 0.5:
+            actual = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 8)))
+        else:
+            actual = "".join(c.swapcase() if rng.random() < 0.3 else c for c in expected)
+            actual = rng.choice(["", " ", "\n"]) + actual + rng.choice(["", " \n", "\t"])
+        for remove_spaces in (False, True):
+            for case_sensitive in (True, False):
+                assert _compare(actual, expected, remove_spaces, case_sensitive, chunk_size) == _reference(
+                    actual, expected, remove_spaces, case_sensitive
+                ), (actual, expected, remove_spaces, case_sensitive)
+
+
+def test_divergence_location():
+    divergence = find_divergence("line one\nline tw0\n", "line one\nline two", False, True)
+    assert (divergence["line"], divergence["column"]) == (2, 8)
+    assert divergence["expected"].startswith("o")
+    assert divergence["actual"].startswith("0")
+    assert find_divergence("  same\n", "same", False, True) is None
@@ -0,0 +1,109 @@
+from pathlib import Path
+
+import pytest
+
+import test_suite
+from test_suite import load_tc_suite, load_tests_file, parse_suite_text, parse_tc_file
+
+ROOT = Path(__file__).resolve().parent.parent
+SAMPLE_TESTS = ROOT / "sample" / "TestCases"
+SAMPLE_PE_TESTS = ROOT / "sample_pe" / "tests.txt"
+
+
+def _format_case(case: dict) -> str:
+    """Ghi test case trở lại định dạng tc*.txt / một TC của tests.txt."""
+    lines = ["INPUT:", case["input"], "OUTPUT:", case["expected_output"]]
+    lines += ["REMOVE_SPACES:", "YES" if case["remove_spaces"] else "NO"]
+    lines += ["CASE_SENSITIVE:", "YES" if case["case_sensitive"] else "NO"]
+    lines += ["MARK:", str(case["mark"])]
+    if case["time_limit_ms"]:
+        lines += ["TIME_LIMIT:", str(case["time_limit_ms"])]
+    if case["memory_limit_mb"]:
+        lines += ["MEMORY_LIMIT:", str(case["memory_limit_mb"])]
+    return "\n".join(lines) + "\n"
+
+
+def test_sample_tc1():
+    case = parse_tc_file(SAMPLE_TESTS / "tc1.txt")
+    assert case["input"] == "1"
+    assert case["expected_output"].startswith("[(SE0002,An,5.5);")
+    assert case["remove_spaces"] and case["case_sensitive"]
+    assert case["mark"] == 1.0
+    assert case["time_limit_ms"] is None and case["memory_limit_mb"] is None
+
+
+@pytest.mark.parametrize("tc_file", sorted(SAMPLE_TESTS.glob("tc*.txt")), ids=lambda path: path.stem)
+def test_tc_round_trip(tc_file):
+    case = parse_tc_file(tc_file)
+    assert parse_suite_text(_format_case(case), with_headers=False) == [(0, 0, case)]
+
+
+def test_tc_suite_matches_files():
+    suite = load_tc_suite(SAMPLE_TESTS)
+    assert list(suite) == ["tc1", "tc2", "tc3"]
+    assert suite == {path.stem: parse_tc_file(path) for path in sorted(SAMPLE_TESTS.glob("tc*.txt"))}
+    # Lần thứ hai lấy từ cache phải giống hệt
+    assert load_tc_suite(SAMPLE_TESTS) == suite
+
+
+def test_pe_round_trip():
+    tests = load_tests_file(SAMPLE_PE_TESTS)
+    assert sorted(tests) == [1, 2, 3, 4]
+    assert sum(len(cases) for cases in tests.values()) == 8
+    assert tests[1][0]["input"] == "3\nNguyen Van A\n20\nMale"
+    assert tests[1][0]["expected_output"] == "Student: Nguyen Van A, Age: 20, Gender: Male"
+
+    text = ""
+    for question, cases in sorted(tests.items()):
+        text += f"=== Q{question} ===\n\n"
+        for case in cases:
+            text += f"--- TC{case['tc_num']} ---\n" + _format_case(case) + "\n"
+    reparsed = parse_suite_text(text, with_headers=True)
+    expected = [
+        (question, case["tc_num"], {key: value for key, value in case.items() if key != "tc_num"})
+        for question, cases in sorted(tests.items())
+        for case in cases
+    ]
+    assert reparsed == expected
+
+
+def test_labels_inside_input_and_output():
+    # INPUT chỉ kết thúc ở OUTPUT:, OUTPUT chỉ kết thúc ở nhãn cấu hình
+    content = "INPUT:\nMARK:\nOUTPUT:\nINPUT:\nx\nMARK:\n2\n"
+    [(_, _, case)] = parse_suite_text(content, with_headers=False)
+    assert case["input"] == "MARK:"
+    assert case["expected_output"] == "INPUT:\nx"
+    assert case["mark"] == 2.0
+
+
+def _write_tc(test_dir: Path, name: str, output: str) -> None:
+    case = {
+        "input": "1",
+        "expected_output": output,
+        "remove_spaces": False,
+        "case_sensitive": True,
+        "mark": 1.0,
+        "time_limit_ms": None,
+        "memory_limit_mb": None,
+    }
+    (test_dir / f"{name}.txt").write_text(_format_case(case), encoding="utf-8")
+
+
+def test_tc_suite_cache_follows_file_changes(tmp_path):
+    _write_tc(tmp_path, "tc1", "a")
+    assert load_tc_suite(tmp_path)["tc1"]["expected_output"] == "a"
+
+    _write_tc(tmp_path, "tc1", "bb")
+    _write_tc(tmp_path, "tc2", "c")
+    suite = load_tc_suite(tmp_path)
+    assert list(suite) == ["tc1", "tc2"]
+    assert suite["tc1"]["expected_output"] == "bb"
+
+
+def test_tc_suite_reused_from_disk_cache(tmp_path, monkeypatch):
+    _write_tc(tmp_path, "tc1", "a")
+    suite = load_tc_suite(tmp_path)
+    # Tiến trình mới (worker của batch_check.py): không có cache trong bộ nhớ, không parse lại
+    monkeypatch.setattr(test_suite, "_memory_cache", {})
+    monkeypatch.setattr(test_suite, "parse_tc_file", lambda path: pytest.fail(f"parse lại {path}"))
+    assert load_tc_suite(tmp_path) == suite